@@ -0,0 +1,278 @@
+import asyncio
+import uuid
+import traceback
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.config import (
+    HEADERS,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    OVERALL_CRAWL_TIMEOUT,
+    BODY_CHUNK_BYTES,
+    QUEUE_FETCH_TIMEOUT,
+    ASYNC_CONCURRENCY,
+    ASYNC_MAX_CONNECTIONS,
+    ASYNC_CONNECTIONS_PER_HOST,
+    ASYNC_BLOCKING_WORKERS,
+    ASYNC_SCRAPE_PROCESSES
+)
+from utils.logger import ConsoleLogger
+from utils.metrics import StageTrace
+from crawler.scraper import scrape_page
+from crawler.body import BodyTooLarge
+from crawler.crawler import CRAWL_STAGE_MS, CRAWL_OUTCOMES, CRAWLS_IN_FLIGHT, DOWNLOADED_BYTES
+from crawler.politeness import THROTTLE_STATUSES
+from crawler.recrawl import conditional_headers
+
+class AsyncCrawler:
+    def __init__(self, crawler, concurrency=ASYNC_CONCURRENCY):
+        self.crawler = crawler
+        self.queue_manager = crawler.queue_manager
+        self.proxy_manager = crawler.proxy_manager
+        self.concurrency = concurrency
+        self.blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS, thread_name_prefix="crawl-blocking")
+        if ASYNC_SCRAPE_PROCESSES > 0:
+            self.scrape_executor = ProcessPoolExecutor(max_workers=ASYNC_SCRAPE_PROCESSES)
+        else:
+            self.scrape_executor = self.blocking_executor
+        self.session = None
+        self.log = ConsoleLogger()
+
+    def _create_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=ASYNC_MAX_CONNECTIONS,
+            limit_per_host=ASYNC_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=CONNECT_TIMEOUT,
+            sock_read=READ_TIMEOUT
+        )
+        # Bodies are inflated by crawler.body, which bounds the decoded size.
+        return aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=HEADERS, auto_decompress=False,
+            cookie_jar=aiohttp.DummyCookieJar(), trace_configs=[self._trace_config()]
+        )
+
+    @staticmethod
+    def _trace_config():
+        trace_config = aiohttp.TraceConfig()
+
+        def timer(stage, field):
+            async def start(session, context, params):
+                setattr(context, field, asyncio.get_running_loop().time())
+
+            async def end(session, context, params):
+                started = getattr(context, field, None)
+                if started is not None:
+                    CRAWL_STAGE_MS.labels(stage=stage).observe((asyncio.get_running_loop().time() - started) * 1000)
+            return start, end
+
+        dns_start, dns_end = timer("dns", "dns_started")
+        connect_start, connect_end = timer("connect", "connect_started")
+        trace_config.on_dns_resolvehost_start.append(dns_start)
+        trace_config.on_dns_resolvehost_end.append(dns_end)
+        trace_config.on_connection_create_start.append(connect_start)
+        trace_config.on_connection_create_end.append(connect_end)
+        return trace_config
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.blocking_executor, func, *args)
+
+    @staticmethod
+    def _decode(body, chunks):
+        for chunk in chunks:
+            body.feed(chunk)
+        return body.finish()
+
+    async def _get(self, url, proxy_url, ssl, headers=None):
+        response = await self.session.get(url, proxy=proxy_url, ssl=ssl, headers=headers)
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+        return response
+
+    async def _fetch(self, request_id, url_to_crawl, short_url, headers=None):
+        # aiohttp's connector already pools connections per proxy; the
+        # manager only picks one and tracks its health.
+        proxy = self.proxy_manager.acquire()
+        proxy_url = proxy.url if proxy else None
+        started = asyncio.get_running_loop().time()
+        try:
+            try:
+                response = await self._get(url_to_crawl, proxy_url, ssl=None, headers=headers)
+            except aiohttp.ClientSSLError:
+                self.log.warn(f"[{request_id}] SSL Error. Retrying without verification: {short_url}", key="ssl_retry")
+                response = await self._get(url_to_crawl, proxy_url, ssl=False, headers=headers)
+        except aiohttp.ClientHttpProxyError:
+            self.proxy_manager.report(proxy, False, (asyncio.get_running_loop().time() - started) * 1000)
+            raise
+        except aiohttp.ClientResponseError as e:
+            self.proxy_manager.report(proxy, e.status != 407, (asyncio.get_running_loop().time() - started) * 1000)
+            raise
+        except (aiohttp.ClientProxyConnectionError, aiohttp.ConnectionTimeoutError):
+            # Through a proxy, the TCP connection is made to the proxy itself.
+            self.proxy_manager.report(proxy, False, (asyncio.get_running_loop().time() - started) * 1000)
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self.proxy_manager.report(proxy, None)
+            raise
+        self.proxy_manager.report(proxy, True, (asyncio.get_running_loop().time() - started) * 1000)
+        return response
+
+    async def _crawl(self, request_id, url_to_crawl, short_url, trace):
+        crawler = self.crawler
+        revisit = await self._run_blocking(crawler.revisit_state, url_to_crawl)
+        with trace.stage("check"):
+            domain = await self._run_blocking(crawler.check_url, request_id, url_to_crawl, short_url)
+        if not domain:
+            await self._run_blocking(crawler.revisit_failed, request_id, short_url, revisit, "robots_blocked")
+            return
+
+        # The session already sends HEADERS; revisits only add validators.
+        with trace.stage("fetch"):
+            response = await self._fetch(
+                request_id, url_to_crawl, short_url, conditional_headers(revisit) if revisit is not None else None
+            )
+        # body_job is the pool job currently using the body's buffer.
+        body = body_job = None
+        try:
+            async with response:
+                if revisit is not None and response.status == 304:
+                    await self._run_blocking(crawler.record_revisit, request_id, short_url, revisit, response.headers, "not_modified")
+                    return
+
+                if not crawler.check_content_type(request_id, short_url, response.headers.get('content-type')):
+                    await self._run_blocking(crawler.revisit_failed, request_id, short_url, revisit, "non_html")
+                    return
+
+                if not crawler.check_content_length(request_id, short_url, response.headers.get('content-length')):
+                    await self._run_blocking(crawler.revisit_failed, request_id, short_url, revisit, "too_large")
+                    return
+
+                body = crawler.open_body(response.headers)
+                with trace.stage("download"):
+                    if body.decoder is None:
+                        async for chunk in response.content.iter_chunked(BODY_CHUNK_BYTES):
+                            body.feed(chunk)
+                        content = body.finish()
+                    else:
+                        # Compressed bodies are small on the wire; they are
+                        # inflated in one call in the blocking pool (zlib
+                        # releases the GIL) instead of on the loop.
+                        chunks = []
+                        wire_bytes = 0
+                        async for chunk in response.content.iter_chunked(BODY_CHUNK_BYTES):
+                            wire_bytes += len(chunk)
+                            if wire_bytes > body.limit:
+                                raise BodyTooLarge(wire_bytes)
+                            chunks.append(chunk)
+                        body_job = self.blocking_executor.submit(self._decode, body, chunks)
+                        content = await asyncio.wrap_future(body_job)
+            DOWNLOADED_BYTES.inc(body.wire_bytes)
+
+            if revisit is not None and await self._run_blocking(
+                crawler.is_unchanged, request_id, short_url, revisit, body.content_hash, response.headers
+            ):
+                return
+            with trace.stage("scrape"):
+                if self.scrape_executor is self.blocking_executor:
+                    body_job = self.blocking_executor.submit(scrape_page, content, url_to_crawl)
+                    scraped_data = await asyncio.wrap_future(body_job)
+                else:
+                    # A memoryview cannot be pickled, so scraper processes get a copy.
+                    scraped_data = await asyncio.get_running_loop().run_in_executor(
+                        self.scrape_executor, scrape_page, bytes(content), url_to_crawl
+                    )
+            body_job = self.blocking_executor.submit(
+                crawler.store_page, request_id, url_to_crawl, short_url, domain, body.content_hash, scraped_data, trace,
+                revisit, response.headers, content
+            )
+            await asyncio.wrap_future(body_job)
+        except BodyTooLarge:
+            crawler.body_too_large(request_id, short_url)
+            await self._run_blocking(crawler.revisit_failed, request_id, short_url, revisit, "too_large")
+        finally:
+            if body_job is not None and not body_job.done():
+                # Cancelled by the crawl deadline while a pool thread still
+                # decodes, scrapes or stores from the buffer; releasing it now
+                # would fail that job halfway, so it goes back once it is done.
+                body_job.add_done_callback(lambda _: body.release())
+            elif body is not None:
+                body.release()
+
+    async def crawl_url(self, url_to_crawl: str) -> None:
+        request_id = uuid.uuid4().hex[:6]
+        short_url = self.crawler.shorten_url(url_to_crawl)
+        trace = StageTrace(CRAWL_STAGE_MS)
+        status = retry_after = None
+        failed = False
+        CRAWLS_IN_FLIGHT.inc()
+
+        try:
+            await asyncio.wait_for(self._crawl(request_id, url_to_crawl, short_url, trace), timeout=OVERALL_CRAWL_TIMEOUT)
+        except aiohttp.ServerTimeoutError:
+            # A connect or read timeout of this request; it also subclasses
+            # asyncio.TimeoutError, so it must be caught before the deadline.
+            failed = True
+            CRAWL_OUTCOMES.labels(outcome="request_timeout").inc()
+            self.log.error(f"[{request_id}] Request timed out for: {short_url}", key="request_timeout")
+        except asyncio.TimeoutError:
+            failed = True
+            CRAWL_OUTCOMES.labels(outcome="timeout").inc()
+            self.log.error(f"[{request_id}] Crawl process timed out (> {OVERALL_CRAWL_TIMEOUT}s) for: {short_url}. Skipping.", key="crawl_timeout")
+        except (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError):
+            failed = True
+            CRAWL_OUTCOMES.labels(outcome="connection_error").inc()
+            self.log.warn(f"[{request_id}] Connection error (DNS/Network) for: {short_url}. Skipping.", key="connection_error")
+        except aiohttp.ClientError as e:
+            if isinstance(e, aiohttp.ClientResponseError):
+                status = e.status
+                retry_after = e.headers.get("Retry-After") if e.headers else None
+            else:
+                failed = True
+            if status in THROTTLE_STATUSES:
+                CRAWL_OUTCOMES.labels(outcome="throttled").inc()
+            else:
+                CRAWL_OUTCOMES.labels(outcome="http_error" if status is not None else "request_failed").inc()
+                self.log.error(f"[{request_id}] Request failed: {short_url} :: {type(e).__name__}", key="request_failed")
+        except ValueError as e:
+            CRAWL_OUTCOMES.labels(outcome="invalid").inc()
+            self.log.error(f"[{request_id}] Internal value error processing {short_url}: {e}")
+        except Exception:
+            CRAWL_OUTCOMES.labels(outcome="error").inc()
+            error_details = traceback.format_exc()
+            self.log.error(f"[{request_id}] Unhandled exception while processing {short_url}\n--- TRACEBACK ---\n{error_details}\n-----------------")
+        finally:
+            CRAWLS_IN_FLIGHT.dec()
+            await self._run_blocking(self.crawler.report_fetch, request_id, url_to_crawl, short_url, trace, status, retry_after, failed)
+            self.crawler.finish_trace(request_id, short_url, trace)
+
+    async def _worker(self):
+        while True:
+            url = await self.queue_manager.get_next_url_async(timeout=QUEUE_FETCH_TIMEOUT)
+            if url:
+                await self.crawl_url(url)
+
+    async def run(self):
+        self.session = self._create_session()
+        self.log.info(f"Async crawler started with {self.concurrency} concurrent fetches")
+        workers = []
+        try:
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            await asyncio.gather(*workers)
+        finally:
+            # Cancelled workers still report their last fetch through the
+            # blocking pool, so it is shut down only after they have finished.
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.session.close()
+            self.blocking_executor.shutdown(wait=False, cancel_futures=True)
+            if self.scrape_executor is not self.blocking_executor:
+                self.scrape_executor.shutdown(wait=False, cancel_futures=True)
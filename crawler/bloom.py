@@ -0,0 +1,117 @@
+import math
+import os
+import struct
+import hashlib
+import threading
+
+SNAPSHOT_MAGIC = b"SBF1"
+HEADER_FORMAT = "<4sddIdI"
+FILTER_FORMAT = "<QdQIQ"
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate, num_bits=None, num_hashes=None, bits=None, count=0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = num_bits or max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, digest):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains_digest(self, digest):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def add_digest(self, digest):
+        bits = self.bits
+        for pos in self._positions(digest):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+class ScalableBloomFilter:
+    def __init__(self, initial_capacity, error_rate, growth=2, tightening=0.5):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _digest(key):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        return hashlib.blake2b(key, digest_size=16).digest()
+
+    def _new_filter(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * (self.growth ** index)
+        error_rate = self.error_rate * (1 - self.tightening) * (self.tightening ** index)
+        bloom = BloomFilter(capacity, error_rate)
+        self.filters.append(bloom)
+        return bloom
+
+    def __contains__(self, key):
+        digest = self._digest(key)
+        with self.lock:
+            return any(bloom.contains_digest(digest) for bloom in self.filters)
+
+    def add(self, key):
+        digest = self._digest(key)
+        with self.lock:
+            if any(bloom.contains_digest(digest) for bloom in self.filters):
+                return False
+            bloom = self.filters[-1] if self.filters else self._new_filter()
+            if bloom.is_full():
+                bloom = self._new_filter()
+            bloom.add_digest(digest)
+            return True
+
+    def __len__(self):
+        with self.lock:
+            return sum(bloom.count for bloom in self.filters)
+
+    def copy(self):
+        with self.lock:
+            sbf = ScalableBloomFilter(self.initial_capacity, self.error_rate, self.growth, self.tightening)
+            sbf.filters = [
+                BloomFilter(bloom.capacity, bloom.error_rate, bloom.num_bits, bloom.num_hashes, bytearray(bloom.bits), bloom.count)
+                for bloom in self.filters
+            ]
+        return sbf
+
+    def save(self, path, timestamp):
+        tmp_path = f"{path}.tmp"
+        with self.lock:
+            with open(tmp_path, "wb") as f:
+                f.write(struct.pack(
+                    HEADER_FORMAT, SNAPSHOT_MAGIC, timestamp, self.error_rate,
+                    self.initial_capacity, self.tightening, len(self.filters)
+                ))
+                for bloom in self.filters:
+                    f.write(struct.pack(FILTER_FORMAT, bloom.capacity, bloom.error_rate, bloom.num_bits, bloom.num_hashes, bloom.count))
+                    f.write(bloom.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, growth=2):
+        with open(path, "rb") as f:
+            header = f.read(struct.calcsize(HEADER_FORMAT))
+            magic, timestamp, error_rate, initial_capacity, tightening, num_filters = struct.unpack(HEADER_FORMAT, header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a bloom filter snapshot: {path}")
+            sbf = cls(initial_capacity, error_rate, growth=growth, tightening=tightening)
+            for _ in range(num_filters):
+                capacity, bloom_error_rate, num_bits, num_hashes, count = struct.unpack(
+                    FILTER_FORMAT, f.read(struct.calcsize(FILTER_FORMAT))
+                )
+                bits = bytearray(f.read((num_bits + 7) // 8))
+                sbf.filters.append(BloomFilter(capacity, bloom_error_rate, num_bits, num_hashes, bits, count))
+        return sbf, timestamp
@@ -0,0 +1,144 @@
+import zlib
+import hashlib
+import threading
+from utils.metrics import REGISTRY
+from utils.config import MAX_CONTENT_SIZE_BYTES, BODY_BUFFER_BYTES, BODY_BUFFER_KEEP_BYTES, BODY_POOL_SIZE
+
+BODY_BUFFERS = REGISTRY.counter("crawler_body_buffers_total", "Download buffers handed out", labels=("source",))
+BODY_DECODED_BYTES = REGISTRY.counter("crawler_body_decoded_bytes_total", "Bytes after content-encoding, by encoding", labels=("encoding",))
+
+class BodyTooLarge(Exception):
+    pass
+
+class ContentDecodingError(ValueError):
+    pass
+
+class BufferPool:
+    # Workers download into reused bytearrays instead of concatenating bytes
+    # objects chunk by chunk. A buffer keeps whatever size its largest page
+    # needed; ones that grew past keep_bytes are dropped on release, so the
+    # pool holds at most size * keep_bytes.
+    def __init__(self, size=BODY_POOL_SIZE, initial_bytes=BODY_BUFFER_BYTES, keep_bytes=BODY_BUFFER_KEEP_BYTES):
+        self.size = size
+        self.initial_bytes = initial_bytes
+        self.keep_bytes = keep_bytes
+        self.free = []
+        self.lock = threading.Lock()
+        REGISTRY.gauge("crawler_body_buffers_free", "Download buffers waiting in the pool").set_function(lambda: len(self.free))
+
+    def acquire(self, expected_bytes=0):
+        with self.lock:
+            buffer = self.free.pop() if self.free else None
+        if buffer is None:
+            BODY_BUFFERS.labels(source="new").inc()
+            return bytearray(max(self.initial_bytes, expected_bytes))
+        BODY_BUFFERS.labels(source="pool").inc()
+        return buffer
+
+    def release(self, buffer):
+        if len(buffer) > self.keep_bytes:
+            return
+        try:
+            # A bytearray cannot be resized while a memoryview of it is
+            # alive; one that still is must not be handed to another page.
+            buffer.append(0)
+            del buffer[-1]
+        except BufferError:
+            return
+        with self.lock:
+            if len(self.free) < self.size:
+                self.free.append(buffer)
+
+def make_decoder(content_encoding):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    raise ContentDecodingError(f"Unsupported content-encoding '{encoding}'")
+
+class Body:
+    # Collects a response body into a pooled buffer, decoding and hashing it
+    # chunk by chunk. Decoded output is capped at `limit`, so a small
+    # compressed body cannot expand into gigabytes (a decompression bomb).
+    # `view` is a zero-copy memoryview of the decoded page and is only valid
+    # until release().
+    def __init__(self, pool, content_encoding=None, content_length=None, limit=MAX_CONTENT_SIZE_BYTES):
+        self.pool = pool
+        self.encoding = (content_encoding or "identity").strip().lower()
+        self.decoder = make_decoder(content_encoding)
+        self.limit = limit
+        expected = int(content_length) if content_length and self.decoder is None else 0
+        self.buffer = pool.acquire(min(expected, limit))
+        self.size = 0
+        self.wire_bytes = 0
+        self.hasher = hashlib.sha256()
+        self.view = None
+        self.content_hash = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def feed(self, chunk):
+        self.wire_bytes += len(chunk)
+        if self.wire_bytes > self.limit:
+            raise BodyTooLarge(self.wire_bytes)
+        if self.decoder is None:
+            self._write(chunk)
+            return
+        try:
+            # max_length stops inflating one byte past the limit; whatever
+            # input is left over stays in unconsumed_tail.
+            data = self.decoder.decompress(chunk, self.limit + 1 - self.size)
+        except zlib.error as e:
+            if self.encoding != "deflate" or self.size:
+                raise ContentDecodingError(f"Cannot decode {self.encoding} body: {e}")
+            # Some servers send raw deflate without the zlib header.
+            self.decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+            self.encoding = "deflate_raw"
+            self.wire_bytes -= len(chunk)
+            self.feed(chunk)
+            return
+        self._write(data)
+
+    def _write(self, data):
+        end = self.size + len(data)
+        if end > self.limit:
+            raise BodyTooLarge(end)
+        if end > len(self.buffer):
+            # Replacing the tail resizes in place (realloc) without
+            # zero-filling or copying what is already there.
+            self.buffer[self.size:] = data
+        else:
+            self.buffer[self.size:end] = data
+        self.hasher.update(data)
+        self.size = end
+
+    def finish(self):
+        if self.decoder is not None:
+            if self.decoder.unconsumed_tail:
+                raise BodyTooLarge(self.size)
+            self._write(self.decoder.flush())
+        BODY_DECODED_BYTES.labels(encoding=self.encoding).inc(self.size)
+        self.view = memoryview(self.buffer)[:self.size]
+        self.content_hash = self.hasher.hexdigest()
+        return self.view
+
+    def release(self):
+        if self.buffer is None:
+            return
+        buffer, self.buffer = self.buffer, None
+        if self.view is not None:
+            view, self.view = self.view, None
+            try:
+                view.release()
+            except BufferError:
+                # Still in use, e.g. by a scrape that outlived a crawl
+                # timeout; leave the buffer to the garbage collector.
+                return
+        self.pool.release(buffer)
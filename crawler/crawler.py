@@ -1,4 +1,5 @@
 import requests
+import time
 import uuid
 import traceback
 from urllib.parse import urlparse
@@ -9,119 +10,359 @@ from utils.config import (
     CONNECT_TIMEOUT, 
     READ_TIMEOUT, 
     OVERALL_CRAWL_TIMEOUT, 
-    MAX_CONTENT_SIZE_BYTES
+    MAX_CONTENT_SIZE_BYTES,
+    BODY_CHUNK_BYTES,
+    SLOW_CRAWL_TRACE_MS
 )
 from utils.logger import ConsoleLogger
-from crawler.utils import get_domain_from_url, calculate_hash, generate_embedding
+from utils.metrics import REGISTRY, StageTrace
+from crawler.utils import get_domain_from_url, calculate_hash
 from crawler.scraper import scrape_page
+from crawler.body import Body, BodyTooLarge, BufferPool
+from crawler.neardup import simhash
+from crawler.politeness import THROTTLE_STATUSES, classify_response, parse_retry_after
+from crawler.recrawl import GONE_STATUSES, conditional_headers
+
+STAGE_BOUNDS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+CRAWL_STAGE_MS = REGISTRY.histogram("crawler_stage_duration_ms", "Time spent in each crawl stage", STAGE_BOUNDS_MS, labels=("stage",))
+CRAWL_OUTCOMES = REGISTRY.counter("crawler_outcomes_total", "Crawl attempts by outcome", labels=("outcome",))
+CRAWLS_IN_FLIGHT = REGISTRY.gauge("crawler_in_flight", "URLs currently being crawled")
+DOWNLOADED_BYTES = REGISTRY.counter("crawler_downloaded_bytes_total", "Response body bytes received, before content-encoding is decoded")
 
 class Crawler:
-    def __init__(self, queue_manager, mongo_manager, qdrant_manager, robot_manager, proxy_manager):
+    def __init__(self, queue_manager, mongo_manager, qdrant_manager, robot_manager, proxy_manager, embedder, writer, near_dup_index, text_index=None, recrawl_scheduler=None, archive=None):
         self.queue_manager = queue_manager
         self.mongo_manager = mongo_manager
         self.qdrant_manager = qdrant_manager
         self.robot_manager = robot_manager
         self.proxy_manager = proxy_manager
+        self.embedder = embedder
+        self.writer = writer
+        self.near_dup_index = near_dup_index
+        self.text_index = text_index
+        self.recrawl = recrawl_scheduler
+        self.archive = archive
+        self.buffers = BufferPool()
         self.log = ConsoleLogger()
         self.log.info("Crawler instance for a worker is ready.")
     
-    @func_set_timeout(OVERALL_CRAWL_TIMEOUT)
-    def crawl_url(self, url_to_crawl: str) -> None:
-        request_id = uuid.uuid4().hex[:6]
-        short_url = url_to_crawl[:23] + "..." if len(url_to_crawl) > 26 else url_to_crawl
-        response = None 
+    @staticmethod
+    def shorten_url(url):
+        return url[:23] + "..." if len(url) > 26 else url
+
+    def revisit_state(self, url_to_crawl):
+        return self.recrawl.state_for(url_to_crawl) if self.recrawl is not None else None
+
+    def request_headers(self, revisit):
+        if revisit is None:
+            return HEADERS
+        return {**HEADERS, **conditional_headers(revisit)}
+
+    def check_url(self, request_id, url_to_crawl, short_url):
+        if (self.queue_manager.seen_filter is None and self.revisit_state(url_to_crawl) is None
+                and self.mongo_manager.url_exists(url_to_crawl)):
+            CRAWL_OUTCOMES.labels(outcome="already_crawled").inc()
+            self.log.warn(f"[{request_id}] URL already crawled, skipping: {short_url}", key="already_crawled")
+            return None
+
+        domain = get_domain_from_url(url_to_crawl)
+        if not domain:
+            raise ValueError("Could not determine domain from URL.")
+
+        if not self.robot_manager.can_fetch(url_to_crawl):
+            CRAWL_OUTCOMES.labels(outcome="robots_blocked").inc()
+            self.log.warn(f"[{request_id}] Blocked by robots.txt: {short_url}", key="robots_blocked")
+            return None
+        return domain
+
+    def check_content_type(self, request_id, short_url, content_type):
+        content_type = (content_type or '').lower()
+        if 'text/html' not in content_type:
+            CRAWL_OUTCOMES.labels(outcome="non_html").inc()
+            self.log.warn(f"[{request_id}] Skipping non-HTML content ({content_type}): {short_url}", key="non_html")
+            return False
+        return True
+
+    def check_content_length(self, request_id, short_url, content_length_str):
+        if content_length_str and int(content_length_str) > MAX_CONTENT_SIZE_BYTES:
+            CRAWL_OUTCOMES.labels(outcome="too_large").inc()
+            self.log.warn(f"[{request_id}] Content too large ({int(content_length_str) / 1024**2:.2f}MB), skipping: {short_url}", key="too_large")
+            return False
+        return True
+
+    def open_body(self, headers):
+        return Body(self.buffers, headers.get('content-encoding'), headers.get('content-length'))
+
+    def body_too_large(self, request_id, short_url):
+        CRAWL_OUTCOMES.labels(outcome="too_large").inc()
+        self.log.warn(f"[{request_id}] Content exceeds max size during download, skipping: {short_url}", key="too_large")
+
+    def record_revisit(self, request_id, short_url, revisit, headers, result):
+        schedule = self.recrawl.schedule(revisit, headers, result)
+        CRAWL_OUTCOMES.labels(outcome=result).inc()
+        self.writer.submit({"_id": revisit["_id"], **schedule}, update=True)
+        self.log.info(f"[{request_id}] {result.replace('_', ' ').capitalize()}, next visit in {schedule['revisit_interval'] / 3600:.1f}h: {short_url}")
+
+    def revisit_failed(self, request_id, short_url, revisit, result):
+        if revisit is None:
+            return
+        schedule = self.recrawl.back_off(revisit, result)
+        self.writer.submit({"_id": revisit["_id"], **schedule}, update=True)
+        self.log.info(f"[{request_id}] Revisit skipped ({result.replace('_', ' ')}), next attempt in {schedule['revisit_interval'] / 3600:.1f}h: {short_url}")
 
+    def remove_page(self, request_id, short_url, revisit):
+        doc_id = revisit["_id"]
         try:
-            if self.mongo_manager.url_exists(url_to_crawl):
-                self.log.warn(f"[{request_id}] URL already crawled, skipping: {short_url}")
-                return
+            self.mongo_manager.delete_metadata_many([doc_id])
+            self.qdrant_manager.delete_vectors([doc_id])
+        except Exception as e:
+            self.log.error(f"[{request_id}] Failed to remove gone page {doc_id}: {e}", key="remove_failed")
+            return
+        self.near_dup_index.remove(doc_id)
+        if self.text_index is not None:
+            self.text_index.remove_document(doc_id)
+        CRAWL_OUTCOMES.labels(outcome="gone").inc()
+        self.log.info(f"[{request_id}] Page is gone, removed from the index: {short_url}")
 
-            domain = get_domain_from_url(url_to_crawl)
-            if not domain:
-                raise ValueError("Could not determine domain from URL.")
+    def is_unchanged(self, request_id, short_url, revisit, content_hash, headers):
+        # Servers without validators still answer 200; an identical body
+        # skips parsing and embedding all the same.
+        if revisit is None or revisit.get("content_hash") != content_hash:
+            return False
+        self.record_revisit(request_id, short_url, revisit, headers, "unchanged")
+        return True
+
+    def is_near_duplicate(self, request_id, short_url, doc_id, fingerprint, content_hash=None):
+        if fingerprint is None:
+            # Pages without a single token (images, scripts only) have no
+            # SimHash; the exact hash still catches identical copies.
+            if content_hash is not None and self.mongo_manager.hash_exists(content_hash):
+                CRAWL_OUTCOMES.labels(outcome="duplicate").inc()
+                self.log.warn(f"[{request_id}] Duplicate content hash, skipping: {short_url}", key="duplicate")
+                return True
+            return False
+        existing_id = self.near_dup_index.find_or_add(fingerprint, doc_id)
+        if existing_id is not None:
+            CRAWL_OUTCOMES.labels(outcome="near_duplicate").inc()
+            self.log.warn(f"[{request_id}] Near-duplicate of {existing_id}, skipping: {short_url}", key="near_duplicate")
+            return True
+        return False
 
-            if not self.robot_manager.can_fetch(url_to_crawl):
-                self.log.warn(f"[{request_id}] Blocked by robots.txt: {short_url}")
+    def store_page(self, request_id, url_to_crawl, short_url, domain, content_hash, scraped_data, trace=None, revisit=None, headers=None, raw_content=None):
+        trace = trace or StageTrace(CRAWL_STAGE_MS)
+        headers = headers or {}
+        # A changed page keeps its id, so Mongo, Qdrant and the text index
+        # replace the old version instead of adding a second one.
+        common_id = revisit["_id"] if revisit is not None else str(uuid.uuid4())
+        with trace.stage("near_dup"):
+            fingerprint = simhash(scraped_data['content'])
+            if self.is_near_duplicate(request_id, short_url, common_id, fingerprint, content_hash):
+                if revisit is not None:
+                    self.writer.submit({"_id": common_id, **self.recrawl.schedule(revisit, headers, "changed")}, update=True)
                 return
 
-            proxy = self.proxy_manager.get_proxy()
-            timeout_config = (CONNECT_TIMEOUT, READ_TIMEOUT)
-            
-            try:
-                response = requests.get(
-                    url_to_crawl, headers=HEADERS, proxies=proxy, 
-                    timeout=timeout_config, verify=True, stream=True
+        recrawl = None
+        if revisit is not None:
+            recrawl = self.recrawl.schedule(revisit, headers, "changed")
+        elif self.recrawl is not None:
+            recrawl = self.recrawl.initial_schedule(headers)
+        try:
+            self._submit_page(
+                url_to_crawl, domain, content_hash, scraped_data, common_id, fingerprint, trace, recrawl, revisit is not None, raw_content
+            )
+        except Exception:
+            if revisit is None:
+                self.near_dup_index.remove(common_id)
+            raise
+
+        if self.text_index is not None:
+            with trace.stage("index"):
+                self.text_index.add_document(
+                    common_id, f"{scraped_data['title']} {scraped_data['description']} {scraped_data['content']}"
                 )
-                response.raise_for_status()
+
+        CRAWL_OUTCOMES.labels(outcome="updated" if revisit is not None else "stored").inc()
+        new_links = len(scraped_data['links'])
+        word_count = len(scraped_data['content'].split())
+        self.log.info(f"[{request_id}] Successfully crawled: {short_url} | {new_links} new links | {word_count} words")
+
+        with trace.stage("enqueue"):
+            for link in scraped_data['links']:
+                self.queue_manager.add_url(link, priority="low")
+
+    def archive_page(self, common_id, url_to_crawl, scraped_data, raw_content, trace):
+        if self.archive is None or raw_content is None:
+            return None
+        extracted = {field: scraped_data[field] for field in ("title", "description", "content")}
+        with trace.stage("archive"):
+            return self.archive.append(common_id, url_to_crawl, raw_content, extracted)
+
+    def _submit_page(self, url_to_crawl, domain, content_hash, scraped_data, common_id, fingerprint, trace, recrawl=None, update=False, raw_content=None):
+        text_for_embedding = f"{scraped_data['title']}. {scraped_data['description']}"
+        with trace.stage("embed"):
+            vector = self.embedder.embed(text_for_embedding)
+
+        if not vector:
+            raise ValueError("Failed to generate embedding vector.")
+
+        archive = self.archive_page(common_id, url_to_crawl, scraped_data, raw_content, trace)
+        document = self.mongo_manager.build_metadata_document(
+            doc_id=common_id, url=url_to_crawl, domain=domain,
+            content_hash=content_hash, title=scraped_data['title'],
+            description=scraped_data['description'], simhash=fingerprint, recrawl=recrawl, archive=archive
+        )
+        # With an archive the vector store keeps only a pointer to the page
+        # text instead of a full copy of it.
+        payload = {"url": url_to_crawl, "title": scraped_data['title']}
+        if archive is not None:
+            payload["archive"] = archive
+        else:
+            payload["content"] = scraped_data['content']
+        with trace.stage("submit"):
+            self.writer.submit(document, (common_id, vector, payload), update=update)
+
+    def process_content(self, request_id, url_to_crawl, short_url, domain, content_bytes, trace=None, revisit=None, headers=None, content_hash=None):
+        trace = trace or StageTrace(CRAWL_STAGE_MS)
+        if content_hash is None:
+            with trace.stage("hash"):
+                content_hash = calculate_hash(content_bytes)
+        if self.is_unchanged(request_id, short_url, revisit, content_hash, headers):
+            return
+        with trace.stage("scrape"):
+            scraped_data = scrape_page(content_bytes, url_to_crawl)
+        self.store_page(request_id, url_to_crawl, short_url, domain, content_hash, scraped_data, trace, revisit, headers, content_bytes)
+
+    def report_fetch(self, request_id, url_to_crawl, short_url, trace, status=None, retry_after=None, failed=False):
+        latency_ms = next((elapsed for name, elapsed in trace.stages if name == "fetch"), None)
+        outcome = classify_response(status, failed, fetched=latency_ms is not None)
+        if self.queue_manager.complete(url_to_crawl, outcome, latency_ms, parse_retry_after(retry_after)):
+            self.log.warn(f"[{request_id}] Backing off ({status or outcome}), requeued: {short_url}", key="requeued")
+        elif self.recrawl is not None:
+            revisit = self.recrawl.state_for(url_to_crawl)
+            if revisit is not None and status in GONE_STATUSES:
+                self.remove_page(request_id, short_url, revisit)
+            self.recrawl.discard(url_to_crawl)
+
+    def finish_trace(self, request_id, short_url, trace):
+        elapsed = trace.elapsed_ms()
+        CRAWL_STAGE_MS.labels(stage="total").observe(elapsed)
+        if SLOW_CRAWL_TRACE_MS and elapsed > SLOW_CRAWL_TRACE_MS:
+            self.log.warn(f"[{request_id}] Slow crawl ({elapsed:.0f}ms) for {short_url}: {trace.summary()}")
+
+    def _fetch(self, request_id, url_to_crawl, short_url, proxy, headers=HEADERS):
+        session = self.proxy_manager.session_for(proxy)
+        timeout_config = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            try:
+                response = session.get(url_to_crawl, headers=headers, timeout=timeout_config, verify=True, stream=True)
             except requests.exceptions.SSLError:
-                self.log.warn(f"[{request_id}] SSL Error. Retrying without verification: {short_url}")
-                response = requests.get(
-                    url_to_crawl, headers=HEADERS, proxies=proxy, 
-                    timeout=timeout_config, verify=False, stream=True
-                )
-                response.raise_for_status()
-            
-            content_type = response.headers.get('content-type', '').lower()
-            if 'text/html' not in content_type:
-                self.log.warn(f"[{request_id}] Skipping non-HTML content ({content_type}): {short_url}")
-                return
+                self.log.warn(f"[{request_id}] SSL Error. Retrying without verification: {short_url}", key="ssl_retry")
+                response = session.get(url_to_crawl, headers=headers, timeout=timeout_config, verify=False, stream=True)
+        except (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout):
+            # Through a proxy, the TCP connection is made to the proxy itself.
+            self.proxy_manager.report(proxy, False, (time.perf_counter() - started) * 1000)
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.proxy_manager.report(proxy, None)
+            raise
+        self.proxy_manager.report(proxy, response.status_code != 407, (time.perf_counter() - started) * 1000)
 
-            content_length_str = response.headers.get('content-length')
-            if content_length_str and int(content_length_str) > MAX_CONTENT_SIZE_BYTES:
-                self.log.warn(f"[{request_id}] Content too large ({int(content_length_str) / 1024**2:.2f}MB), skipping: {short_url}")
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    @func_set_timeout(OVERALL_CRAWL_TIMEOUT)
+    def _crawl(self, request_id, url_to_crawl, short_url, trace):
+        response = body = None
+        revisit = self.revisit_state(url_to_crawl)
+        try:
+            with trace.stage("check"):
+                domain = self.check_url(request_id, url_to_crawl, short_url)
+            if not domain:
+                self.revisit_failed(request_id, short_url, revisit, "robots_blocked")
                 return
 
-            content_bytes = b''
-            for chunk in response.iter_content(chunk_size=8192):
-                content_bytes += chunk
-                if len(content_bytes) > MAX_CONTENT_SIZE_BYTES:
-                    self.log.warn(f"[{request_id}] Content exceeds max size during download, skipping: {short_url}")
-                    return
+            proxy = self.proxy_manager.acquire()
+            with trace.stage("fetch"):
+                response = self._fetch(request_id, url_to_crawl, short_url, proxy, self.request_headers(revisit))
 
-            content_hash = calculate_hash(content_bytes)
+            if revisit is not None and response.status_code == 304:
+                self.record_revisit(request_id, short_url, revisit, response.headers, "not_modified")
+                return
 
-            if self.mongo_manager.hash_exists(content_hash):
-                self.log.warn(f"[{request_id}] Duplicate content hash, skipping: {short_url}")
+            if not self.check_content_type(request_id, short_url, response.headers.get('content-type')):
+                self.revisit_failed(request_id, short_url, revisit, "non_html")
                 return
 
-            scraped_data = scrape_page(content_bytes, url_to_crawl)
-            text_for_embedding = f"{scraped_data['title']}. {scraped_data['description']}"
-            vector = generate_embedding(text_for_embedding)
+            if not self.check_content_length(request_id, short_url, response.headers.get('content-length')):
+                self.revisit_failed(request_id, short_url, revisit, "too_large")
+                return
 
-            if not vector:
-                raise ValueError("Failed to generate embedding vector.")
+            # The body is decoded here, not by urllib3, so the size limit
+            # applies to the inflated page as it is produced.
+            body = self.open_body(response.headers)
+            with trace.stage("download"):
+                for chunk in response.raw.stream(BODY_CHUNK_BYTES, decode_content=False):
+                    body.feed(chunk)
+                content = body.finish()
+            DOWNLOADED_BYTES.inc(body.wire_bytes)
 
-            common_id = uuid.uuid4()
-            inserted = self.mongo_manager.insert_metadata(
-                doc_id=common_id, url=url_to_crawl, domain=domain,
-                content_hash=content_hash, title=scraped_data['title'],
-                description=scraped_data['description']
+            self.process_content(
+                request_id, url_to_crawl, short_url, domain, content, trace, revisit, response.headers, body.content_hash
             )
+        except BodyTooLarge:
+            self.body_too_large(request_id, short_url)
+            self.revisit_failed(request_id, short_url, revisit, "too_large")
+        finally:
+            if body is not None:
+                body.release()
+            if response:
+                response.close()
 
-            if inserted:
-                payload = {"url": url_to_crawl, "title": scraped_data['title'], "content": scraped_data['content']}
-                self.qdrant_manager.upsert_vector(point_id=common_id, vector=vector, payload=payload)
-                new_links = len(scraped_data['links'])
-                word_count = len(scraped_data['content'].split())
-                self.log.info(f"[{request_id}] Successfully crawled: {short_url} | {new_links} new links | {word_count} words")
-
-            for link in scraped_data['links']:
-                self.queue_manager.add_url(link, priority="low")
+    def crawl_url(self, url_to_crawl: str) -> None:
+        request_id = uuid.uuid4().hex[:6]
+        short_url = self.shorten_url(url_to_crawl)
+        trace = StageTrace(CRAWL_STAGE_MS)
+        status = retry_after = None
+        failed = False
+        CRAWLS_IN_FLIGHT.inc()
 
+        try:
+            self._crawl(request_id, url_to_crawl, short_url, trace)
         except FunctionTimedOut:
-            self.log.error(f"[{request_id}] Crawl process timed out (> {OVERALL_CRAWL_TIMEOUT}s) for: {short_url}. Skipping.")
+            failed = True
+            CRAWL_OUTCOMES.labels(outcome="timeout").inc()
+            self.log.error(f"[{request_id}] Crawl process timed out (> {OVERALL_CRAWL_TIMEOUT}s) for: {short_url}. Skipping.", key="crawl_timeout")
         except requests.exceptions.ConnectionError:
-            self.log.warn(f"[{request_id}] Connection error (DNS/Network) for: {short_url}. Skipping.")
+            failed = True
+            CRAWL_OUTCOMES.labels(outcome="connection_error").inc()
+            self.log.warn(f"[{request_id}] Connection error (DNS/Network) for: {short_url}. Skipping.", key="connection_error")
         except requests.exceptions.RequestException as e:
+            if e.response is not None:
+                status = e.response.status_code
+                retry_after = e.response.headers.get("Retry-After")
+            else:
+                failed = True
             if isinstance(e, requests.exceptions.Timeout):
-                 self.log.error(f"[{request_id}] Request timed out for: {short_url}")
+                 CRAWL_OUTCOMES.labels(outcome="request_timeout").inc()
+                 self.log.error(f"[{request_id}] Request timed out for: {short_url}", key="request_timeout")
+            elif status in THROTTLE_STATUSES:
+                 CRAWL_OUTCOMES.labels(outcome="throttled").inc()
             else:
-                 self.log.error(f"[{request_id}] Request failed: {short_url} :: {type(e).__name__}")
+                 CRAWL_OUTCOMES.labels(outcome="http_error" if isinstance(e, requests.exceptions.HTTPError) else "request_failed").inc()
+                 self.log.error(f"[{request_id}] Request failed: {short_url} :: {type(e).__name__}", key="request_failed")
         except ValueError as e:
+            CRAWL_OUTCOMES.labels(outcome="invalid").inc()
             self.log.error(f"[{request_id}] Internal value error processing {short_url}: {e}")
         except Exception as e:
+            CRAWL_OUTCOMES.labels(outcome="error").inc()
             error_details = traceback.format_exc()
             self.log.error(f"[{request_id}] Unhandled exception while processing {short_url}\n--- TRACEBACK ---\n{error_details}\n-----------------")
         finally:
-            if response:
-                response.close()
\ No newline at end of file
+            CRAWLS_IN_FLIGHT.dec()
+            self.report_fetch(request_id, url_to_crawl, short_url, trace, status, retry_after, failed)
+            self.finish_trace(request_id, short_url, trace)
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from crawler.utils import generate_embeddings, get_embedding_model
+from crawler.embedding_cache import EmbeddingCache
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_MS, EMBEDDING_STATS_INTERVAL, EMBEDDING_CACHE_PATH
+
+class EmbeddingBatcher:
+    def __init__(self, max_batch_size=EMBEDDING_BATCH_SIZE, max_wait_ms=EMBEDDING_BATCH_WAIT_MS, cache_path=EMBEDDING_CACHE_PATH):
+        self.log = ConsoleLogger()
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.pending = Queue()
+        self.batch_sizes = REGISTRY.histogram(
+            "embedding_batch_size", "Texts per encode call", [1, 2, 4, 8, 16, 32, 64, 128, 256]
+        )
+        self.queue_wait_ms = REGISTRY.histogram(
+            "embedding_queue_wait_ms", "Time a text waits for its batch", [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+        )
+        self.encode_ms = REGISTRY.histogram(
+            "embedding_encode_ms", "Time per encode call", [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+        )
+        REGISTRY.gauge("embedding_queue_depth", "Texts waiting to be embedded").set_function(self.pending.qsize)
+        self._stop = threading.Event()
+        self._submit_lock = threading.Lock()
+        self._last_report = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+        self.log.info(f"Embedding batcher started (batch size {self.max_batch_size}, max wait {max_wait_ms}ms)")
+
+    def embed(self, text):
+        if not text:
+            return []
+        future = Future()
+        # Checked under the lock close() stops with, so nothing is queued
+        # after close() has drained the queue and no caller waits forever.
+        with self._submit_lock:
+            if self._stop.is_set():
+                raise RuntimeError("Embedding batcher is shut down")
+            self.pending.put((text, time.monotonic(), future))
+        return future.result()
+
+    def _collect_batch(self):
+        try:
+            first = self.pending.get(timeout=0.5)
+        except Empty:
+            return []
+        batch = [first]
+        deadline = first[1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self.pending.get_nowait())
+                else:
+                    batch.append(self.pending.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Load the model here so the caller starts up without waiting for it.
+        try:
+            get_embedding_model()
+        except Exception as e:
+            self.log.error(f"Could not load embedding model: {e}")
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._encode_batch(batch)
+            self._maybe_report()
+
+    def _encode_batch(self, batch):
+        started = time.monotonic()
+        for _, enqueued_at, _ in batch:
+            self.queue_wait_ms.observe((started - enqueued_at) * 1000)
+        try:
+            vectors = self._embed_texts([text for text, _, _ in batch])
+        except Exception as e:
+            self.log.error(f"Embedding batch of {len(batch)} failed: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.encode_ms.observe((time.monotonic() - started) * 1000)
+        for (_, _, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def _embed_texts(self, texts):
+        # Titles and descriptions repeat across pages of a site, so only
+        # texts missing from the cache reach the model, each once.
+        vectors = self.cache.get_many(texts) if self.cache is not None else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            self.batch_sizes.observe(len(missing))
+            encoded = dict(zip(missing, generate_embeddings(missing)))
+            if self.cache is not None:
+                self.cache.put_many(encoded.items())
+            vectors.update(encoded)
+        return [vectors[text] for text in texts]
+
+    def _maybe_report(self):
+        now = time.monotonic()
+        if EMBEDDING_STATS_INTERVAL <= 0 or now - self._last_report < EMBEDDING_STATS_INTERVAL:
+            return
+        self._last_report = now
+        self.log.info(f"Embedding batch size: {self.batch_sizes.summary()}")
+        self.log.info(f"Embedding queue wait (ms): {self.queue_wait_ms.summary()}")
+        self.log.info(f"Embedding encode time (ms): {self.encode_ms.summary()}")
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot(),
+        }
+
+    def close(self):
+        with self._submit_lock:
+            self._stop.set()
+        # No timeout: a batch still encoding writes to the cache when it is
+        # done, so the cache can only be closed after the thread has exited.
+        self._thread.join()
+        while True:
+            try:
+                _, _, future = self.pending.get_nowait()
+            except Empty:
+                break
+            future.set_exception(RuntimeError("Embedding batcher is shut down"))
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+EMBEDDING_CACHE_REQUESTS = REGISTRY.counter("embedding_cache_requests_total", "Embedding cache lookups", labels=("result",))
+
+# Keeps each lookup under SQLite's default bound-parameter limit.
+LOOKUP_CHUNK = 500
+
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, backend=EMBEDDING_BACKEND):
+        self.log = ConsoleLogger()
+        self.path = path
+        self.max_entries = max_entries
+        # Vectors from another model or backend are not interchangeable, so
+        # both are part of the key.
+        self.namespace = f"{EMBEDDING_MODEL}\0{backend}\0".encode("utf-8")
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self.size = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        REGISTRY.gauge("embedding_cache_entries", "Vectors in the embedding cache").set_function(lambda: self.size)
+        self.log.info(f"Embedding cache opened with {self.size} vectors: {path}")
+
+    def key(self, text):
+        return hashlib.blake2b(self.namespace + text.encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, texts):
+        keys = {}
+        for text in texts:
+            keys.setdefault(self.key(text), text)
+        found = {}
+        key_list = list(keys)
+        try:
+            with self.lock:
+                for start in range(0, len(key_list), LOOKUP_CHUNK):
+                    chunk = key_list[start:start + LOOKUP_CHUNK]
+                    rows = self.connection.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                    for key, vector in rows:
+                        found[keys[key]] = np.frombuffer(vector, dtype=np.float32).tolist()
+        except sqlite3.Error as e:
+            self.log.error(f"Embedding cache lookup failed: {e}", key="embedding_cache")
+        EMBEDDING_CACHE_REQUESTS.labels(result="hit").inc(len(found))
+        EMBEDDING_CACHE_REQUESTS.labels(result="miss").inc(len(keys) - len(found))
+        return found
+
+    def put_many(self, items):
+        rows = [(self.key(text), np.asarray(vector, dtype=np.float32).tobytes()) for text, vector in items]
+        if not rows:
+            return
+        try:
+            with self.lock:
+                before = self.connection.total_changes
+                self.connection.execute("BEGIN")
+                self.connection.executemany("INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self.connection.execute("COMMIT")
+                self.size += self.connection.total_changes - before
+                if self.max_entries and self.size > self.max_entries:
+                    self._evict()
+        except sqlite3.Error as e:
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            self.log.error(f"Embedding cache write failed: {e}", key="embedding_cache")
+
+    def _evict(self):
+        # Drop the oldest tenth in one statement rather than one row per
+        # insert; rowids grow with insertion order.
+        excess = self.size - self.max_entries + self.max_entries // 10
+        before = self.connection.total_changes
+        self.connection.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)", (excess,)
+        )
+        self.size -= self.connection.total_changes - before
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,225 @@
+import os
+import json
+from utils.logger import ConsoleLogger
+from utils.config import FRONTIER_SEGMENT_BYTES
+
+SCHEMES = ("http://", "https://")
+
+def encode_url(url):
+    for code, scheme in enumerate(SCHEMES):
+        if url.startswith(scheme):
+            return bytes((code,)) + url[len(scheme):].encode("utf-8")
+    return b"\xff" + url.encode("utf-8")
+
+def decode_url(data):
+    code = data[0]
+    rest = data[1:].decode("utf-8")
+    return rest if code == 0xff else SCHEMES[code] + rest
+
+def encode_varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def read_varint(f):
+    shift = 0
+    value = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+class SegmentLog:
+    def __init__(self, directory, segment_bytes=FRONTIER_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        self.write_seq = (segments[-1] + 1) if segments else 0
+        self.writer = None
+        self.write_offset = 0
+        self.read_seq = segments[0] if segments else self.write_seq
+        self.read_offset = 0
+        self.reader = None
+        self.unread = 0
+
+    def _segments(self):
+        return sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:08d}.seg")
+
+    def append(self, url):
+        if self.writer is None or self.write_offset >= self.segment_bytes:
+            self._roll()
+        payload = encode_url(url)
+        record = encode_varint(len(payload)) + payload
+        self.writer.write(record)
+        self.write_offset += len(record)
+        self.unread += 1
+
+    def _roll(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.write_seq += 1
+        self.writer = open(self._path(self.write_seq), "ab")
+        self.write_offset = 0
+
+    def _open_reader(self):
+        if self.reader is not None:
+            return True
+        path = self._path(self.read_seq)
+        while not os.path.exists(path):
+            if self.read_seq >= self.write_seq:
+                return False
+            self.read_seq += 1
+            self.read_offset = 0
+            path = self._path(self.read_seq)
+        self.reader = open(path, "rb")
+        self.reader.seek(self.read_offset)
+        return True
+
+    def _advance_segment(self):
+        if self.read_seq >= self.write_seq:
+            return False
+        self.reader.close()
+        self.reader = None
+        self.read_seq += 1
+        self.read_offset = 0
+        return True
+
+    def _read_record(self):
+        if not self._open_reader():
+            return None
+        if self.writer is not None and self.read_seq == self.write_seq:
+            self.writer.flush()
+        start = self.reader.tell()
+        length = read_varint(self.reader)
+        data = self.reader.read(length) if length is not None else b""
+        if length is None or len(data) < length:
+            self.reader.seek(start)
+            if self._advance_segment():
+                return self._read_record()
+            return None
+        self.read_offset = self.reader.tell()
+        return decode_url(data)
+
+    def read(self, limit):
+        urls = []
+        while len(urls) < limit:
+            url = self._read_record()
+            if url is None:
+                break
+            urls.append(url)
+        self.unread = max(0, self.unread - len(urls))
+        return urls
+
+    def count_unread(self):
+        count = 0
+        for seq in range(self.read_seq, self.write_seq + 1):
+            path = self._path(seq)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if seq == self.read_seq:
+                    f.seek(self.read_offset)
+                while True:
+                    length = read_varint(f)
+                    # A record cut short by a crash is skipped by _read_record.
+                    if length is None or f.tell() + length > size:
+                        break
+                    f.seek(length, os.SEEK_CUR)
+                    count += 1
+        self.unread = count
+        return count
+
+    @property
+    def cursor(self):
+        return [self.read_seq, self.read_offset]
+
+    def restore_cursor(self, cursor):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.read_seq, self.read_offset = cursor
+
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+            os.fsync(self.writer.fileno())
+
+    def compact(self):
+        for seq in self._segments():
+            if seq < self.read_seq:
+                os.remove(self._path(seq))
+
+    def close(self):
+        self.flush()
+        for f in (self.writer, self.reader):
+            if f is not None:
+                f.close()
+        self.writer = None
+        self.reader = None
+
+class FrontierStore:
+    def __init__(self, directory, priorities):
+        self.log = ConsoleLogger()
+        self.directory = directory
+        self.state_path = os.path.join(directory, "state.json")
+        self.logs = {p: SegmentLog(os.path.join(directory, p)) for p in priorities}
+
+    def load(self):
+        pending = {p: [] for p in self.logs}
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                for priority, segment_log in self.logs.items():
+                    if priority in state["cursors"]:
+                        segment_log.restore_cursor(state["cursors"][priority])
+                    pending[priority] = state["pending"].get(priority, [])
+            except (OSError, ValueError, KeyError) as e:
+                self.log.error(f"Could not load frontier checkpoint, replaying segments from the start: {e}")
+        for segment_log in self.logs.values():
+            segment_log.count_unread()
+        restored = sum(len(urls) for urls in pending.values())
+        spilled = sum(segment_log.unread for segment_log in self.logs.values())
+        self.log.info(f"Frontier restored: {restored} URLs in memory, {spilled} URLs on disk")
+        return pending
+
+    def append(self, priority, url):
+        self.logs[priority].append(url)
+
+    def read(self, priority, limit):
+        return self.logs[priority].read(limit)
+
+    def unread(self, priority):
+        return self.logs[priority].unread
+
+    def checkpoint(self, pending):
+        for segment_log in self.logs.values():
+            segment_log.flush()
+        state = {
+            "cursors": {p: segment_log.cursor for p, segment_log in self.logs.items()},
+            "pending": pending,
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        for segment_log in self.logs.values():
+            segment_log.compact()
+
+    def close(self):
+        for segment_log in self.logs.values():
+            segment_log.close()
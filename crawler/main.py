@@ -1,64 +1,227 @@
 import os
-import time
+import asyncio
+import threading
+import multiprocessing
 from concurrent.futures import ThreadPoolExecutor
 from crawler.queue import URLQueueManager
+from crawler.frontier import FrontierStore
 from database.mongodb import MongoDBManager
 from database.qdrantdb import QdrantDBManager
+from database.writer import WriteBehindBuffer
+from database.archive import ContentArchive
 from crawler.robot import RobotManager
+from crawler.politeness import DomainRateController
+from crawler.recrawl import RecrawlScheduler
 from crawler.proxies import ProxyManager
 from crawler.crawler import Crawler
-from crawler.utils import get_domain_from_url
+from crawler.embedder import EmbeddingBatcher
+from crawler.async_crawler import AsyncCrawler
+from crawler.seen import SeenURLFilter
+from crawler.neardup import NearDuplicateIndex
+from index.inverted import InvertedIndex
+from crawler.sharding import ShardRouter, start_broker, connect_broker, parse_address, broker_authkey, configured_shard_count, shard_path
 from utils.logger import ConsoleLogger
-from utils.config import MAX_CRAWLER_WORKERS, QUEUE_FETCH_TIMEOUT
+from utils.metrics import REGISTRY, serve_metrics, MetricsDumper
+from utils.config import (
+    MAX_CRAWLER_WORKERS,
+    QUEUE_FETCH_TIMEOUT,
+    CRAWL_MODE,
+    FRONTIER_DIR,
+    QUEUE_PRIORITIES,
+    SEEN_FILTER_PATH,
+    NEAR_DUP_INDEX_PATH,
+    INDEX_DIR,
+    ROBOTS_CACHE_PATH,
+    CRAWLER_SHARD_IDS,
+    BROKER_ADDRESS,
+    BROKER_AUTHKEY,
+    ASYNC_CONCURRENCY,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_DUMP_PATH,
+    METRICS_DUMP_INTERVAL,
+    POLITENESS_ADAPTIVE,
+    RECRAWL_ENABLED,
+    ARCHIVE_DIR
+)
 
 log = ConsoleLogger() 
 
-def worker_task(queue_manager, crawler_instance):
-    while True:
-        url = queue_manager.get_next_url()
+def worker_task(queue_manager, crawler_instance, stop_event):
+    while not stop_event.is_set():
+        url = queue_manager.get_next_url(timeout=QUEUE_FETCH_TIMEOUT)
         if url:
             try:
                 crawler_instance.crawl_url(url)
             except Exception as e:
                 log.error(f"FATAL ERROR processing {url}: {e}")
-        else:
-            time.sleep(QUEUE_FETCH_TIMEOUT)
 
-def main():
-    queue_manager = URLQueueManager()
+def start_metrics(router):
+    metrics_server = None
+    if METRICS_PORT > 0:
+        port = METRICS_PORT + (router.shard_id if router else 0)
+        try:
+            metrics_server = serve_metrics(METRICS_HOST, port)
+            log.info(f"Metrics available at http://{METRICS_HOST}:{port}/metrics")
+        except OSError as e:
+            log.warn(f"Could not start metrics endpoint on port {port}: {e}")
+    dumper = None
+    if METRICS_DUMP_PATH and METRICS_DUMP_INTERVAL > 0:
+        dumper = MetricsDumper(shard_path(METRICS_DUMP_PATH, router), METRICS_DUMP_INTERVAL)
+    return metrics_server, dumper
+
+def run_crawler(router=None):
     mongo_manager = MongoDBManager()
     qdrant_manager = QdrantDBManager()
     proxy_manager = ProxyManager()
-    robot_manager = RobotManager()
+    robot_manager = RobotManager(cache_path=shard_path(ROBOTS_CACHE_PATH, router))
 
     if mongo_manager.metadata_collection is None or qdrant_manager.client is None:
         log.error("Database connection failed. Exiting")
         return
 
+    frontier_store = FrontierStore(shard_path(FRONTIER_DIR, router), QUEUE_PRIORITIES) if FRONTIER_DIR else None
+    seen_filter = SeenURLFilter(snapshot_path=shard_path(SEEN_FILTER_PATH, router))
+    seen_filter.load_or_rebuild(mongo_manager, accept=router.is_local if router else None, use_snapshot=frontier_store is not None)
+    robot_manager.start_autosave()
+    rate_controller = DomainRateController(robot_manager) if POLITENESS_ADAPTIVE else None
+    queue_manager = URLQueueManager(
+        seen_filter=seen_filter, store=frontier_store, router=router, robot_manager=robot_manager,
+        rate_controller=rate_controller
+    )
+    queue_manager.start_checkpointing()
+    if router:
+        router.start(queue_manager)
+    recrawl_scheduler = None
+    if RECRAWL_ENABLED:
+        recrawl_scheduler = RecrawlScheduler(mongo_manager, queue_manager, shard=(router.shard_id, router.shard_count) if router else None)
+        recrawl_scheduler.start()
+
+    near_dup_index = NearDuplicateIndex(snapshot_path=shard_path(NEAR_DUP_INDEX_PATH, router))
+    near_dup_index.load_or_rebuild(mongo_manager)
+    near_dup_index.start_autosave()
+    text_index = InvertedIndex(shard_path(INDEX_DIR, router)) if INDEX_DIR else None
+    archive = ContentArchive(shard_path(ARCHIVE_DIR, router)) if ARCHIVE_DIR else None
+
     try:
         file_path = os.path.join(os.path.dirname(__file__), "data/urls.txt")
         with open(file_path, "r") as f:
             initial_urls = [line.strip() for line in f if line.strip()]
             queued_count = 0
             for url in initial_urls:
-                if get_domain_from_url(url) and not mongo_manager.url_exists(url):
-                    queue_manager.add_url(url, priority="high")
+                if router and not router.is_local(url):
+                    continue
+                if queue_manager.add_url(url, priority="high"):
                     queued_count += 1
             log.info(f"Queued {queued_count} new initial URLs to crawl")
     except FileNotFoundError:
         log.warn("⚠️ `data/urls.txt` not found. Crawler will wait for new URLs discovered")
     
+    embedder = EmbeddingBatcher()
+    writer = WriteBehindBuffer(mongo_manager, qdrant_manager, on_discard=near_dup_index.remove_many)
+
     crawler_instance = Crawler(
         queue_manager=queue_manager,
         mongo_manager=mongo_manager,
         qdrant_manager=qdrant_manager,
         robot_manager=robot_manager,
-        proxy_manager=proxy_manager
+        proxy_manager=proxy_manager,
+        embedder=embedder,
+        writer=writer,
+        near_dup_index=near_dup_index,
+        text_index=text_index,
+        recrawl_scheduler=recrawl_scheduler,
+        archive=archive
+    )
+
+    REGISTRY.gauge("crawler_workers", "Configured concurrent crawls").set(
+        ASYNC_CONCURRENCY if CRAWL_MODE == "async" else MAX_CRAWLER_WORKERS
     )
+    metrics_server, metrics_dumper = start_metrics(router)
 
-    with ThreadPoolExecutor(max_workers=MAX_CRAWLER_WORKERS) as executor:
-        for _ in range(MAX_CRAWLER_WORKERS):
-            executor.submit(worker_task, queue_manager, crawler_instance)
+    stop_event = threading.Event()
+    executor = None
+    try:
+        if CRAWL_MODE == "async":
+            asyncio.run(AsyncCrawler(crawler_instance).run())
+        else:
+            executor = ThreadPoolExecutor(max_workers=MAX_CRAWLER_WORKERS)
+            for _ in range(MAX_CRAWLER_WORKERS):
+                executor.submit(worker_task, queue_manager, crawler_instance, stop_event)
+            stop_event.wait()
+    except KeyboardInterrupt:
+        log.warn("Interrupted. Shutting down crawler")
+    finally:
+        stop_event.set()
+        if executor:
+            executor.shutdown(wait=True)
+        if recrawl_scheduler:
+            recrawl_scheduler.close()
+        embedder.close()
+        writer.close()
+        if router:
+            router.close()
+        queue_manager.close()
+        near_dup_index.close()
+        if text_index:
+            text_index.close()
+        if archive:
+            archive.close()
+        robot_manager.close()
+        proxy_manager.close()
+        if metrics_dumper:
+            metrics_dumper.close()
+        if metrics_server:
+            metrics_server.shutdown()
+
+def run_shard(shard_id, shard_count, broker_address, authkey):
+    broker = connect_broker(broker_address, authkey)
+    run_crawler(router=ShardRouter(shard_id, shard_count, broker))
+
+def run_sharded():
+    shard_count = configured_shard_count()
+    if CRAWLER_SHARD_IDS:
+        shard_ids = [int(shard_id) for shard_id in CRAWLER_SHARD_IDS.split(",") if shard_id.strip()]
+    else:
+        shard_ids = list(range(shard_count))
+
+    broker = None
+    if BROKER_ADDRESS:
+        # A shared broker was started separately; its key cannot be guessed.
+        if not BROKER_AUTHKEY:
+            log.error("BROKER_AUTHKEY must be set to connect to the broker at BROKER_ADDRESS")
+            return
+        authkey = BROKER_AUTHKEY.encode()
+        broker_address = parse_address(BROKER_ADDRESS)
+    else:
+        authkey = broker_authkey(BROKER_AUTHKEY)
+        broker = start_broker(("127.0.0.1", 0), authkey)
+        broker_address = broker.address
+
+    log.info(f"Starting {len(shard_ids)} crawler processes for shards {shard_ids} of {shard_count}")
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_shard, args=(shard_id, shard_count, broker_address, authkey), name=f"crawler-shard-{shard_id}")
+        for shard_id in shard_ids
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        log.warn("Interrupted. Waiting for crawler processes to shut down")
+        for process in processes:
+            process.join()
+    finally:
+        if broker:
+            broker.shutdown()
+
+def main():
+    if configured_shard_count():
+        run_sharded()
+    else:
+        run_crawler()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
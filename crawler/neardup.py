@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import uuid
+import struct
+import hashlib
+import threading
+import numpy as np
+from datetime import datetime
+from utils.logger import ConsoleLogger
+from utils.config import (
+    NEAR_DUP_DISTANCE,
+    NEAR_DUP_SHINGLE_SIZE,
+    NEAR_DUP_INDEX_PATH,
+    NEAR_DUP_SNAPSHOT_INTERVAL
+)
+
+FINGERPRINT_BITS = 64
+SNAPSHOT_MAGIC = b"SMH1"
+HEADER_FORMAT = "<4sdIQ"
+RECORD_FORMAT = "<Q16s"
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+BIT_SHIFTS = np.arange(FINGERPRINT_BITS, dtype=np.uint64)
+
+def simhash(text, shingle_size=NEAR_DUP_SHINGLE_SIZE):
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if not tokens:
+        return None
+    if len(tokens) < shingle_size:
+        shingles = tokens
+    else:
+        shingles = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    counts = {}
+    for shingle in shingles:
+        counts[shingle] = counts.get(shingle, 0) + 1
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in counts),
+        dtype=np.uint64, count=len(counts)
+    )
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+    bits = ((hashes[:, None] >> BIT_SHIFTS) & np.uint64(1)).astype(np.int64)
+    totals = weights @ (2 * bits - 1)
+    fingerprint = 0
+    for position in np.flatnonzero(totals > 0):
+        fingerprint |= 1 << int(position)
+    return fingerprint
+
+class NearDuplicateIndex:
+    def __init__(self, max_distance=NEAR_DUP_DISTANCE, snapshot_path=NEAR_DUP_INDEX_PATH):
+        self.log = ConsoleLogger()
+        self.max_distance = max_distance
+        self.snapshot_path = snapshot_path
+        num_bands = max_distance + 1
+        band_width = FINGERPRINT_BITS // num_bands
+        self.bands = []
+        for band in range(num_bands):
+            start = band * band_width
+            width = FINGERPRINT_BITS - start if band == num_bands - 1 else band_width
+            self.bands.append((start, (1 << width) - 1))
+        self.tables = [{} for _ in self.bands]
+        self.fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._autosave_thread = None
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> start) & mask for start, mask in self.bands]
+
+    def _find(self, fingerprint, band_keys, exclude=None):
+        for table, key in zip(self.tables, band_keys):
+            for candidate, doc_id in table.get(key, ()):
+                if doc_id != exclude and (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    return doc_id
+        return None
+
+    def _add(self, fingerprint, doc_id, band_keys):
+        # A revisited page replaces its earlier fingerprint.
+        if doc_id in self.fingerprints:
+            self._remove(doc_id)
+        for table, key in zip(self.tables, band_keys):
+            table.setdefault(key, []).append((fingerprint, doc_id))
+        self.fingerprints[doc_id] = fingerprint
+
+    def find(self, fingerprint):
+        with self.lock:
+            return self._find(fingerprint, self._band_keys(fingerprint))
+
+    def add(self, fingerprint, doc_id):
+        with self.lock:
+            self._add(fingerprint, doc_id, self._band_keys(fingerprint))
+
+    def find_or_add(self, fingerprint, doc_id):
+        band_keys = self._band_keys(fingerprint)
+        with self.lock:
+            existing = self._find(fingerprint, band_keys, exclude=doc_id)
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self.misses += 1
+            self._add(fingerprint, doc_id, band_keys)
+            return None
+
+    def _remove(self, doc_id):
+        fingerprint = self.fingerprints.pop(doc_id, None)
+        if fingerprint is None:
+            return
+        for table, key in zip(self.tables, self._band_keys(fingerprint)):
+            bucket = table.get(key)
+            if bucket:
+                bucket[:] = [entry for entry in bucket if entry[1] != doc_id]
+                if not bucket:
+                    del table[key]
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def remove_many(self, doc_ids):
+        with self.lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def stats(self):
+        return {"size": len(self.fingerprints), "hits": self.hits, "misses": self.misses}
+
+    def load_or_rebuild(self, mongo_manager):
+        since = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                since = datetime.utcfromtimestamp(self._load())
+                self.log.info(f"Loaded near-duplicate index snapshot with {len(self)} fingerprints")
+            except (OSError, ValueError, struct.error) as e:
+                self.log.warn(f"Could not load near-duplicate index snapshot, rebuilding: {e}")
+
+        added = 0
+        for doc_id, fingerprint in mongo_manager.iter_fingerprints(since=since):
+            if self.fingerprints.get(doc_id) != fingerprint:
+                self.add(fingerprint, doc_id)
+                added += 1
+        self.log.info(f"Near-duplicate index rebuilt from metadata: {added} fingerprints added")
+
+    def _load(self):
+        with open(self.snapshot_path, "rb") as f:
+            magic, timestamp, max_distance, count = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a near-duplicate index snapshot: {self.snapshot_path}")
+            record_size = struct.calcsize(RECORD_FORMAT)
+            data = f.read(record_size * count)
+        for fingerprint, doc_bytes in struct.iter_unpack(RECORD_FORMAT, data):
+            self.add(fingerprint, str(uuid.UUID(bytes=doc_bytes)))
+        return timestamp
+
+    def save(self):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            with self.lock:
+                records = list(self.fingerprints.items())
+            with open(tmp_path, "wb") as f:
+                f.write(struct.pack(HEADER_FORMAT, SNAPSHOT_MAGIC, time.time(), self.max_distance, len(records)))
+                for doc_id, fingerprint in records:
+                    f.write(struct.pack(RECORD_FORMAT, fingerprint, uuid.UUID(doc_id).bytes))
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            self.log.error(f"Failed to save near-duplicate index snapshot: {e}")
+
+    def _autosave(self, interval):
+        while not self._stop.wait(interval):
+            self.save()
+
+    def start_autosave(self, interval=NEAR_DUP_SNAPSHOT_INTERVAL):
+        if interval <= 0 or self._autosave_thread:
+            return
+        self._autosave_thread = threading.Thread(target=self._autosave, args=(interval,), name="near-dup-autosave", daemon=True)
+        self._autosave_thread.start()
+
+    def close(self):
+        self._stop.set()
+        self.save()
+        self.log.info(f"Near-duplicate index: {self.hits} hits, {self.misses} misses, {len(self)} fingerprints")
@@ -0,0 +1,228 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from utils.metrics import REGISTRY
+from utils.config import (
+    DOMAIN_CRAWL_DELAY,
+    OVERALL_CRAWL_TIMEOUT,
+    POLITENESS_MIN_DELAY,
+    POLITENESS_MAX_DELAY,
+    POLITENESS_MAX_CONCURRENCY,
+    POLITENESS_RATE_STEP,
+    POLITENESS_INCREASE_AFTER,
+    POLITENESS_DECREASE_FACTOR,
+    POLITENESS_LATENCY_TARGET_MS,
+    POLITENESS_ERROR_RATE,
+    POLITENESS_BACKOFF_BASE,
+    POLITENESS_MAX_RETRIES,
+    POLITENESS_STATE_SIZE
+)
+
+THROTTLE_STATUSES = (429, 503)
+
+POLITENESS_EVENTS = REGISTRY.counter("politeness_events_total", "Rate controller decisions", labels=("event",))
+POLITENESS_DOMAINS = REGISTRY.gauge("politeness_domains", "Tracked domains by rate controller state", labels=("state",))
+
+def classify_response(status=None, failed=False, fetched=True):
+    if status in THROTTLE_STATUSES:
+        return "throttled"
+    if failed or (status is not None and status >= 500):
+        return "error"
+    return "ok" if fetched else "skipped"
+
+def parse_retry_after(value, now=None):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+    return max(0.0, retry_at - (now or time.time()))
+
+class DomainState:
+    __slots__ = ("rate", "concurrency", "leases", "latency_ms", "error_rate", "responses", "failures", "backoff_until", "attempts")
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.concurrency = 1
+        self.leases = deque()
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.responses = 0
+        self.failures = 0
+        self.backoff_until = 0.0
+        # Retries per URL; they go when the domain's state is evicted.
+        self.attempts = {}
+
+class DomainRateController:
+    # Per-domain AIMD: every POLITENESS_INCREASE_AFTER responses either add
+    # POLITENESS_RATE_STEP requests/s or one concurrent fetch, or, if latency
+    # or the error rate is over target, cut both multiplicatively. 429/503 cut
+    # immediately and pause the domain for Retry-After or an exponential
+    # backoff. A domain starts at DOMAIN_CRAWL_DELAY and a healthy one speeds
+    # up to POLITENESS_MIN_DELAY; robots Crawl-delay is never exceeded. The
+    # controller is opt-in through POLITENESS_ADAPTIVE.
+    def __init__(self, robot_manager=None):
+        self.robot_manager = robot_manager
+        self.max_rate = 1.0 / max(POLITENESS_MIN_DELAY, 0.001)
+        self.min_rate = 1.0 / POLITENESS_MAX_DELAY
+        self.initial_rate = min(self.max_rate, 1.0 / DOMAIN_CRAWL_DELAY) if DOMAIN_CRAWL_DELAY > 0 else self.max_rate
+        self.lease_timeout = OVERALL_CRAWL_TIMEOUT * 2
+        self.domains = OrderedDict()
+        self.lock = threading.Lock()
+        POLITENESS_DOMAINS.labels(state="tracked").set_function(lambda: len(self.domains))
+        POLITENESS_DOMAINS.labels(state="backing_off").set_function(self.backing_off_count)
+
+    def _state(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = DomainState(min(self.initial_rate, self._rate_ceiling(domain)))
+            while len(self.domains) > POLITENESS_STATE_SIZE:
+                self.domains.popitem(last=False)
+        else:
+            self.domains.move_to_end(domain)
+        return state
+
+    def _robots_delay(self, domain):
+        if self.robot_manager is None:
+            return 0.0
+        return self.robot_manager.get_crawl_delay(domain) or 0.0
+
+    def _rate_ceiling(self, domain):
+        robots_delay = self._robots_delay(domain)
+        return min(self.max_rate, 1.0 / robots_delay) if robots_delay > 0 else self.max_rate
+
+    def _concurrency_ceiling(self, domain):
+        return 1 if self._robots_delay(domain) > 0 else POLITENESS_MAX_CONCURRENCY
+
+    def interval(self, domain):
+        with self.lock:
+            state = self._state(domain)
+            return 1.0 / min(state.rate, self._rate_ceiling(domain))
+
+    def not_before(self, domain):
+        with self.lock:
+            state = self.domains.get(domain)
+            return state.backoff_until if state is not None else 0.0
+
+    def can_start(self, domain, now):
+        with self.lock:
+            state = self._state(domain)
+            while state.leases and now - state.leases[0] > self.lease_timeout:
+                state.leases.popleft()
+            return len(state.leases) < min(state.concurrency, self._concurrency_ceiling(domain))
+
+    def acquire(self, domain, now):
+        with self.lock:
+            self._state(domain).leases.append(now)
+
+    def release(self, domain, url, outcome, latency_ms=None, retry_after=None, now=None):
+        now = now or time.time()
+        with self.lock:
+            state = self._state(domain)
+            if state.leases:
+                state.leases.popleft()
+            attempts = state.attempts.pop(url, 0)
+            if outcome == "ok":
+                self._on_success(domain, state, latency_ms)
+            if outcome not in ("throttled", "error"):
+                return state.backoff_until, None
+            # A retry failing again says more about the URL than the host, so
+            # only 429/503 and first attempts feed the domain's error signals.
+            if outcome == "throttled" or attempts == 0:
+                self._on_failure(state, outcome, retry_after, now)
+            return state.backoff_until, self._retry_delay(state, url, attempts + 1, retry_after)
+
+    def _decrease(self, state, event):
+        # Cut from the rate the domain can actually sustain at its concurrency
+        # and latency; halving an allowance it never reached changes nothing.
+        rate = state.rate
+        if state.latency_ms:
+            rate = min(rate, state.concurrency * 1000.0 / state.latency_ms)
+        state.rate = max(self.min_rate, rate * POLITENESS_DECREASE_FACTOR)
+        state.concurrency = max(1, int(state.concurrency * POLITENESS_DECREASE_FACTOR))
+        state.responses = 0
+        POLITENESS_EVENTS.labels(event=event).inc()
+
+    def _on_success(self, domain, state, latency_ms):
+        state.failures = 0
+        state.error_rate *= 0.9
+        if latency_ms is not None:
+            state.latency_ms = latency_ms if state.latency_ms is None else 0.8 * state.latency_ms + 0.2 * latency_ms
+        state.responses += 1
+        if state.responses < POLITENESS_INCREASE_AFTER:
+            return
+        if state.latency_ms is not None and state.latency_ms > POLITENESS_LATENCY_TARGET_MS:
+            self._decrease(state, "slow_decrease")
+            return
+        state.responses = 0
+        if state.error_rate > POLITENESS_ERROR_RATE:
+            return
+        ceiling = self._rate_ceiling(domain)
+        # Grow whichever limit is binding: with slow responses the allowed rate
+        # is unreachable until more fetches can overlap.
+        concurrency_bound = state.latency_ms is not None and state.rate * state.latency_ms / 1000.0 > state.concurrency
+        if (concurrency_bound or state.rate >= ceiling) and state.concurrency < self._concurrency_ceiling(domain):
+            state.concurrency += 1
+            POLITENESS_EVENTS.labels(event="concurrency_increase").inc()
+        elif state.rate < ceiling:
+            state.rate = min(ceiling, state.rate + POLITENESS_RATE_STEP)
+            POLITENESS_EVENTS.labels(event="rate_increase").inc()
+
+    def _on_failure(self, state, outcome, retry_after, now):
+        POLITENESS_EVENTS.labels(event=outcome).inc()
+        state.failures += 1
+        state.error_rate = 0.9 * state.error_rate + 0.1
+        state.responses += 1
+        backing_off = state.backoff_until > now
+        if outcome == "throttled":
+            # Responses to requests sent before the first 429 arrive during the
+            # pause and must not cut the rate again.
+            if not backing_off:
+                self._decrease(state, "throttle_decrease")
+            backoff = POLITENESS_BACKOFF_BASE * 2 ** (state.failures - 1)
+            if retry_after is not None:
+                backoff = max(backoff, retry_after)
+                POLITENESS_EVENTS.labels(event="retry_after").inc()
+        else:
+            # A single 5xx or timeout only delays the failing URL; the domain
+            # pauses once failures repeat and slows down once they are common.
+            if state.responses >= POLITENESS_INCREASE_AFTER and (state.failures > 1 or state.error_rate > POLITENESS_ERROR_RATE):
+                self._decrease(state, "error_decrease")
+            if state.failures < 2:
+                return
+            backoff = POLITENESS_BACKOFF_BASE * 2 ** (state.failures - 2)
+        state.backoff_until = max(state.backoff_until, now + min(POLITENESS_MAX_DELAY, backoff))
+
+    def _retry_delay(self, state, url, attempts, retry_after):
+        if attempts > POLITENESS_MAX_RETRIES:
+            POLITENESS_EVENTS.labels(event="give_up").inc()
+            return None
+        state.attempts[url] = attempts
+        POLITENESS_EVENTS.labels(event="requeue").inc()
+        delay = POLITENESS_BACKOFF_BASE * 2 ** (attempts - 1)
+        return min(POLITENESS_MAX_DELAY, max(delay, retry_after or 0))
+
+    def backing_off_count(self):
+        now = time.time()
+        with self.lock:
+            return sum(1 for state in self.domains.values() if state.backoff_until > now)
+
+    def stats(self, domain):
+        with self.lock:
+            state = self.domains.get(domain)
+            if state is None:
+                return None
+            return {
+                "delay": 1.0 / state.rate,
+                "concurrency": state.concurrency,
+                "in_flight": len(state.leases),
+                "latency_ms": state.latency_ms,
+                "error_rate": state.error_rate,
+                "failures": state.failures,
+                "backoff_until": state.backoff_until
+            }
@@ -1,15 +1,89 @@
 import os
+import time
 import random
+import threading
+import requests
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlparse
 from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import (
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    PROXY_RELOAD_INTERVAL,
+    PROXY_FAILURE_THRESHOLD,
+    PROXY_OPEN_SECONDS,
+    PROXY_MAX_OPEN_SECONDS,
+    PROXY_LATENCY_FLOOR_MS,
+    PROXY_POOL_SIZE
+)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+CIRCUIT_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+PROXY_REQUESTS = REGISTRY.counter("proxy_requests_total", "Requests sent through each proxy", labels=("proxy", "result"))
+PROXY_LATENCY = REGISTRY.gauge("proxy_latency_ms", "Moving average of proxy response latency", labels=("proxy",))
+PROXY_CIRCUIT = REGISTRY.gauge("proxy_circuit_state", "Proxy circuit breaker state (0 closed, 1 half-open, 2 open)", labels=("proxy",))
+
+def create_session(proxy_url=None):
+    session = requests.Session()
+    # Sessions are shared by every crawled site; like a bare requests.get,
+    # they must not store cookies and replay them on later fetches.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = requests.adapters.HTTPAdapter(pool_connections=PROXY_POOL_SIZE, pool_maxsize=PROXY_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if proxy_url:
+        session.proxies = {"http": proxy_url, "https": proxy_url}
+    return session
+
+class ProxyState:
+    def __init__(self, url):
+        self.url = url
+        parsed = urlparse(url)
+        # Credentials stay out of logs and metric labels.
+        self.label = f"{parsed.hostname}:{parsed.port}" if parsed.hostname else url
+        self.proxies = {"http": url, "https": url}
+        self.session = create_session(url)
+        self.success_rate = 1.0
+        self.latency_ms = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.circuit = CLOSED
+        self.open_seconds = PROXY_OPEN_SECONDS
+        self.retry_at = 0.0
+        self.probe_started = None
+
+    def weight(self):
+        latency = self.latency_ms if self.latency_ms is not None else PROXY_LATENCY_FLOOR_MS
+        return max(self.success_rate, 0.01) ** 2 / (latency + PROXY_LATENCY_FLOOR_MS)
+
+    def stats(self):
+        return {
+            "proxy": self.label,
+            "circuit": self.circuit,
+            "success_rate": round(self.success_rate, 4),
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "weight": self.weight()
+        }
 
 class ProxyManager:
     def __init__(self, proxy_file_path=None):
         self.log = ConsoleLogger()
         base_dir = os.path.dirname(os.path.abspath(__file__))
         default_path = os.path.join(base_dir, "data", "proxies.txt")
-        proxy_file_path = proxy_file_path or default_path
+        self.proxy_file_path = proxy_file_path or default_path
+        self.direct_session = create_session()
+        self.probe_timeout = CONNECT_TIMEOUT + READ_TIMEOUT
+        self.lock = threading.Lock()
+        self.proxies = {}
+        self.file_mtime = None
+        self.next_reload_check = 0.0
 
-        self.proxies = self._load_proxies(proxy_file_path)
+        self._reload(time.time(), initial=True)
         if self.proxies:
             self.log.info(f"Loaded {len(self.proxies)} proxies")
         else:
@@ -19,16 +93,115 @@ class ProxyManager:
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 return [line.strip() for line in f if line.strip()]
-        except FileNotFoundError:
-            self.log.error(f"Proxy file not found: {file_path}")
+        except OSError as e:
+            self.log.error(f"Could not read proxy file {file_path}: {e}")
             return []
 
-    def get_proxy(self):
-        if not self.proxies:
-            return None
-        proxy_url = random.choice(self.proxies)
-        self.log.debug(f"Selected proxy: {proxy_url}")
-        return {
-            "http": proxy_url,
-            "https": proxy_url
-        }
\ No newline at end of file
+    def _reload(self, now, initial=False):
+        self.next_reload_check = now + PROXY_RELOAD_INTERVAL
+        try:
+            mtime = os.stat(self.proxy_file_path).st_mtime
+        except OSError:
+            if initial:
+                self.log.error(f"Proxy file not found: {self.proxy_file_path}")
+            return
+        if mtime == self.file_mtime:
+            return
+        self.file_mtime = mtime
+        urls = self._load_proxies(self.proxy_file_path)
+
+        # Proxies that stay in the file keep their health history and pool.
+        current = {url: self.proxies.get(url) or ProxyState(url) for url in dict.fromkeys(urls)}
+        for url, state in self.proxies.items():
+            if url not in current:
+                state.session.close()
+                PROXY_LATENCY.remove(proxy=state.label)
+                PROXY_CIRCUIT.remove(proxy=state.label)
+        for state in current.values():
+            PROXY_LATENCY.labels(proxy=state.label).set_function(lambda s=state: s.latency_ms or 0)
+            PROXY_CIRCUIT.labels(proxy=state.label).set_function(lambda s=state: CIRCUIT_STATES[s.circuit])
+        if not initial:
+            self.log.info(f"Proxy list reloaded: {len(current)} proxies")
+        self.proxies = current
+
+    def _candidates(self, now):
+        candidates = []
+        for state in self.proxies.values():
+            if state.circuit == OPEN and now >= state.retry_at:
+                state.circuit = HALF_OPEN
+                state.probe_started = None
+            if state.circuit == CLOSED:
+                candidates.append(state)
+            elif state.circuit == HALF_OPEN and (state.probe_started is None or now - state.probe_started > self.probe_timeout):
+                candidates.append(state)
+        return candidates
+
+    def acquire(self):
+        now = time.time()
+        with self.lock:
+            if PROXY_RELOAD_INTERVAL > 0 and now >= self.next_reload_check:
+                self._reload(now)
+            if not self.proxies:
+                return None
+            candidates = self._candidates(now)
+            if candidates:
+                proxy = random.choices(candidates, weights=[state.weight() for state in candidates])[0]
+            else:
+                # Every circuit is open: probe the one due back soonest rather
+                # than bypassing the pool.
+                proxy = min(self.proxies.values(), key=lambda state: state.retry_at)
+            if proxy.circuit != CLOSED:
+                proxy.probe_started = now
+        if self.log.is_enabled("DEBUG"):
+            self.log.debug(f"Selected proxy: {proxy.label} ({proxy.circuit})", key="proxy_selected")
+        return proxy
+
+    def session_for(self, proxy):
+        return proxy.session if proxy is not None else self.direct_session
+
+    def report(self, proxy, success, latency_ms=None):
+        # success is None when the target site failed behind a working proxy
+        # (DNS, refused connection, slow host); that says nothing about the
+        # proxy's health.
+        if proxy is None:
+            return
+        result = "neutral" if success is None else "success" if success else "failure"
+        PROXY_REQUESTS.labels(proxy=proxy.label, result=result).inc()
+        with self.lock:
+            proxy.requests += 1
+            if success is None:
+                proxy.probe_started = None
+                return
+            proxy.success_rate = 0.9 * proxy.success_rate + (0.1 if success else 0.0)
+            if latency_ms is not None:
+                proxy.latency_ms = latency_ms if proxy.latency_ms is None else 0.8 * proxy.latency_ms + 0.2 * latency_ms
+            if success:
+                proxy.consecutive_failures = 0
+                if proxy.circuit != CLOSED:
+                    proxy.circuit = CLOSED
+                    proxy.open_seconds = PROXY_OPEN_SECONDS
+                    self.log.info(f"Proxy {proxy.label} recovered")
+                return
+
+            proxy.failures += 1
+            proxy.consecutive_failures += 1
+            if proxy.circuit != CLOSED:
+                proxy.open_seconds = min(PROXY_MAX_OPEN_SECONDS, proxy.open_seconds * 2)
+            elif proxy.consecutive_failures < PROXY_FAILURE_THRESHOLD:
+                return
+            proxy.circuit = OPEN
+            proxy.retry_at = time.time() + proxy.open_seconds
+        self.log.warn(
+            f"Proxy {proxy.label} ejected after {proxy.consecutive_failures} failures, probing again in {proxy.open_seconds}s",
+            key="proxy_ejected"
+        )
+
+    def stats(self):
+        with self.lock:
+            return [state.stats() for state in self.proxies.values()]
+
+    def close(self):
+        with self.lock:
+            for state in self.proxies.values():
+                state.session.close()
+        self.direct_session.close()
@@ -1,44 +1,307 @@
 import numpy as np
 import time
+import heapq
+import asyncio
+import threading
 from collections import deque
-from crawler.utils import get_domain_from_url
+from crawler.utils import get_domain_from_url, canonicalize_url
 from utils.logger import ConsoleLogger
-from utils.config import QUEUE_PRIORITIES, QUEUE_PROBABILITIES, DOMAIN_CRAWL_DELAY
+from utils.metrics import REGISTRY
+from utils.config import (
+    QUEUE_PRIORITIES,
+    QUEUE_PROBABILITIES,
+    DOMAIN_CRAWL_DELAY,
+    FRONTIER_MEMORY_URLS,
+    FRONTIER_CHECKPOINT_INTERVAL
+)
+
+QUEUE_URLS = REGISTRY.gauge("crawler_queue_urls", "URLs queued in memory", labels=("priority",))
+FRONTIER_UNREAD = REGISTRY.gauge("crawler_frontier_unread_urls", "URLs spilled to the on-disk frontier", labels=("priority",))
+QUEUE_DOMAINS = REGISTRY.gauge("crawler_queue_domains", "Queued domains by politeness state", labels=("state",))
+DOMAIN_COUNTS_MAX_AGE = 1.0
 
 class URLQueueManager:
-    def __init__(self):
+    def __init__(self, seen_filter=None, store=None, memory_limit=FRONTIER_MEMORY_URLS, router=None, robot_manager=None, rate_controller=None):
         self.log = ConsoleLogger()
-        self.queues = {p: deque() for p in QUEUE_PRIORITIES}
-        self.domain_last_accessed = {}
+        self.seen_filter = seen_filter
+        self.router = router
+        self.robot_manager = robot_manager
+        self.rate_controller = rate_controller
+        self.store = store
+        self.memory_limit = memory_limit
+        self.queues = {p: {} for p in QUEUE_PRIORITIES}
+        self.ready_heaps = {p: [] for p in QUEUE_PRIORITIES}
+        self.sizes = {p: 0 for p in QUEUE_PRIORITIES}
+        self.domain_next_allowed = {}
+        self.idle_domains = []
+        self.parked = {}
+        self.in_flight = {}
+        self.retries = []
+        self._domain_counts = (0.0, None)
+        self.condition = threading.Condition()
+        self._stop = threading.Event()
+        self._checkpoint_thread = None
+        self._register_metrics()
+        if self.store is not None:
+            for priority, urls in self.store.load().items():
+                for url in urls:
+                    self._push(priority, url)
+                self._refill(priority)
         self.log.info("URL Queue Manager initialized")
 
+    def _register_metrics(self):
+        for priority in QUEUE_PRIORITIES:
+            QUEUE_URLS.labels(priority=priority).set_function(lambda p=priority: self.sizes[p])
+            if self.store is not None:
+                FRONTIER_UNREAD.labels(priority=priority).set_function(lambda p=priority: self.store.unread(p))
+        QUEUE_DOMAINS.labels(state="ready").set_function(lambda: self.domain_counts()["ready"])
+        QUEUE_DOMAINS.labels(state="waiting").set_function(lambda: self.domain_counts()["waiting"])
+        QUEUE_DOMAINS.labels(state="saturated").set_function(lambda: len(self.parked))
+
+    def domain_counts(self):
+        # Both gauges of a scrape share one count, and the lock is held only
+        # to copy the heaps, so a scrape never walks every domain while
+        # workers wait in get_next_url.
+        now = time.time()
+        cached_at, counts = self._domain_counts
+        if now - cached_at < DOMAIN_COUNTS_MAX_AGE:
+            return counts
+        with self.condition:
+            heaps = [list(heap) for heap in self.ready_heaps.values()]
+            next_allowed = self.domain_next_allowed.copy()
+        domains = set()
+        ready = set()
+        for heap in heaps:
+            for scheduled_at, domain in heap:
+                domains.add(domain)
+                if max(scheduled_at, next_allowed.get(domain, 0)) <= now:
+                    ready.add(domain)
+        counts = {"ready": len(ready), "waiting": len(domains - ready)}
+        self._domain_counts = (now, counts)
+        return counts
+
     def add_url(self, url, priority="medium"):
         if priority not in self.queues:
-            self.log.warn(f"Invalid priority '{priority}'. Defaulting to 'medium'")
+            self.log.warn(f"Invalid priority '{priority}'. Defaulting to 'medium'", key="invalid_priority")
             priority = "medium"
-        self.queues[priority].append(url)
-
-    def _is_domain_ready(self, domain):
-        if domain not in self.domain_last_accessed:
+        url = canonicalize_url(url)
+        if not url:
+            return False
+        if self.router is not None and not self.router.is_local(url):
+            self.router.forward(url, priority)
             return True
-        last_access_time = self.domain_last_accessed[domain]
-        return (time.time() - last_access_time) > DOMAIN_CRAWL_DELAY
+        with self.condition:
+            # Marking the URL seen and queueing it happen under one lock, so a
+            # checkpoint never snapshots one without the other.
+            if self.seen_filter is not None and not self.seen_filter.add(url):
+                return False
+            self._enqueue(priority, url)
+        return True
+
+    def requeue(self, url, priority="medium"):
+        # Revisits of stored pages; the seen filter already holds them.
+        self._enqueue(priority, url)
+
+    def _enqueue(self, priority, url):
+        with self.condition:
+            if self.store is not None:
+                self.store.append(priority, url)
+                self._refill(priority)
+            else:
+                self._push(priority, url)
+            self.condition.notify()
+
+    def _push(self, priority, url):
+        domain = get_domain_from_url(url)
+        if not domain:
+            return
+        domain_queues = self.queues[priority]
+        queue = domain_queues.get(domain)
+        if queue is None:
+            queue = domain_queues[domain] = deque()
+            heapq.heappush(self.ready_heaps[priority], (self.domain_next_allowed.get(domain, 0), domain))
+            if self.robot_manager is not None:
+                self.robot_manager.prefetch(domain)
+        queue.append(url)
+        self.sizes[priority] += 1
+
+    def _refill(self, priority):
+        if self.store is None or self.sizes[priority] > self.memory_limit // 2:
+            return
+        for url in self.store.read(priority, self.memory_limit - self.sizes[priority]):
+            self._push(priority, url)
+
+    def _domain_delay(self, domain):
+        if self.rate_controller is not None:
+            return self.rate_controller.interval(domain)
+        if self.robot_manager is None:
+            return DOMAIN_CRAWL_DELAY
+        return max(DOMAIN_CRAWL_DELAY, self.robot_manager.get_crawl_delay(domain) or 0)
+
+    def _pop_ready(self, priority, now):
+        heap = self.ready_heaps[priority]
+        while heap and heap[0][0] <= now:
+            _, domain = heapq.heappop(heap)
+            next_allowed = self.domain_next_allowed.get(domain, 0)
+            if self.rate_controller is not None:
+                next_allowed = max(next_allowed, self.rate_controller.not_before(domain))
+            if next_allowed > now:
+                heapq.heappush(heap, (next_allowed, domain))
+                continue
+
+            domain_queues = self.queues[priority]
+            queue = domain_queues[domain]
+            if self.rate_controller is not None:
+                # At its concurrency limit the domain leaves the heap until
+                # complete() releases one of its fetches.
+                if not self.rate_controller.can_start(domain, now):
+                    self.parked.setdefault(domain, set()).add(priority)
+                    continue
+                self.rate_controller.acquire(domain, now)
+            url = queue.popleft()
+            # The seen filter already holds the URL, so checkpoints carry it
+            # until complete() even without a rate controller.
+            self.in_flight[url] = priority
+            self.sizes[priority] -= 1
+            next_allowed = now + self._domain_delay(domain)
+            self.domain_next_allowed[domain] = next_allowed
+            if queue:
+                heapq.heappush(heap, (next_allowed, domain))
+            else:
+                del domain_queues[domain]
+                heapq.heappush(self.idle_domains, (next_allowed, domain))
+            self._refill(priority)
+            return url
+        return None
+
+    def complete(self, url, outcome, latency_ms=None, retry_after=None):
+        domain = get_domain_from_url(url)
+        with self.condition:
+            priority = self.in_flight.pop(url, "low")
+            if self.rate_controller is None or not domain:
+                return False
+            backoff_until, retry_delay = self.rate_controller.release(domain, url, outcome, latency_ms, retry_after)
+            if retry_delay is not None:
+                # Retries skip the seen filter, which already holds the URL.
+                heapq.heappush(self.retries, (time.time() + retry_delay, priority, url))
+            for parked_priority in self.parked.pop(domain, ()):
+                if domain in self.queues[parked_priority]:
+                    next_allowed = max(self.domain_next_allowed.get(domain, 0), backoff_until)
+                    heapq.heappush(self.ready_heaps[parked_priority], (next_allowed, domain))
+            self.condition.notify_all()
+        return retry_delay is not None
+
+    def _release_retries(self, now):
+        while self.retries and self.retries[0][0] <= now:
+            _, priority, url = heapq.heappop(self.retries)
+            self._push(priority, url)
 
-    def get_next_url(self):
+    def _forget_idle_domains(self, now):
+        # A domain with nothing queued only needs its deadline until it has
+        # passed; keeping it would grow the map with every domain ever seen.
+        idle = self.idle_domains
+        while idle and idle[0][0] <= now:
+            deadline, domain = heapq.heappop(idle)
+            if self.domain_next_allowed.get(domain) != deadline:
+                continue
+            if any(domain in domain_queues for domain_queues in self.queues.values()):
+                continue
+            del self.domain_next_allowed[domain]
+
+    def _seconds_until_ready(self, now):
+        earliest = min((heap[0][0] for heap in self.ready_heaps.values() if heap), default=None)
+        if self.retries and (earliest is None or self.retries[0][0] < earliest):
+            earliest = self.retries[0][0]
+        if earliest is None:
+            return None
+        return max(0.0, earliest - now)
+
+    def _try_get(self):
         chosen_priority = np.random.choice(QUEUE_PRIORITIES, p=QUEUE_PROBABILITIES)
-        
         priorities_to_check = [chosen_priority] + [p for p in QUEUE_PRIORITIES if p != chosen_priority]
-        
+
+        now = time.time()
+        self._release_retries(now)
+        self._forget_idle_domains(now)
         for priority in priorities_to_check:
-            queue = self.queues[priority]
-
-            for _ in range(len(queue)):
-                url = queue.popleft()
-                domain = get_domain_from_url(url)
-                
-                if domain and self._is_domain_ready(domain):
-                    self.domain_last_accessed[domain] = time.time()
+            url = self._pop_ready(priority, now)
+            if url:
+                return url
+        return None
+
+    def get_next_url(self, timeout=0):
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                url = self._try_get()
+                if url:
                     return url
-                else:
-                    queue.append(url)
-        return None
\ No newline at end of file
+
+                now = time.time()
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                until_ready = self._seconds_until_ready(now)
+                self.condition.wait(remaining if until_ready is None else min(remaining, until_ready))
+
+    async def get_next_url_async(self, timeout=0):
+        deadline = time.time() + timeout
+        while True:
+            with self.condition:
+                url = self._try_get()
+                now = time.time()
+                until_ready = self._seconds_until_ready(now)
+            if url:
+                return url
+
+            remaining = deadline - now
+            if remaining <= 0:
+                return None
+            wait = min(remaining, 1.0) if until_ready is None else min(remaining, until_ready, 1.0)
+            await asyncio.sleep(wait)
+
+    def pending_count(self):
+        with self.condition:
+            in_memory = sum(self.sizes.values()) + len(self.retries)
+            if self.store is None:
+                return in_memory
+            return in_memory + sum(self.store.unread(p) for p in QUEUE_PRIORITIES)
+
+    def checkpoint(self):
+        if self.store is None:
+            return
+        with self.condition:
+            pending = {
+                p: [url for queue in self.queues[p].values() for url in queue]
+                for p in QUEUE_PRIORITIES
+            }
+            for _, priority, url in self.retries:
+                pending[priority].append(url)
+            # Fetches still running are only done once their page is stored.
+            for url, priority in self.in_flight.items():
+                pending[priority].append(url)
+            seen = self.seen_filter.snapshot() if self.seen_filter is not None else None
+            try:
+                self.store.checkpoint(pending)
+            except OSError as e:
+                self.log.error(f"Failed to checkpoint frontier: {e}")
+                return
+        if seen is not None:
+            self.seen_filter.save(seen)
+
+    def _checkpoint_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.checkpoint()
+
+    def start_checkpointing(self, interval=FRONTIER_CHECKPOINT_INTERVAL):
+        if self.store is None or interval <= 0 or self._checkpoint_thread:
+            return
+        self._checkpoint_thread = threading.Thread(target=self._checkpoint_loop, args=(interval,), name="frontier-checkpoint", daemon=True)
+        self._checkpoint_thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self.store is not None:
+            self.checkpoint()
+            with self.condition:
+                self.store.close()
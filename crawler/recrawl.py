@@ -0,0 +1,169 @@
+import math
+import threading
+from datetime import datetime, timedelta
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import (
+    RECRAWL_INITIAL_INTERVAL,
+    RECRAWL_MIN_INTERVAL,
+    RECRAWL_MAX_INTERVAL,
+    RECRAWL_LEASE_SECONDS,
+    RECRAWL_POLL_INTERVAL,
+    RECRAWL_BATCH_SIZE,
+    RECRAWL_MAX_QUEUED,
+    RECRAWL_PRIORITY
+)
+
+RECRAWL_CHECKS = REGISTRY.counter("recrawl_checks_total", "Revisits of stored pages by result", labels=("result",))
+RECRAWL_QUEUED = REGISTRY.gauge("recrawl_queued", "Revisits claimed and waiting to be crawled")
+
+# A revisit answered with one of these means the page is gone for good.
+GONE_STATUSES = (404, 410)
+
+def estimate_change_rate(checks, changes, observed_seconds):
+    # Cho & Garcia-Molina: a revisit only tells whether the page changed at
+    # least once since the last one, so changes/checks underestimates pages
+    # that change faster than we look at them.
+    if checks <= 0 or observed_seconds <= 0:
+        return None
+    mean_interval = observed_seconds / checks
+    return -math.log((checks - changes + 0.5) / (checks + 0.5)) / mean_interval
+
+def next_interval(change_rate, previous_interval):
+    if change_rate is None:
+        return RECRAWL_INITIAL_INTERVAL
+    interval = 1.0 / change_rate if change_rate > 0 else RECRAWL_MAX_INTERVAL
+    # Pages that keep coming back unchanged back off gradually instead of
+    # jumping straight to the maximum after one quiet check.
+    interval = min(interval, previous_interval * 2)
+    return max(RECRAWL_MIN_INTERVAL, min(RECRAWL_MAX_INTERVAL, interval))
+
+def validators(headers, fallback=None):
+    fallback = fallback or {}
+    return {
+        "etag": headers.get("ETag") or fallback.get("etag"),
+        "last_modified": headers.get("Last-Modified") or fallback.get("last_modified")
+    }
+
+def conditional_headers(revisit):
+    headers = {}
+    if revisit.get("etag"):
+        headers["If-None-Match"] = revisit["etag"]
+    if revisit.get("last_modified"):
+        headers["If-Modified-Since"] = revisit["last_modified"]
+    return headers
+
+class RecrawlScheduler:
+    def __init__(self, mongo_manager, queue_manager, shard=None):
+        self.log = ConsoleLogger()
+        self.mongo_manager = mongo_manager
+        self.queue_manager = queue_manager
+        # (shard_id, shard_count) when this process only revisits its shard.
+        self.shard = shard
+        self.pending = {}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        RECRAWL_QUEUED.set_function(lambda: len(self.pending))
+
+    def initial_schedule(self, headers, now=None):
+        now = now or datetime.utcnow()
+        return {
+            **validators(headers),
+            "checked_at": now,
+            "check_count": 0,
+            "change_count": 0,
+            "observed_seconds": 0.0,
+            "revisit_interval": RECRAWL_INITIAL_INTERVAL,
+            "next_crawl_at": now + timedelta(seconds=RECRAWL_INITIAL_INTERVAL)
+        }
+
+    def schedule(self, revisit, headers, result, now=None):
+        now = now or datetime.utcnow()
+        RECRAWL_CHECKS.labels(result=result).inc()
+        checks = revisit.get("check_count", 0) + 1
+        changes = revisit.get("change_count", 0) + (result == "changed")
+        last_checked = revisit.get("checked_at") or revisit.get("crawled_at")
+        observed = revisit.get("observed_seconds", 0.0)
+        if last_checked is not None:
+            observed += max(0.0, (now - last_checked).total_seconds())
+        change_rate = estimate_change_rate(checks, changes, observed)
+        interval = next_interval(change_rate, revisit.get("revisit_interval") or RECRAWL_INITIAL_INTERVAL)
+        return {
+            **validators(headers, fallback=revisit),
+            "checked_at": now,
+            "check_count": checks,
+            "change_count": changes,
+            "observed_seconds": observed,
+            "change_rate": change_rate,
+            "revisit_interval": interval,
+            "next_crawl_at": now + timedelta(seconds=interval)
+        }
+
+    def back_off(self, revisit, result, now=None):
+        # The page could not be checked (robots, non-HTML, too large), so the
+        # change estimate is left alone and the next attempt is pushed out.
+        now = now or datetime.utcnow()
+        RECRAWL_CHECKS.labels(result=result).inc()
+        interval = (revisit.get("revisit_interval") or RECRAWL_INITIAL_INTERVAL) * 2
+        interval = max(RECRAWL_MIN_INTERVAL, min(RECRAWL_MAX_INTERVAL, interval))
+        return {"revisit_interval": interval, "next_crawl_at": now + timedelta(seconds=interval)}
+
+    def state_for(self, url):
+        with self.lock:
+            return self.pending.get(url)
+
+    def discard(self, url):
+        with self.lock:
+            self.pending.pop(url, None)
+
+    def poll(self, now=None):
+        now = now or datetime.utcnow()
+        with self.lock:
+            room = RECRAWL_MAX_QUEUED - len(self.pending)
+        if room <= 0:
+            return 0
+        due = self.mongo_manager.find_due_urls(now, min(room, RECRAWL_BATCH_SIZE), shard=self.shard)
+        if not due:
+            return 0
+        # The lease keeps other polls from queueing the page again while it
+        # waits; a revisit that never completes becomes due once it expires.
+        claimed = self.mongo_manager.claim_urls([revisit["_id"] for revisit in due], now, now + timedelta(seconds=RECRAWL_LEASE_SECONDS))
+        queued = 0
+        for revisit in due:
+            if revisit["_id"] not in claimed:
+                continue
+            with self.lock:
+                if revisit["url"] in self.pending:
+                    continue
+                self.pending[revisit["url"]] = revisit
+            self.queue_manager.requeue(revisit["url"], priority=RECRAWL_PRIORITY)
+            queued += 1
+        if queued:
+            self.log.info(f"Queued {queued} pages for revisit")
+        return queued
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.log.error(f"Failed to queue due revisits: {e}", key="recrawl_poll")
+
+    def start(self, interval=RECRAWL_POLL_INTERVAL):
+        if interval <= 0 or self._thread:
+            return
+        scheduled = self.mongo_manager.schedule_unscheduled(RECRAWL_INITIAL_INTERVAL)
+        if scheduled:
+            self.log.info(f"Scheduled revisits for {scheduled} previously crawled pages")
+        if self.shard is not None:
+            hashed = self.mongo_manager.hash_domains()
+            if hashed:
+                self.log.info(f"Added domain hashes to {hashed} previously crawled pages")
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="recrawl-scheduler", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
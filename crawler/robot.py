@@ -1,39 +1,194 @@
+import os
+import json
+import time
+import threading
 import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from urllib.robotparser import RobotFileParser
-from utils.config import USER_AGENT
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import (
+    USER_AGENT,
+    ROBOTS_CACHE_SIZE,
+    ROBOTS_TTL,
+    ROBOTS_ERROR_TTL,
+    ROBOTS_FETCH_TIMEOUT,
+    ROBOTS_PREFETCH_WORKERS,
+    ROBOTS_CACHE_PATH,
+    ROBOTS_SNAPSHOT_INTERVAL
+)
+
+class RobotsEntry:
+    def __init__(self, domain, lines, expires_at):
+        self.domain = domain
+        self.lines = lines
+        self.expires_at = expires_at
+        self.parser = RobotFileParser()
+        self.parser.set_url(f"https://{domain}/robots.txt")
+        if lines is None:
+            self.parser.parse(["User-agent: *", "Allow: /"])
+        else:
+            self.parser.parse(lines)
+
+    def is_expired(self, now):
+        return now >= self.expires_at
+
+    def crawl_delay(self):
+        delay = self.parser.crawl_delay(USER_AGENT)
+        rate = self.parser.request_rate(USER_AGENT)
+        if rate and rate.requests:
+            rate_delay = rate.seconds / rate.requests
+            delay = max(delay or 0, rate_delay)
+        return float(delay) if delay else None
+
+ROBOTS_FETCH_MS = REGISTRY.histogram(
+    "robots_fetch_duration_ms", "Time to download robots.txt", [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+)
+ROBOTS_LOOKUPS = REGISTRY.counter("robots_lookups_total", "robots.txt lookups by cache result", labels=("result",))
 
 class RobotManager:
-    def __init__(self):
-        self.parsers = {} 
+    def __init__(self, cache_path=ROBOTS_CACHE_PATH, cache_size=ROBOTS_CACHE_SIZE):
+        self.log = ConsoleLogger()
+        self.cache_path = cache_path
+        self.cache_size = cache_size
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=ROBOTS_PREFETCH_WORKERS, thread_name_prefix="robots-prefetch")
+        self._stop = threading.Event()
+        self._autosave_thread = None
+        self._load()
+
+    def _download(self, domain):
+        for scheme in ("https", "http"):
+            robots_url = f"{scheme}://{domain}/robots.txt"
+            try:
+                response = self.session.get(robots_url, timeout=ROBOTS_FETCH_TIMEOUT)
+            except requests.RequestException:
+                continue
+            if response.status_code == 200:
+                return response.text.splitlines(), ROBOTS_TTL
+            if 400 <= response.status_code < 500:
+                return None, ROBOTS_TTL
+            return None, ROBOTS_ERROR_TTL
+        return None, ROBOTS_ERROR_TTL
+
+    def _store(self, entry):
+        with self.lock:
+            self.entries[entry.domain] = entry
+            self.entries.move_to_end(entry.domain)
+            while len(self.entries) > self.cache_size:
+                self.entries.popitem(last=False)
+
+    def _cached(self, domain, now):
+        entry = self.entries.get(domain)
+        if entry is not None and not entry.is_expired(now):
+            self.entries.move_to_end(domain)
+            return entry
+        return None
+
+    def _get_entry(self, domain):
+        with self.lock:
+            entry = self._cached(domain, time.time())
+            if entry is not None:
+                ROBOTS_LOOKUPS.labels(result="hit").inc()
+                return entry
+            event = self.inflight.get(domain)
+            is_owner = event is None
+            if is_owner:
+                event = self.inflight[domain] = threading.Event()
+
+        ROBOTS_LOOKUPS.labels(result="fetch" if is_owner else "wait").inc()
+        if not is_owner:
+            event.wait(timeout=ROBOTS_FETCH_TIMEOUT * 2 + 1)
+            with self.lock:
+                entry = self.entries.get(domain)
+            return entry or RobotsEntry(domain, None, 0)
+
+        try:
+            with ROBOTS_FETCH_MS.time():
+                lines, ttl = self._download(domain)
+            entry = RobotsEntry(domain, lines, time.time() + ttl)
+            self._store(entry)
+            return entry
+        finally:
+            with self.lock:
+                self.inflight.pop(domain, None)
+            event.set()
 
     def _get_parser(self, url):
         from .utils import get_domain_from_url
         domain = get_domain_from_url(url)
         if not domain:
             return None
-            
-        if domain in self.parsers:
-            return self.parsers[domain]
-        
-        robots_url = f"http://{domain}/robots.txt"
-        parser = RobotFileParser()
-        
-        try:
-            response = requests.get(robots_url, headers={"User-Agent": USER_AGENT}, timeout=5)
-            if response.status_code == 200:
-                parser.parse(response.text.splitlines())
-            else:
-                parser.set_url(robots_url)
-                parser.parse(["User-agent: *", "Allow: /"])
-        except requests.RequestException:
-            parser.set_url(robots_url)
-            parser.parse(["User-agent: *", "Allow: /"])
-        
-        self.parsers[domain] = parser
-        return parser
+        return self._get_entry(domain).parser
 
     def can_fetch(self, url):
         parser = self._get_parser(url)
         if parser:
             return parser.can_fetch(USER_AGENT, url)
-        return True 
\ No newline at end of file
+        return True
+
+    def prefetch(self, domain):
+        with self.lock:
+            if domain in self.inflight or self._cached(domain, time.time()) is not None:
+                return
+        try:
+            self.prefetch_executor.submit(self._get_entry, domain)
+        except RuntimeError:
+            pass
+
+    def get_crawl_delay(self, domain):
+        with self.lock:
+            entry = self.entries.get(domain)
+        return entry.crawl_delay() if entry is not None else None
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            self.log.warn(f"Could not load robots.txt cache: {e}")
+            return
+        now = time.time()
+        for domain, record in stored.items():
+            if record["expires_at"] > now:
+                self._store(RobotsEntry(domain, record["lines"], record["expires_at"]))
+        self.log.info(f"Loaded {len(self.entries)} cached robots.txt entries")
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            stored = {
+                domain: {"lines": entry.lines, "expires_at": entry.expires_at}
+                for domain, entry in self.entries.items()
+            }
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.log.error(f"Failed to save robots.txt cache: {e}")
+
+    def _autosave(self, interval):
+        while not self._stop.wait(interval):
+            self.save()
+
+    def start_autosave(self, interval=ROBOTS_SNAPSHOT_INTERVAL):
+        if interval <= 0 or self._autosave_thread:
+            return
+        self._autosave_thread = threading.Thread(target=self._autosave, args=(interval,), name="robots-autosave", daemon=True)
+        self._autosave_thread.start()
+
+    def close(self):
+        self._stop.set()
+        self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        self.save()
@@ -1,11 +1,231 @@
+import re
+import codecs
+from html.parser import HTMLParser
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urldefrag
+from utils.config import SCRAPER_BACKEND
 
-def scrape_page(html_content, base_url):
+FEED_CHUNK_CHARS = 64 * 1024
+# bs4 keeps text under these out of get_text() (they get their own string
+# classes), so titles and body text skip them too.
+SKIPPED_TAGS = {"script", "style", "template", "rt", "rp"}
+# Elements bs4 closes as soon as they open; a later </br> is dropped.
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta", "param",
+    "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer"
+}
+CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+def decode_html(html_content):
+    if isinstance(html_content, str):
+        return html_content
+    head = bytes(html_content[:4096])
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return str(html_content, encoding, errors="replace")
+
+    candidates = []
+    match = CHARSET_PATTERN.search(head)
+    if match:
+        candidates.append(match.group(1).decode("ascii").lower())
+    candidates += ["utf-8", "windows-1252"]
+    for encoding in candidates:
+        try:
+            return str(html_content, encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return str(html_content, "latin-1", errors="replace")
+
+class PageExtractor:
+    # Follows the tree BeautifulSoup builds from the same html.parser events:
+    # an end tag closes everything up to the most recent open element of
+    # that name and is ignored if there is none, so the first <title> and
+    # <body> stay open until they are popped that way, not until the next
+    # tag with their name.
+    def __init__(self, base_url, head_only=False):
+        self.base_url = base_url
+        self.head_only = head_only
+        self.done = False
+        self.title_parts = []
+        self.title_state = 0
+        self.title_depth = 0
+        self.description = None
+        self.body_state = 0
+        self.body_depth = 0
+        self.skip_depth = 0
+        self.open_tags = []
+        self.open_counts = {}
+        self.closed_voids = {}
+        self.text_parts = []
+        self.pending_text = []
+        self.links = set()
+
+    def _flush_text(self):
+        if not self.pending_text:
+            return
+        text = "".join(self.pending_text)
+        self.pending_text = []
+        if self.skip_depth:
+            return
+        if self.title_state == 1:
+            self.title_parts.append(text.strip())
+        if self.body_state == 1:
+            self.text_parts.append(text)
+
+    def start(self, tag, attrs):
+        self._flush_text()
+        if tag in VOID_TAGS:
+            self.closed_voids[tag] = self.closed_voids.get(tag, 0) + 1
+        else:
+            self.open_tags.append(tag)
+            self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag == "title":
+            if self.title_state == 0:
+                self.title_state = 1
+                self.title_depth = len(self.open_tags)
+        elif tag == "meta":
+            if self.description is None and attrs.get("name") == "description":
+                self.description = (attrs.get("content") or "").strip()
+        elif tag == "body":
+            if self.head_only:
+                self.done = True
+            elif self.body_state == 0:
+                self.body_state = 1
+                self.body_depth = len(self.open_tags)
+        elif tag == "a" and "href" in attrs and not self.head_only:
+            absolute_url, _ = urldefrag(urljoin(self.base_url, attrs["href"] or ""))
+            if absolute_url.startswith(('http://', 'https://')):
+                self.links.add(absolute_url)
+
+    def end(self, tag):
+        if self.closed_voids.get(tag):
+            # bs4 drops it without ending the current string either.
+            self.closed_voids[tag] -= 1
+            return
+        self._flush_text()
+        if tag == "head" and self.head_only:
+            self.done = True
+        if not self.open_counts.get(tag):
+            return
+        while True:
+            depth = len(self.open_tags)
+            popped = self.open_tags.pop()
+            self.open_counts[popped] -= 1
+            if popped in SKIPPED_TAGS:
+                self.skip_depth -= 1
+            if depth == self.title_depth and self.title_state == 1:
+                self.title_state = 2
+            if depth == self.body_depth and self.body_state == 1:
+                self.body_state = 2
+            if popped == tag:
+                return
+
+    def data(self, text):
+        self.pending_text.append(text)
+
+    def comment(self, text):
+        self._flush_text()
+
+    def cdata(self, text):
+        # bs4 stores CDATA sections as CData strings, which get_text() keeps
+        # even under skipped tags.
+        self._flush_text()
+        skip_depth, self.skip_depth = self.skip_depth, 0
+        self.pending_text.append(text)
+        self._flush_text()
+        self.skip_depth = skip_depth
+
+    def close(self):
+        self._flush_text()
+        return {
+            "title": "".join(self.title_parts),
+            "description": self.description or "",
+            "content": ' '.join(' '.join(self.text_parts).split()),
+            "links": list(self.links)
+        }
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, extractor):
+        super().__init__(convert_charrefs=True)
+        self.extractor = extractor
+
+    def handle_starttag(self, tag, attrs):
+        self.extractor.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.extractor.start(tag, dict(attrs))
+        self.extractor.end(tag)
+
+    def handle_endtag(self, tag):
+        self.extractor.end(tag)
+
+    def handle_data(self, data):
+        self.extractor.data(data)
+
+    def handle_comment(self, data):
+        self.extractor.comment(data)
+
+    def handle_decl(self, decl):
+        self.extractor.comment(decl)
+
+    def handle_pi(self, data):
+        self.extractor.comment(data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self.extractor.cdata(data[6:])
+        else:
+            self.extractor.comment(data)
+
+class _LxmlTarget:
+    def __init__(self, extractor):
+        self.extractor = extractor
+
+    def start(self, tag, attrib):
+        self.extractor.start(tag.lower(), dict(attrib))
+
+    def end(self, tag):
+        self.extractor.end(tag.lower())
+
+    def data(self, text):
+        self.extractor.data(text)
+
+    def comment(self, text):
+        self.extractor.comment(text)
+
+    def close(self):
+        return None
+
+def _stream_parser(extractor):
+    parser = _StdlibParser(extractor)
+    return parser.feed, parser.close
+
+def _lxml_parser(extractor):
+    from lxml import etree
+    parser = etree.HTMLParser(target=_LxmlTarget(extractor), remove_comments=False)
+    return parser.feed, parser.close
+
+# "stream" builds the same tree as scrape_page_soup. "lxml" is faster on
+# large pages but parses like a browser (raw-text <title>, implied <body>,
+# auto-closed elements), so malformed markup can extract differently; see
+# LXML_DIVERGENT_CASES in tools/compare_extractors.py.
+STREAM_BACKENDS = {
+    "stream": _stream_parser,
+    "lxml": _lxml_parser,
+}
+
+def scrape_page_soup(html_content, base_url):
     soup = BeautifulSoup(html_content, 'html.parser')
-    
+
     title = soup.title.get_text(strip=True) if soup.title else ""
-    
+
     description_tag = soup.find('meta', attrs={'name': 'description'})
     description = description_tag['content'].strip() if description_tag and description_tag.get('content') else ""
 
@@ -17,19 +237,38 @@ def scrape_page(html_content, base_url):
         full_text = ' '.join(body.get_text(separator=' ').split())
     else:
         full_text = ''
-    
+
     links = set()
     for a_tag in soup.find_all('a', href=True):
         href = a_tag['href']
 
-        absolute_url = urljoin(base_url, href)
-   
-        if absolute_url.startswith(('http://', 'https://')) and '#' not in absolute_url:
+        absolute_url, _ = urldefrag(urljoin(base_url, href))
+
+        if absolute_url.startswith(('http://', 'https://')):
             links.add(absolute_url)
-            
+
     return {
         "title": title,
         "description": description,
-        "content": full_text, 
+        "content": full_text,
         "links": list(links)
-    }
\ No newline at end of file
+    }
+
+def scrape_page(html_content, base_url, backend=SCRAPER_BACKEND, head_only=False):
+    if backend == "bs4":
+        if isinstance(html_content, memoryview):
+            html_content = html_content.tobytes()
+        return scrape_page_soup(html_content, base_url)
+    if backend not in STREAM_BACKENDS:
+        raise ValueError(f"Unknown scraper backend '{backend}'")
+
+    text = decode_html(html_content)
+    extractor = PageExtractor(base_url, head_only=head_only)
+    feed, close = STREAM_BACKENDS[backend](extractor)
+    for start in range(0, len(text), FEED_CHUNK_CHARS):
+        feed(text[start:start + FEED_CHUNK_CHARS])
+        if extractor.done:
+            break
+    else:
+        close()
+    return extractor.close()
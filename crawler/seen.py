@@ -0,0 +1,62 @@
+import os
+import time
+from datetime import datetime
+from crawler.bloom import ScalableBloomFilter
+from crawler.utils import canonicalize_url
+from utils.logger import ConsoleLogger
+from utils.config import SEEN_FILTER_PATH, SEEN_FILTER_CAPACITY, SEEN_FILTER_ERROR_RATE
+
+class SeenURLFilter:
+    # A URL in the filter is never queued again, so a snapshot must not hold
+    # URLs the frontier could lose in a crash. URLQueueManager.checkpoint()
+    # takes the snapshot under its lock and writes it only after the
+    # frontier checkpoint it belongs to; without a durable frontier the
+    # filter is always rebuilt from the stored pages.
+    def __init__(self, snapshot_path=SEEN_FILTER_PATH, capacity=SEEN_FILTER_CAPACITY, error_rate=SEEN_FILTER_ERROR_RATE):
+        self.log = ConsoleLogger()
+        self.snapshot_path = snapshot_path
+        self.bloom = ScalableBloomFilter(capacity, error_rate)
+
+    def load_or_rebuild(self, mongo_manager, accept=None, use_snapshot=True):
+        since = None
+        if not use_snapshot:
+            self.log.info("No durable frontier, rebuilding the seen-URL filter from metadata")
+        elif os.path.exists(self.snapshot_path):
+            try:
+                self.bloom, snapshot_time = ScalableBloomFilter.load(self.snapshot_path)
+                since = datetime.utcfromtimestamp(snapshot_time)
+                self.log.info(f"Loaded seen-URL snapshot with {len(self.bloom)} URLs")
+            except (OSError, ValueError) as e:
+                self.log.warn(f"Could not load seen-URL snapshot, rebuilding: {e}")
+
+        added = 0
+        for url in mongo_manager.iter_urls(since=since):
+            canonical = canonicalize_url(url)
+            if not canonical or (accept is not None and not accept(canonical)):
+                continue
+            if self.bloom.add(canonical):
+                added += 1
+        self.log.info(f"Seen-URL filter rebuilt from metadata: {added} URLs added")
+
+    def add(self, url):
+        return self.bloom.add(url)
+
+    def __contains__(self, url):
+        return url in self.bloom
+
+    def __len__(self):
+        return len(self.bloom)
+
+    def snapshot(self):
+        # The time is taken first: pages stored after it are re-added from
+        # metadata on load.
+        timestamp = time.time()
+        return self.bloom.copy(), timestamp
+
+    def save(self, snapshot):
+        bloom, timestamp = snapshot
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            bloom.save(self.snapshot_path, timestamp)
+        except OSError as e:
+            self.log.error(f"Failed to save seen-URL snapshot: {e}")
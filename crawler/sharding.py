@@ -0,0 +1,167 @@
+import sys
+import zlib
+import secrets
+import time
+import threading
+from queue import Queue, Empty
+from multiprocessing.managers import BaseManager
+from crawler.utils import get_domain_from_url
+from utils.logger import ConsoleLogger
+from utils.config import SHARD_FORWARD_BATCH_SIZE, SHARD_FORWARD_INTERVAL_MS, CRAWLER_PROCESSES, CRAWLER_SHARD_COUNT
+
+_shard_queues = {}
+_shard_queues_lock = threading.Lock()
+
+def _get_shard_queue(shard_id):
+    with _shard_queues_lock:
+        if shard_id not in _shard_queues:
+            _shard_queues[shard_id] = Queue()
+        return _shard_queues[shard_id]
+
+class BrokerManager(BaseManager):
+    pass
+
+BrokerManager.register("get_queue", callable=_get_shard_queue)
+
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def broker_authkey(configured, address=None):
+    # A broker that only this run's own processes talk to gets a fresh
+    # random key; anything reachable from elsewhere needs an explicit one.
+    if configured:
+        return configured.encode()
+    if address is None or address[0] in LOOPBACK_HOSTS:
+        return secrets.token_hex(32).encode()
+    raise ValueError(f"BROKER_AUTHKEY must be set for a broker on {address[0]}:{address[1]}")
+
+def start_broker(address, authkey):
+    manager = BrokerManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+def connect_broker(address, authkey):
+    manager = BrokerManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager
+
+def configured_shard_count():
+    if CRAWLER_PROCESSES > 1 or CRAWLER_SHARD_COUNT > 1:
+        return CRAWLER_SHARD_COUNT or CRAWLER_PROCESSES
+    return 0
+
+def shard_path(path, router):
+    return path if router is None else f"{path}.shard{router.shard_id}"
+
+def shard_paths(path, shard_count):
+    # Every shard's copy of a per-shard file, wherever its process runs.
+    return [f"{path}.shard{shard_id}" for shard_id in range(shard_count)] if shard_count else [path]
+
+def shard_for_domain(domain, shard_count):
+    return zlib.crc32(domain.encode("utf-8")) % shard_count
+
+class ShardRouter:
+    def __init__(self, shard_id, shard_count, broker):
+        self.log = ConsoleLogger()
+        self.shard_id = shard_id
+        self.shard_count = shard_count
+        self.broker = broker
+        self.queue_manager = None
+        self.outboxes = {}
+        self.outbox_lock = threading.Lock()
+        self.queue_proxies = {}
+        self.forwarded = 0
+        self.received = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    def shard_for_url(self, url):
+        domain = get_domain_from_url(url)
+        return shard_for_domain(domain, self.shard_count) if domain else self.shard_id
+
+    def is_local(self, url):
+        return self.shard_for_url(url) == self.shard_id
+
+    def forward(self, url, priority):
+        shard_id = self.shard_for_url(url)
+        with self.outbox_lock:
+            outbox = self.outboxes.setdefault(shard_id, [])
+            outbox.append((url, priority))
+            if len(outbox) < SHARD_FORWARD_BATCH_SIZE:
+                return
+            self.outboxes[shard_id] = []
+        self._send(shard_id, outbox)
+
+    def _queue_for(self, shard_id):
+        proxy = self.queue_proxies.get(shard_id)
+        if proxy is None:
+            proxy = self.queue_proxies[shard_id] = self.broker.get_queue(shard_id)
+        return proxy
+
+    def _send(self, shard_id, batch):
+        try:
+            self._queue_for(shard_id).put(batch)
+            self.forwarded += len(batch)
+        except Exception as e:
+            self.log.error(f"Failed to forward {len(batch)} URLs to shard {shard_id}: {e}")
+
+    def flush(self):
+        with self.outbox_lock:
+            outboxes, self.outboxes = self.outboxes, {}
+        for shard_id, batch in outboxes.items():
+            if batch:
+                self._send(shard_id, batch)
+
+    def _flush_loop(self):
+        while not self._stop.wait(SHARD_FORWARD_INTERVAL_MS / 1000):
+            self.flush()
+
+    def _receive_loop(self):
+        inbox = self._queue_for(self.shard_id)
+        while not self._stop.is_set():
+            try:
+                batch = inbox.get(timeout=1)
+            except Empty:
+                continue
+            except Exception as e:
+                self.log.error(f"Shard {self.shard_id} lost its broker connection: {e}")
+                time.sleep(1)
+                continue
+            for url, priority in batch:
+                self.queue_manager.add_url(url, priority=priority)
+            self.received += len(batch)
+
+    def start(self, queue_manager):
+        self.queue_manager = queue_manager
+        for target, name in ((self._flush_loop, "shard-flush"), (self._receive_loop, "shard-receive")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        self.flush()
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.log.info(f"Shard {self.shard_id}: forwarded {self.forwarded} URLs, received {self.received} URLs")
+
+if __name__ == "__main__":
+    from utils.config import BROKER_AUTHKEY
+    if len(sys.argv) != 2:
+        print("Usage: python -m crawler.sharding HOST:PORT")
+        sys.exit(1)
+    address = parse_address(sys.argv[1])
+    try:
+        authkey = broker_authkey(BROKER_AUTHKEY, address)
+    except ValueError as e:
+        ConsoleLogger().error(str(e))
+        sys.exit(1)
+    server = BrokerManager(address=address, authkey=authkey).get_server()
+    ConsoleLogger().info(f"URL broker listening on {sys.argv[1]}")
+    if not BROKER_AUTHKEY:
+        # Crawlers on this host need the generated key to connect.
+        ConsoleLogger().info(f"Generated BROKER_AUTHKEY for this broker: {authkey.decode()}")
+    server.serve_forever()
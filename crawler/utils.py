@@ -1,12 +1,13 @@
+import time
 import hashlib
-from sentence_transformers import SentenceTransformer
-from urllib.parse import urlparse
-from utils.config import EMBEDDING_MODEL
+import threading
+from urllib.parse import urlparse, urlsplit, urlunsplit
+from utils.config import EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE
 from utils.logger import ConsoleLogger 
 
-embedding_model = SentenceTransformer(EMBEDDING_MODEL)
 log = ConsoleLogger()
-log.info("Model loaded")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
 
 def get_domain_from_url(url):
     try:
@@ -14,13 +15,78 @@ def get_domain_from_url(url):
     except:
         return None
 
+def canonicalize_url(url):
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except (ValueError, AttributeError):
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    query = "&".join(sorted(param for param in parts.query.split("&") if param))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
 def calculate_hash(content):
     if isinstance(content, str):
         content = content.encode('utf-8')
     return hashlib.sha256(content).hexdigest()
 
-def generate_embedding(text):
+def _load_torch():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+def _load_int8():
+    import torch
+    # Dynamic quantization stores Linear weights as int8 and quantizes
+    # activations per batch; it only runs on CPU.
+    return torch.quantization.quantize_dynamic(_load_torch(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def _load_onnx():
+    # Needs the optional sentence-transformers[onnx] extra; see requirements.txt.
+    from sentence_transformers import SentenceTransformer
+    model_kwargs = {"file_name": EMBEDDING_ONNX_FILE} if EMBEDDING_ONNX_FILE else None
+    return SentenceTransformer(EMBEDDING_MODEL, backend="onnx", model_kwargs=model_kwargs)
+
+EMBEDDING_BACKENDS = {
+    "torch": _load_torch,
+    "int8": _load_int8,
+    "onnx": _load_onnx,
+}
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_embedding_model(backend=EMBEDDING_BACKEND):
+    model = _models.get(backend)
+    if model is not None:
+        return model
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+    with _models_lock:
+        if backend not in _models:
+            started = time.perf_counter()
+            _models[backend] = EMBEDDING_BACKENDS[backend]()
+            log.info(f"Model loaded ({backend}) in {time.perf_counter() - started:.1f}s")
+        return _models[backend]
+
+def generate_embedding(text, backend=EMBEDDING_BACKEND):
     if not text:
         return []
-    vector = embedding_model.encode(text, convert_to_tensor=False)
-    return vector.tolist()
\ No newline at end of file
+    vector = get_embedding_model(backend).encode(text, convert_to_tensor=False)
+    return vector.tolist()
+
+def generate_embeddings(texts, backend=EMBEDDING_BACKEND):
+    if not texts:
+        return []
+    vectors = get_embedding_model(backend).encode(texts, batch_size=len(texts), convert_to_tensor=False)
+    return [vector.tolist() for vector in vectors]
@@ -0,0 +1,193 @@
+import os
+import re
+import gzip
+import json
+import mmap
+import uuid
+import zlib
+import fcntl
+import struct
+import threading
+from datetime import datetime
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import ARCHIVE_DIR, ARCHIVE_SEGMENT_BYTES, ARCHIVE_COMPRESSION_LEVEL
+
+SEGMENT_PATTERN = re.compile(r"^archive-(\d{6})\.warc\.gz$")
+# doc id (uuid bytes), offset and length of the page's records in the segment.
+INDEX_ENTRY = struct.Struct("<16sQI")
+
+class ArchiveLocked(RuntimeError):
+    pass
+
+ARCHIVE_BYTES = REGISTRY.counter("archive_bytes_total", "Page bytes appended to the content archive", labels=("kind",))
+
+def warc_record(record_type, url, doc_id, content_type, body, date):
+    header = (
+        "WARC/1.1\r\n"
+        f"WARC-Type: {record_type}\r\n"
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+        f"WARC-Date: {date}\r\n"
+        f"WARC-Target-URI: {url}\r\n"
+        f"WARC-Page-ID: {doc_id}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return header.encode("utf-8"), body, b"\r\n\r\n"
+
+def parse_records(data):
+    records = []
+    pos = 0
+    while pos < len(data):
+        header_end = data.index(b"\r\n\r\n", pos)
+        headers = {}
+        for line in data[pos:header_end].decode("utf-8").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip()] = value.strip()
+        start = header_end + 4
+        end = start + int(headers["Content-Length"])
+        records.append((headers, data[start:end]))
+        pos = end + 4
+    return records
+
+class ContentArchive:
+    # Append-only WARC-style segments. Each page is a "resource" record with
+    # the raw HTML and a "conversion" record with the extracted text, each
+    # its own gzip member, so one page decompresses without touching its
+    # neighbours. A fixed-width index per segment lists every page written.
+    def __init__(self, directory=ARCHIVE_DIR, segment_bytes=ARCHIVE_SEGMENT_BYTES, level=ARCHIVE_COMPRESSION_LEVEL, read_only=False):
+        self.log = ConsoleLogger()
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        self.readers = {}
+        self.readers_lock = threading.Lock()
+        self.segment = None
+        self.index = None
+        self.lock_file = None
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+            self._lock_directory()
+        segment_ids = self.segment_ids()
+        self.segment_id = segment_ids[-1] if segment_ids else 1
+        if not read_only:
+            self._open_segment(self.segment_id)
+            self.log.info(f"Content archive opened at segment {self.segment_id}: {directory}")
+
+    def _lock_directory(self):
+        # Offsets come from this process's own view of the segment size, so a
+        # second writer on the directory would record pointers to the wrong
+        # bytes. The lock goes away with the process, even after a crash.
+        self.lock_file = open(os.path.join(self.directory, "LOCK"), "a")
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.lock_file.close()
+            self.lock_file = None
+            raise ArchiveLocked(f"Content archive {self.directory} is already open for writing by another process")
+
+    def _path(self, segment_id, suffix):
+        return os.path.join(self.directory, f"archive-{segment_id:06d}.{suffix}")
+
+    def segment_ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(match.group(1)) for match in map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if match)
+
+    def _open_segment(self, segment_id):
+        self.segment_id = segment_id
+        self.segment = open(self._path(segment_id, "warc.gz"), "ab")
+        self.index = open(self._path(segment_id, "idx"), "ab")
+        self.segment_size = self.segment.tell()
+
+    def _rotate(self):
+        self.segment.close()
+        self.index.close()
+        self._open_segment(self.segment_id + 1)
+
+    def _compress(self, record):
+        # Parts go to the compressor one by one, so a memoryview body is
+        # never copied into a joined record first.
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return b"".join([*map(compressor.compress, record), compressor.flush()])
+
+    def append(self, doc_id, url, raw_content, extracted):
+        if self.read_only:
+            raise RuntimeError("Content archive is read-only")
+        date = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        conversion = json.dumps(extracted, ensure_ascii=False).encode("utf-8")
+        # Compression runs outside the lock; zlib releases the GIL.
+        data = (
+            self._compress(warc_record("resource", url, doc_id, "text/html", raw_content, date))
+            + self._compress(warc_record("conversion", url, doc_id, "application/json", conversion, date))
+        )
+        with self.lock:
+            if self.segment_size and self.segment_size + len(data) > self.segment_bytes:
+                self._rotate()
+            offset = self.segment_size
+            self.segment.write(data)
+            self.segment.flush()
+            # The index entry follows the data, so it never points past what
+            # a crash left on disk.
+            self.index.write(INDEX_ENTRY.pack(uuid.UUID(doc_id).bytes, offset, len(data)))
+            self.index.flush()
+            self.segment_size += len(data)
+            segment_id = self.segment_id
+        ARCHIVE_BYTES.labels(kind="raw").inc(len(raw_content) + len(conversion))
+        ARCHIVE_BYTES.labels(kind="compressed").inc(len(data))
+        return {"segment": segment_id, "offset": offset, "length": len(data)}
+
+    def _read_bytes(self, segment_id, offset, length):
+        end = offset + length
+        with self.readers_lock:
+            view = self.readers.get(segment_id)
+            if view is None or len(view) < end:
+                # The active segment grows; map it again once a read goes
+                # past the end of the current mapping.
+                if view is not None:
+                    view.close()
+                with open(self._path(segment_id, "warc.gz"), "rb") as f:
+                    view = self.readers[segment_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return view[offset:end]
+
+    def read(self, pointer):
+        data = gzip.decompress(self._read_bytes(pointer["segment"], pointer["offset"], pointer["length"]))
+        page = {}
+        for headers, body in parse_records(data):
+            page["url"] = headers.get("WARC-Target-URI")
+            page["doc_id"] = headers.get("WARC-Page-ID")
+            if headers.get("WARC-Type") == "resource":
+                page["raw"] = body
+            elif headers.get("WARC-Type") == "conversion":
+                page["extracted"] = json.loads(body)
+        return page
+
+    def iter_index(self):
+        for segment_id in self.segment_ids():
+            try:
+                with open(self._path(segment_id, "idx"), "rb") as f:
+                    entries = f.read()
+            except OSError:
+                continue
+            usable = len(entries) - len(entries) % INDEX_ENTRY.size
+            for doc_id, offset, length in INDEX_ENTRY.iter_unpack(entries[:usable]):
+                yield str(uuid.UUID(bytes=doc_id)), {"segment": segment_id, "offset": offset, "length": length}
+
+    def latest_pointers(self):
+        # A revisited page is appended again; its newest record wins.
+        return dict(self.iter_index())
+
+    def close(self):
+        with self.lock:
+            if self.segment is not None:
+                self.segment.close()
+                self.index.close()
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+        with self.readers_lock:
+            for view in self.readers.values():
+                view.close()
+            self.readers.clear()
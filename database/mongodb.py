@@ -1,8 +1,20 @@
+import zlib
+import uuid
 import pymongo
 from datetime import datetime
 from utils.logger import ConsoleLogger    
 from utils.config import MONGODB_URL, MONGODB_DB_NAME
 
+RECRAWL_PROJECTION = {
+    "url": 1, "content_hash": 1, "crawled_at": 1, "etag": 1, "last_modified": 1, "checked_at": 1,
+    "check_count": 1, "change_count": 1, "observed_seconds": 1, "revisit_interval": 1
+}
+
+def domain_hash(domain):
+    # Same hash as crawler.sharding.shard_for_domain, so a shard can select
+    # its own pages with {"$mod": [shard_count, shard_id]}.
+    return zlib.crc32(domain.encode("utf-8"))
+
 class MongoDBManager:
     def __init__(self):
         try:
@@ -15,6 +27,8 @@ class MongoDBManager:
             self.metadata_collection.create_index("url", unique=True)
             self.metadata_collection.create_index("content_hash")
             self.metadata_collection.create_index("domain")
+            self.metadata_collection.create_index("next_crawl_at")
+            self.metadata_collection.create_index([("next_crawl_at", pymongo.ASCENDING), ("domain_hash", pymongo.ASCENDING)])
         except Exception as e:
             self.log.error(f"Could not connect to MongoDB: {e}")
             self.client = None
@@ -29,19 +43,124 @@ class MongoDBManager:
         if self.metadata_collection is None: return False
         return self.metadata_collection.count_documents({"content_hash": content_hash}, limit=1) > 0
 
-    def insert_metadata(self, doc_id, url, domain, content_hash, title, description):
-        if self.metadata_collection is None: return False
+    def iter_urls(self, since=None):
+        if self.metadata_collection is None: return
+        query = {"crawled_at": {"$gte": since}} if since else {}
+        cursor = self.metadata_collection.find(query, {"url": 1, "_id": 0}, batch_size=10000)
+        for document in cursor:
+            yield document["url"]
+
+    def iter_fingerprints(self, since=None):
+        if self.metadata_collection is None: return
+        query = {"simhash": {"$exists": True}}
+        if since:
+            query["crawled_at"] = {"$gte": since}
+        cursor = self.metadata_collection.find(query, {"simhash": 1}, batch_size=10000)
+        for document in cursor:
+            yield document["_id"], int(document["simhash"], 16)
+
+    def get_metadata_many(self, doc_ids):
+        if self.metadata_collection is None or not doc_ids: return {}
+        projection = {"url": 1, "title": 1, "description": 1, "domain": 1}
+        cursor = self.metadata_collection.find({"_id": {"$in": [str(doc_id) for doc_id in doc_ids]}}, projection)
+        return {document["_id"]: document for document in cursor}
+
+    @staticmethod
+    def build_metadata_document(doc_id, url, domain, content_hash, title, description, simhash=None, recrawl=None, archive=None):
         document = {
             "_id": str(doc_id),
             "url": url,
             "domain": domain,
+            "domain_hash": domain_hash(domain),
             "content_hash": content_hash,
             "title": title,
             "description": description,
             "crawled_at": datetime.utcnow()
         }
+        if simhash is not None:
+            document["simhash"] = f"{simhash:016x}"
+        if recrawl:
+            document.update(recrawl)
+        if archive is not None:
+            document["archive"] = archive
+        return document
+
+    def insert_metadata(self, doc_id, url, domain, content_hash, title, description):
+        if self.metadata_collection is None: return False
+        document = self.build_metadata_document(doc_id, url, domain, content_hash, title, description)
         try:
             self.metadata_collection.insert_one(document)
             return True
         except pymongo.errors.DuplicateKeyError:
-            return False
\ No newline at end of file
+            return False
+
+    def insert_metadata_many(self, documents):
+        if self.metadata_collection is None or not documents: return set()
+        inserted_ids = {document["_id"] for document in documents}
+        try:
+            self.metadata_collection.insert_many(documents, ordered=False)
+        except pymongo.errors.BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_id = documents[error["index"]]["_id"]
+                inserted_ids.discard(failed_id)
+                if error.get("code") != 11000:
+                    self.log.error(f"Failed to insert metadata {failed_id}: {error.get('errmsg')}")
+        return inserted_ids
+
+    def delete_metadata_many(self, doc_ids):
+        if self.metadata_collection is None or not doc_ids: return 0
+        return self.metadata_collection.delete_many({"_id": {"$in": [str(doc_id) for doc_id in doc_ids]}}).deleted_count
+
+    def update_metadata_many(self, documents):
+        if self.metadata_collection is None or not documents: return 0
+        operations = [
+            pymongo.UpdateOne({"_id": document["_id"]}, {"$set": {k: v for k, v in document.items() if k != "_id"}})
+            for document in documents
+        ]
+        return self.metadata_collection.bulk_write(operations, ordered=False).matched_count
+
+    def find_due_urls(self, now, limit, shard=None):
+        if self.metadata_collection is None or limit <= 0: return []
+        query = {"next_crawl_at": {"$lte": now}}
+        if shard is not None:
+            shard_id, shard_count = shard
+            query["domain_hash"] = {"$mod": [shard_count, shard_id]}
+        cursor = self.metadata_collection.find(query, RECRAWL_PROJECTION)
+        return list(cursor.sort("next_crawl_at", pymongo.ASCENDING).limit(limit))
+
+    def claim_urls(self, doc_ids, now, until):
+        # Only pages that are still due are leased, so two pollers that read
+        # the same batch never both queue a page; returns the ids this call won.
+        if self.metadata_collection is None or not doc_ids: return set()
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        lease = uuid.uuid4().hex
+        self.metadata_collection.update_many(
+            {"_id": {"$in": doc_ids}, "next_crawl_at": {"$lte": now}},
+            {"$set": {"next_crawl_at": until, "lease": lease}}
+        )
+        return {document["_id"] for document in self.metadata_collection.find({"_id": {"$in": doc_ids}, "lease": lease}, {"_id": 1})}
+
+    def hash_domains(self, batch_size=1000):
+        # Pages stored before domain_hash existed would never match a shard's
+        # due query.
+        if self.metadata_collection is None: return 0
+        updated = 0
+        operations = []
+        for document in self.metadata_collection.find({"domain_hash": {"$exists": False}}, {"domain": 1}, batch_size=10000):
+            operations.append(pymongo.UpdateOne({"_id": document["_id"]}, {"$set": {"domain_hash": domain_hash(document.get("domain") or "")}}))
+            if len(operations) >= batch_size:
+                updated += self.metadata_collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += self.metadata_collection.bulk_write(operations, ordered=False).modified_count
+        return updated
+
+    def schedule_unscheduled(self, interval_seconds):
+        # Pages stored before revisits existed become due one interval after
+        # they were crawled.
+        if self.metadata_collection is None: return 0
+        result = self.metadata_collection.update_many(
+            {"next_crawl_at": {"$exists": False}},
+            [{"$set": {"next_crawl_at": {"$add": ["$crawled_at", int(interval_seconds * 1000)]}}}]
+        )
+        return result.modified_count
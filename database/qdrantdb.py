@@ -51,4 +51,45 @@ class QdrantDBManager:
             )
             # self.log.info(f"Upserted vector ID: {point_id}")
         except Exception as e:
-            self.log.error(f"Failed to upsert vector ID {point_id}: {e}")
\ No newline at end of file
+            self.log.error(f"Failed to upsert vector ID {point_id}: {e}")
+
+    def upsert_vectors(self, points, wait=True):
+        if not self.client:
+            self.log.warn("Qdrant client is not initialized")
+            return False
+        if not points:
+            return True
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[
+                models.PointStruct(id=str(point_id), vector=vector, payload=payload)
+                for point_id, vector, payload in points
+            ],
+            wait=wait,
+        )
+        return True
+
+    def search_vectors(self, vector, limit=10, offset=0):
+        if not self.client:
+            self.log.warn("Qdrant client is not initialized")
+            return []
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            query=vector,
+            limit=limit,
+            offset=offset,
+            with_payload=False,
+        )
+        return [(str(point.id), point.score) for point in response.points]
+
+    def delete_vectors(self, point_ids):
+        if not self.client:
+            self.log.warn("Qdrant client is not initialized")
+            return False
+        if not point_ids:
+            return True
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.PointIdsList(points=[str(point_id) for point_id in point_ids]),
+        )
+        return True
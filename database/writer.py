@@ -0,0 +1,160 @@
+import time
+import threading
+from queue import Queue, Empty
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL_MS, WRITE_MAX_PENDING, WRITE_MAX_RETRIES
+
+WRITE_MS = REGISTRY.histogram(
+    "writer_flush_duration_ms", "Time per batched write", [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000], labels=("store",)
+)
+WRITE_PENDING = REGISTRY.gauge("writer_pending", "Pages waiting in the write-behind buffer")
+WRITE_RESULTS = REGISTRY.counter("writer_pages_total", "Pages flushed by the write-behind buffer", labels=("result",))
+
+class WriteBehindBuffer:
+    def __init__(self, mongo_manager, qdrant_manager, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval_ms=WRITE_FLUSH_INTERVAL_MS, max_pending=WRITE_MAX_PENDING, on_discard=None):
+        self.log = ConsoleLogger()
+        self.mongo_manager = mongo_manager
+        self.qdrant_manager = qdrant_manager
+        # Called with the ids of new pages that were not stored, so state
+        # registered for them at crawl time (near-duplicate fingerprints) goes too.
+        self.on_discard = on_discard
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0, flush_interval_ms) / 1000
+        self.pending = Queue(maxsize=max_pending)
+        self.written = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._submit_lock = threading.Lock()
+        WRITE_PENDING.set_function(self.pending.qsize)
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        self.log.info(f"Write-behind buffer started (batch size {self.batch_size}, flush every {flush_interval_ms}ms)")
+
+    def submit(self, document, point=None, update=False):
+        with self._submit_lock:
+            if self._stop.is_set():
+                raise RuntimeError("Write-behind buffer is closed")
+            self.pending.put((document, point, update))
+
+    def _collect_batch(self, block=True):
+        try:
+            first = self.pending.get(timeout=0.5) if block else self.pending.get_nowait()
+        except Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or not block:
+                    batch.append(self.pending.get_nowait())
+                else:
+                    batch.append(self.pending.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+        # The final drain happens on this thread as well: rollbacks and
+        # duplicate handling assume a single flusher.
+        while True:
+            batch = self._collect_batch(block=False)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _count(self, result, count):
+        if not count:
+            return
+        setattr(self, result, getattr(self, result) + count)
+        WRITE_RESULTS.labels(result=result).inc(count)
+
+    def _discard(self, doc_ids):
+        if self.on_discard is None or not doc_ids:
+            return
+        try:
+            self.on_discard(doc_ids)
+        except Exception as e:
+            self.log.error(f"Failed to discard {len(doc_ids)} unstored pages: {e}")
+
+    def _upsert_with_retry(self, points):
+        for attempt in range(WRITE_MAX_RETRIES + 1):
+            try:
+                with WRITE_MS.labels(store="qdrant").time():
+                    return self.qdrant_manager.upsert_vectors(points)
+            except Exception as e:
+                if attempt == WRITE_MAX_RETRIES:
+                    self.log.error(f"Failed to upsert {len(points)} vectors after {attempt + 1} attempts: {e}")
+                    return False
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _flush(self, batch):
+        inserts = [(document, point) for document, point, update in batch if not update]
+        updates = [(document, point) for document, point, update in batch if update]
+        if inserts:
+            self._flush_inserts(inserts)
+        if updates:
+            self._flush_updates(updates)
+
+    def _flush_inserts(self, batch):
+        documents = [document for document, _ in batch]
+        try:
+            with WRITE_MS.labels(store="mongo").time():
+                inserted_ids = self.mongo_manager.insert_metadata_many(documents)
+        except Exception as e:
+            self.log.error(f"Failed to insert {len(documents)} metadata documents: {e}")
+            self._count("failed", len(documents))
+            self._discard([document["_id"] for document in documents])
+            return
+
+        points = [point for document, point in batch if document["_id"] in inserted_ids]
+        self._count("duplicates", len(documents) - len(inserted_ids))
+        self._discard([document["_id"] for document in documents if document["_id"] not in inserted_ids])
+        if not points:
+            return
+
+        if self._upsert_with_retry(points):
+            self._count("written", len(points))
+            return
+
+        self._count("failed", len(points))
+        failed_ids = [point_id for point_id, _, _ in points]
+        self._discard(failed_ids)
+        try:
+            self.mongo_manager.delete_metadata_many(failed_ids)
+        except Exception as e:
+            self.log.error(f"Failed to roll back {len(points)} metadata documents: {e}")
+
+    def _flush_updates(self, batch):
+        # Vectors go first: if the upsert fails, the metadata keeps its old
+        # content hash and revisit lease, so the page is fetched again later.
+        points = [point for _, point in batch if point is not None]
+        if points and not self._upsert_with_retry(points):
+            self._count("failed", len(points))
+            failed_ids = {point_id for point_id, _, _ in points}
+            batch = [(document, point) for document, point in batch if document["_id"] not in failed_ids]
+        if not batch:
+            return
+
+        try:
+            with WRITE_MS.labels(store="mongo").time():
+                self.mongo_manager.update_metadata_many([document for document, _ in batch])
+        except Exception as e:
+            self.log.error(f"Failed to update {len(batch)} metadata documents: {e}")
+            self._count("failed", sum(1 for _, point in batch if point is not None))
+            return
+        self._count("updated", sum(1 for _, point in batch if point is not None))
+
+    def close(self):
+        with self._submit_lock:
+            self._stop.set()
+        self._thread.join()
+        self.log.info(f"Write-behind buffer flushed: {self.written} written, {self.updated} updated, {self.duplicates} duplicates, {self.failed} failed")
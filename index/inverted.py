@@ -0,0 +1,415 @@
+import os
+import re
+import json
+import math
+import time
+import heapq
+import threading
+from queue import Queue, Empty, Full
+from index.segment import Segment, write_segment
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import (
+    INDEX_DIR,
+    INDEX_FLUSH_DOCS,
+    INDEX_FLUSH_INTERVAL,
+    INDEX_MERGE_FACTOR,
+    INDEX_QUEUE_SIZE,
+    INDEX_ENQUEUE_TIMEOUT,
+    BM25_K1,
+    BM25_B
+)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+class InvertedIndex:
+    def __init__(self, directory=INDEX_DIR, writable=True):
+        self.log = ConsoleLogger()
+        self.directory = directory
+        self.writable = writable
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.manifest_mtime = None
+        self.lock = threading.RLock()
+        self.segments = []
+        self.sequences = {}
+        self.live = {}
+        self.live_length_total = 0
+        self.deleted = {}
+        self.next_segment_id = 0
+        self.indexed = 0
+        self.dropped = 0
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isdir(directory):
+            # A reader that created the directory would serve an empty index
+            # without complaint when pointed at the wrong path.
+            raise FileNotFoundError(f"Index directory {directory} does not exist")
+        self._load_manifest()
+
+        self._stop = threading.Event()
+        self._threads = []
+        if writable:
+            self.pending = Queue(maxsize=INDEX_QUEUE_SIZE)
+            REGISTRY.gauge("index_pending_documents", "Documents waiting to be indexed").set_function(self.pending.qsize)
+            REGISTRY.gauge("index_dropped_documents", "Documents dropped because the index queue was full").set_function(lambda: self.dropped)
+            for target, name in ((self._index_loop, "index-writer"), (self._merge_loop, "index-merger")):
+                thread = threading.Thread(target=target, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _segment_path(self, segment_id):
+        return os.path.join(self.directory, f"{segment_id:08d}.seg")
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.manifest_mtime = os.path.getmtime(self.manifest_path)
+        segments = []
+        sequences = {}
+        for entry in manifest["segments"]:
+            segments.append(Segment(self._segment_path(entry["id"]), entry["id"]))
+            sequences[entry["id"]] = entry["seq"]
+        live = {}
+        live_length_total = 0
+        for segment in sorted(segments, key=lambda s: sequences[s.segment_id]):
+            for doc_key, length in zip(segment.doc_keys, segment.doc_lengths):
+                previous = live.get(doc_key)
+                if previous is not None:
+                    live_length_total -= previous[1]
+                live[doc_key] = (segment.segment_id, length)
+                live_length_total += length
+        deleted = manifest.get("deleted", {})
+        for doc_key, sequence in deleted.items():
+            current = live.get(doc_key)
+            if current is not None and sequences[current[0]] < sequence:
+                live_length_total -= live.pop(doc_key)[1]
+        with self.lock:
+            self.segments = segments
+            self.sequences = sequences
+            self.live = live
+            self.live_length_total = live_length_total
+            self.deleted = deleted
+            self.next_segment_id = manifest["next_id"]
+
+    def _write_manifest(self):
+        manifest = {
+            "segments": [{"id": s.segment_id, "seq": self.sequences[s.segment_id]} for s in self.segments],
+            "deleted": self.deleted,
+            "next_id": self.next_segment_id
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def refresh(self):
+        if self.writable or not os.path.exists(self.manifest_path):
+            return
+        if os.path.getmtime(self.manifest_path) != self.manifest_mtime:
+            try:
+                self._load_manifest()
+            except (OSError, ValueError) as e:
+                self.log.warn(f"Index refresh failed, keeping previous segments: {e}")
+
+    def add_document(self, doc_key, text):
+        # A page stored in Mongo and Qdrant but missing here can never be
+        # found by keyword, so a full queue slows the crawler down instead
+        # of silently losing the page.
+        try:
+            self.pending.put((doc_key, text), timeout=INDEX_ENQUEUE_TIMEOUT)
+            return True
+        except Full:
+            self.dropped += 1
+            self.log.error(f"Index queue full for {INDEX_ENQUEUE_TIMEOUT}s, document {doc_key} is not keyword-searchable", key="index_dropped")
+            return False
+
+    def remove_document(self, doc_key):
+        # Goes through the same queue as additions so a page stored and then
+        # removed in one batch ends up removed.
+        try:
+            self.pending.put((doc_key, None), timeout=INDEX_ENQUEUE_TIMEOUT)
+            return True
+        except Full:
+            self.log.error(f"Index queue full for {INDEX_ENQUEUE_TIMEOUT}s, document {doc_key} stays keyword-searchable", key="index_dropped")
+            return False
+
+    @staticmethod
+    def _build_postings(batch):
+        documents = []
+        postings = {}
+        for local_id, (doc_key, text) in enumerate((key, text) for key, text in batch.items() if text is not None):
+            counts = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = ([], [])
+                entry[0].append(local_id)
+                entry[1].append(tf)
+            documents.append((doc_key, len(tokens)))
+        return documents, postings
+
+    def _index_loop(self):
+        # Liveness is tracked per segment, so a segment must hold one version
+        # of each document: a page stored twice in a batch (a changed page
+        # revisited quickly) keeps only its latest text. A removal is kept as
+        # text None and written as a tombstone.
+        batch = {}
+        first_added = None
+        while True:
+            try:
+                doc_key, text = self.pending.get(timeout=0.5)
+            except Empty:
+                doc_key = None
+            if doc_key is not None:
+                batch.pop(doc_key, None)
+                batch[doc_key] = text
+                first_added = first_added or time.monotonic()
+
+            stopping = self._stop.is_set() and self.pending.empty()
+            if batch and (
+                len(batch) >= INDEX_FLUSH_DOCS
+                or time.monotonic() - first_added >= INDEX_FLUSH_INTERVAL
+                or stopping
+            ):
+                removed = [doc_key for doc_key, text in batch.items() if text is None]
+                self._flush(*self._build_postings(batch), removed)
+                batch, first_added = {}, None
+            if stopping:
+                return
+
+    def _install(self, segment, sequence, replaced_ids=(), removed=()):
+        with self.lock:
+            replaced_ids = set(replaced_ids)
+            if segment is not None:
+                for doc_key, length in zip(segment.doc_keys, segment.doc_lengths):
+                    previous = self.live.get(doc_key)
+                    if replaced_ids and (previous is None or previous[0] not in replaced_ids):
+                        continue
+                    if previous is not None:
+                        self.live_length_total -= previous[1]
+                    self.live[doc_key] = (segment.segment_id, length)
+                    self.live_length_total += length
+                    if not replaced_ids:
+                        self.deleted.pop(doc_key, None)
+                self.segments = [s for s in self.segments if s.segment_id not in replaced_ids] + [segment]
+                self.sequences[segment.segment_id] = sequence
+            for segment_id in replaced_ids:
+                self.sequences.pop(segment_id, None)
+            for doc_key in removed:
+                previous = self.live.pop(doc_key, None)
+                if previous is not None:
+                    self.live_length_total -= previous[1]
+                self.deleted[doc_key] = sequence
+            if replaced_ids and self.deleted:
+                # A tombstone is only needed while an older segment still
+                # holds the key; merges drop the dead copies.
+                present = set()
+                for s in self.segments:
+                    present.update(s.doc_keys)
+                self.deleted = {key: seq for key, seq in self.deleted.items() if key in present}
+            self._write_manifest()
+
+    def _allocate_segment_id(self):
+        with self.lock:
+            segment_id = self.next_segment_id
+            self.next_segment_id += 1
+            return segment_id
+
+    def _flush(self, documents, postings, removed=()):
+        segment_id = self._allocate_segment_id()
+        segment = None
+        if documents:
+            try:
+                write_segment(self._segment_path(segment_id), documents, postings)
+                segment = Segment(self._segment_path(segment_id), segment_id)
+            except OSError as e:
+                self.log.error(f"Failed to write index segment {segment_id}: {e}")
+                return
+        self._install(segment, segment_id, removed=removed)
+        self.indexed += len(documents)
+
+    def _merge_loop(self):
+        while not self._stop.wait(1):
+            with self.lock:
+                if len(self.segments) <= INDEX_MERGE_FACTOR:
+                    continue
+                sources = sorted(self.segments, key=len)[:INDEX_MERGE_FACTOR]
+            try:
+                self._merge(sources)
+            except OSError as e:
+                self.log.error(f"Failed to merge index segments: {e}")
+
+    def _merge(self, sources):
+        documents = []
+        postings = {}
+        remaps = []
+        with self.lock:
+            live = {key: value[0] for key, value in self.live.items()}
+        for segment in sources:
+            remap = []
+            # Segments written before batches were deduplicated may hold a
+            # key twice; only its last entry is the live one.
+            last = {doc_key: i for i, doc_key in enumerate(segment.doc_keys)}
+            for i, (doc_key, length) in enumerate(zip(segment.doc_keys, segment.doc_lengths)):
+                if live.get(doc_key) == segment.segment_id and last[doc_key] == i:
+                    remap.append(len(documents))
+                    documents.append((doc_key, length))
+                else:
+                    remap.append(None)
+            remaps.append(remap)
+
+        for segment, remap in zip(sources, remaps):
+            for term in segment.terms:
+                doc_ids, term_freqs = segment.postings(term)
+                for doc_id, tf in zip(doc_ids, term_freqs):
+                    new_id = remap[doc_id]
+                    if new_id is None:
+                        continue
+                    entry = postings.get(term)
+                    if entry is None:
+                        entry = postings[term] = ([], [])
+                    entry[0].append(new_id)
+                    entry[1].append(tf)
+
+        segment_id = self._allocate_segment_id()
+        write_segment(self._segment_path(segment_id), documents, postings)
+        merged = Segment(self._segment_path(segment_id), segment_id)
+        with self.lock:
+            sequence = max(self.sequences[s.segment_id] for s in sources)
+        self._install(merged, sequence, replaced_ids=[s.segment_id for s in sources])
+        for segment in sources:
+            try:
+                os.remove(segment.path)
+            except OSError:
+                pass
+        self.log.info(f"Merged {len(sources)} index segments into {segment_id} ({len(documents)} docs)")
+
+    def __len__(self):
+        return len(self.live)
+
+    def view(self):
+        self.refresh()
+        with self.lock:
+            return self.segments, self.live, self.live_length_total
+
+    def search(self, query, k=10):
+        return search_views([self.view()], query, k)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "documents": len(self.live),
+                "segments": len(self.segments),
+                "indexed": self.indexed,
+                "dropped": self.dropped,
+                "pending": self.pending.qsize() if self.writable else 0
+            }
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self.log.info(f"Inverted index closed: {self.stats()}")
+
+class ShardedIndex:
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def search(self, query, k=10):
+        return search_views([index.view() for index in self.indexes], query, k)
+
+    def stats(self):
+        shards = [index.stats() for index in self.indexes]
+        totals = {field: sum(shard[field] for shard in shards) for field in shards[0]}
+        return {**totals, "shards": len(shards)}
+
+    def close(self):
+        for index in self.indexes:
+            index.close()
+
+def search_views(views, query, k=10):
+    # Each view is one index's (segments, live, live_length_total). Statistics
+    # are pooled across views so a document scores the same whichever shard
+    # holds it, and doc keys never repeat across shards.
+    terms = set(tokenize(query))
+    num_docs = sum(len(live) for _, live, _ in views)
+    if not terms or not num_docs:
+        return []
+    avgdl = sum(length_total for _, _, length_total in views) / num_docs
+
+    idf = {}
+    for term in terms:
+        # Segment document frequencies still count replaced and removed
+        # copies; past num_docs they would turn the idf negative.
+        df = min(num_docs, sum(segment.terms[term][0] for segments, _, _ in views for segment in segments if term in segment.terms))
+        if df:
+            idf[term] = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+    heap = []
+    for segments, live, _ in views:
+        for segment in segments:
+            cursors = []
+            for term, term_idf in idf.items():
+                entry = segment.terms.get(term)
+                if entry is None:
+                    continue
+                max_tf = entry[1]
+                upper_bound = term_idf * max_tf * (BM25_K1 + 1) / (max_tf + BM25_K1 * (1 - BM25_B))
+                cursor = segment.cursor(term, upper_bound)
+                cursor.idf = term_idf
+                cursors.append(cursor)
+            if cursors:
+                _wand(segment, cursors, k, heap, live, avgdl)
+
+    return [(doc_key, score) for score, doc_key in sorted(heap, reverse=True)]
+
+def _wand(segment, cursors, k, heap, live, avgdl):
+    lengths = segment.doc_lengths
+    keys = segment.doc_keys
+    segment_id = segment.segment_id
+    while cursors:
+        cursors.sort(key=lambda c: c.doc)
+        threshold = heap[0][0] if len(heap) >= k else 0.0
+        accumulated = 0.0
+        pivot = None
+        for i, cursor in enumerate(cursors):
+            accumulated += cursor.upper_bound
+            if accumulated > threshold:
+                pivot = i
+                break
+        if pivot is None:
+            return
+
+        pivot_doc = cursors[pivot].doc
+        if cursors[0].doc == pivot_doc:
+            doc_key = keys[pivot_doc]
+            is_live = live.get(doc_key, (None,))[0] == segment_id
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[pivot_doc] / avgdl)
+            score = 0.0
+            for cursor in cursors:
+                if cursor.doc != pivot_doc:
+                    break
+                if is_live:
+                    tf = cursor.tf
+                    score += cursor.idf * tf * (BM25_K1 + 1) / (tf + norm)
+                cursor.next()
+            if is_live:
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, doc_key))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, doc_key))
+        else:
+            for cursor in cursors[:pivot]:
+                cursor.advance(pivot_doc)
+        cursors = [cursor for cursor in cursors if cursor.doc is not None]
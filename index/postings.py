@@ -0,0 +1,118 @@
+from bisect import bisect_left
+
+BLOCK_SIZE = 128
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode_postings(doc_ids, term_freqs):
+    headers = bytearray()
+    blocks = bytearray()
+    num_blocks = (len(doc_ids) + BLOCK_SIZE - 1) // BLOCK_SIZE
+    encode_varint(num_blocks, headers)
+    previous = 0
+    for start in range(0, len(doc_ids), BLOCK_SIZE):
+        block = bytearray()
+        for doc_id, tf in zip(doc_ids[start:start + BLOCK_SIZE], term_freqs[start:start + BLOCK_SIZE]):
+            encode_varint(doc_id - previous, block)
+            encode_varint(tf, block)
+            previous = doc_id
+        encode_varint(previous, headers)
+        encode_varint(len(block), headers)
+        blocks += block
+    return bytes(headers + blocks)
+
+def decode_all(buf, offset=0):
+    doc_ids = []
+    term_freqs = []
+    cursor = PostingCursor(buf, offset)
+    for block in range(len(cursor.block_last)):
+        docs, tfs = cursor._decode_block(block)
+        doc_ids += docs
+        term_freqs += tfs
+    return doc_ids, term_freqs
+
+class PostingCursor:
+    def __init__(self, buf, offset=0, upper_bound=0.0, term=None):
+        self.buf = buf
+        self.term = term
+        self.upper_bound = upper_bound
+        num_blocks, pos = decode_varint(buf, offset)
+        self.block_last = []
+        self.block_start = []
+        lengths = []
+        for _ in range(num_blocks):
+            last, pos = decode_varint(buf, pos)
+            length, pos = decode_varint(buf, pos)
+            self.block_last.append(last)
+            lengths.append(length)
+        for length in lengths:
+            self.block_start.append(pos)
+            pos += length
+        self.block_end = pos
+        self.block = -1
+        self.docs = []
+        self.tfs = []
+        self.index = 0
+        self.doc = None
+        self._load_block(0)
+
+    def _decode_block(self, block):
+        pos = self.block_start[block]
+        end = self.block_start[block + 1] if block + 1 < len(self.block_start) else self.block_end
+        previous = self.block_last[block - 1] if block > 0 else 0
+        docs = []
+        tfs = []
+        buf = self.buf
+        while pos < end:
+            delta, pos = decode_varint(buf, pos)
+            tf, pos = decode_varint(buf, pos)
+            previous += delta
+            docs.append(previous)
+            tfs.append(tf)
+        return docs, tfs
+
+    def _load_block(self, block):
+        if block >= len(self.block_last):
+            self.doc = None
+            return
+        self.block = block
+        self.docs, self.tfs = self._decode_block(block)
+        self.index = 0
+        self.doc = self.docs[0]
+
+    @property
+    def tf(self):
+        return self.tfs[self.index]
+
+    def next(self):
+        self.index += 1
+        if self.index < len(self.docs):
+            self.doc = self.docs[self.index]
+        else:
+            self._load_block(self.block + 1)
+
+    def advance(self, target):
+        if self.doc is None or self.doc >= target:
+            return
+        if target > self.block_last[self.block]:
+            block = bisect_left(self.block_last, target, self.block + 1)
+            self._load_block(block)
+            if self.doc is None:
+                return
+        self.index = bisect_left(self.docs, target, self.index)
+        self.doc = self.docs[self.index]
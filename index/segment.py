@@ -0,0 +1,90 @@
+import os
+import mmap
+import struct
+from index.postings import encode_postings, encode_varint, decode_varint, decode_all, PostingCursor
+
+SEGMENT_MAGIC = b"IDX1"
+HEADER_FORMAT = "<4sIIQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+def write_segment(path, documents, postings):
+    terms = sorted(postings)
+    dictionary = bytearray()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        offset = HEADER_SIZE
+        for term in terms:
+            doc_ids, term_freqs = postings[term]
+            blob = encode_postings(doc_ids, term_freqs)
+            f.write(blob)
+            term_bytes = term.encode("utf-8")
+            encode_varint(len(term_bytes), dictionary)
+            dictionary += term_bytes
+            encode_varint(len(doc_ids), dictionary)
+            encode_varint(max(term_freqs), dictionary)
+            encode_varint(offset, dictionary)
+            offset += len(blob)
+
+        docs_offset = offset
+        doc_table = bytearray()
+        for doc_key, length in documents:
+            key_bytes = doc_key.encode("utf-8")
+            encode_varint(len(key_bytes), doc_table)
+            doc_table += key_bytes
+            encode_varint(length, doc_table)
+        f.write(doc_table)
+        dict_offset = docs_offset + len(doc_table)
+        f.write(dictionary)
+
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, SEGMENT_MAGIC, len(documents), len(terms), docs_offset, dict_offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class Segment:
+    def __init__(self, path, segment_id):
+        self.path = path
+        self.segment_id = segment_id
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_docs, num_terms, docs_offset, dict_offset = struct.unpack_from(HEADER_FORMAT, self.buf, 0)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"Not an index segment: {path}")
+
+        self.doc_keys = []
+        self.doc_lengths = []
+        pos = docs_offset
+        for _ in range(num_docs):
+            key_length, pos = decode_varint(self.buf, pos)
+            self.doc_keys.append(self.buf[pos:pos + key_length].decode("utf-8"))
+            pos += key_length
+            length, pos = decode_varint(self.buf, pos)
+            self.doc_lengths.append(length)
+
+        self.terms = {}
+        pos = dict_offset
+        for _ in range(num_terms):
+            term_length, pos = decode_varint(self.buf, pos)
+            term = self.buf[pos:pos + term_length].decode("utf-8")
+            pos += term_length
+            df, pos = decode_varint(self.buf, pos)
+            max_tf, pos = decode_varint(self.buf, pos)
+            offset, pos = decode_varint(self.buf, pos)
+            self.terms[term] = (df, max_tf, offset)
+
+    def __len__(self):
+        return len(self.doc_keys)
+
+    def size_bytes(self):
+        return len(self.buf)
+
+    def cursor(self, term, upper_bound):
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        return PostingCursor(self.buf, entry[2], upper_bound, term)
+
+    def postings(self, term):
+        return decode_all(self.buf, self.terms[term][2])
@@ -0,0 +1,115 @@
+import json
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from database.mongodb import MongoDBManager
+from database.qdrantdb import QdrantDBManager
+from crawler.embedder import EmbeddingBatcher
+from search.service import SearchService
+from index.inverted import InvertedIndex, ShardedIndex
+from crawler.sharding import configured_shard_count, shard_paths
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import SEARCH_HOST, SEARCH_PORT, SEARCH_DEFAULT_LIMIT, SEARCH_EMBEDDING_BATCH_WAIT_MS, INDEX_DIR
+
+log = ConsoleLogger()
+
+class SearchHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def make_handler(service):
+    class SearchHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            params = parse_qs(parsed.query)
+            if parsed.path == "/search":
+                try:
+                    limit = int(params.get("limit", [SEARCH_DEFAULT_LIMIT])[0])
+                    offset = int(params.get("offset", [0])[0])
+                except ValueError:
+                    self._send_json(400, {"error": "limit and offset must be integers"})
+                    return
+                try:
+                    self._send_json(200, service.search(
+                        params.get("q", [""])[0], limit=limit, offset=offset, mode=params.get("mode", [None])[0]
+                    ))
+                except ValueError as e:
+                    self._send_json(400, {"error": str(e)})
+                except Exception as e:
+                    log.error(f"Search failed: {e}")
+                    self._send_json(500, {"error": "search failed"})
+            elif parsed.path == "/stats":
+                self._send_json(200, service.stats())
+            elif parsed.path == "/metrics":
+                data = REGISTRY.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return SearchHandler
+
+def serve(service, host=SEARCH_HOST, port=SEARCH_PORT):
+    server = SearchHTTPServer((host, port), make_handler(service))
+    log.info(f"Search API listening on http://{host}:{server.server_port}/search?q=")
+    return server
+
+def open_text_index():
+    if not INDEX_DIR:
+        return None
+    shard_count = configured_shard_count()
+    if not shard_count:
+        return InvertedIndex(INDEX_DIR, writable=False)
+    # Each crawler shard writes its own index; shards run on other hosts
+    # leave their pages out of lexical results until their index is copied here.
+    indexes = []
+    for path in shard_paths(INDEX_DIR, shard_count):
+        try:
+            indexes.append(InvertedIndex(path, writable=False))
+        except FileNotFoundError as e:
+            log.warn(f"{e}, its shard's pages are not keyword-searchable")
+    if not indexes:
+        raise FileNotFoundError(f"No index directory for any of the {shard_count} shards of {INDEX_DIR}")
+    return ShardedIndex(indexes)
+
+def main():
+    mongo_manager = MongoDBManager()
+    qdrant_manager = QdrantDBManager()
+    if mongo_manager.metadata_collection is None or qdrant_manager.client is None:
+        log.error("Database connection failed. Exiting")
+        return
+
+    try:
+        text_index = open_text_index()
+    except FileNotFoundError as e:
+        log.error(f"{e}. Set INDEX_DIR to the crawler's index or to an empty value for vector-only search")
+        return
+
+    # Queries have their own LRU in SearchService; the on-disk cache is the
+    # crawler's and would only fill with one-off query strings.
+    embedder = EmbeddingBatcher(max_wait_ms=SEARCH_EMBEDDING_BATCH_WAIT_MS, cache_path=None)
+    server = serve(SearchService(qdrant_manager, mongo_manager, embedder, text_index=text_index))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.warn("Interrupted. Shutting down search API")
+    finally:
+        server.server_close()
+        embedder.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import time
+from utils.cache import LRUCache, TTLCache
+from utils.logger import ConsoleLogger
+from utils.metrics import REGISTRY
+from utils.config import (
+    SEARCH_DEFAULT_LIMIT,
+    SEARCH_MAX_LIMIT,
+    SEARCH_EMBEDDING_CACHE_SIZE,
+    SEARCH_RESULT_CACHE_SIZE,
+    SEARCH_RESULT_CACHE_TTL,
+    SEARCH_P50_TARGET_MS,
+    SEARCH_P99_TARGET_MS,
+    SEARCH_MODE,
+    SEARCH_RRF_K
+)
+
+LATENCY_BOUNDS_MS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000]
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def reciprocal_rank_fusion(rankings, k=SEARCH_RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class SearchService:
+    def __init__(self, qdrant_manager, mongo_manager, embedder, text_index=None, mode=SEARCH_MODE):
+        self.log = ConsoleLogger()
+        self.qdrant_manager = qdrant_manager
+        self.mongo_manager = mongo_manager
+        self.embedder = embedder
+        self.text_index = text_index
+        self.mode = mode if text_index is not None else "vector"
+        self.embedding_cache = LRUCache(SEARCH_EMBEDDING_CACHE_SIZE)
+        self.result_cache = TTLCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL)
+        self.latency_ms = REGISTRY.histogram("search_latency_ms", "End-to-end search latency", LATENCY_BOUNDS_MS)
+
+    def _embed_query(self, query):
+        vector = self.embedding_cache.get(query)
+        if vector is None:
+            vector = self.embedder.embed(query)
+            self.embedding_cache.put(query, vector)
+        return vector
+
+    def _rank(self, query, limit, offset, mode):
+        if mode == "vector":
+            return self.qdrant_manager.search_vectors(self._embed_query(query), limit=limit, offset=offset)
+        lexical_hits = self.text_index.search(query, k=offset + limit)
+        if mode == "lexical":
+            return lexical_hits[offset:offset + limit]
+        vector_hits = self.qdrant_manager.search_vectors(self._embed_query(query), limit=offset + limit)
+        return reciprocal_rank_fusion([vector_hits, lexical_hits])[offset:offset + limit]
+
+    def _retrieve(self, query, limit, offset, mode):
+        hits = self._rank(query, limit, offset, mode)
+        metadata = self.mongo_manager.get_metadata_many([doc_id for doc_id, _ in hits])
+
+        results = []
+        for doc_id, score in hits:
+            document = metadata.get(doc_id)
+            if document is None:
+                continue
+            results.append({
+                "id": doc_id,
+                "url": document.get("url"),
+                "title": document.get("title", ""),
+                "description": document.get("description", ""),
+                "score": score
+            })
+        return results
+
+    def search(self, query, limit=SEARCH_DEFAULT_LIMIT, offset=0, mode=None):
+        started = time.perf_counter()
+        query = normalize_query(query)
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        offset = max(0, offset)
+        mode = mode or self.mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        if mode != "vector" and self.text_index is None:
+            mode = "vector"
+        if not query:
+            return {"query": query, "mode": mode, "results": [], "cached": False, "took_ms": 0.0}
+
+        cache_key = (query, limit, offset, mode)
+        results = self.result_cache.get(cache_key)
+        cached = results is not None
+        if not cached:
+            results = self._retrieve(query, limit, offset, mode)
+            self.result_cache.put(cache_key, results)
+
+        took_ms = (time.perf_counter() - started) * 1000
+        self.latency_ms.observe(took_ms)
+        return {"query": query, "mode": mode, "results": results, "cached": cached, "took_ms": round(took_ms, 3)}
+
+    def latency_report(self):
+        p50 = self.latency_ms.percentile(0.5)
+        p99 = self.latency_ms.percentile(0.99)
+        return {
+            "count": self.latency_ms.count,
+            "p50_ms": p50,
+            "p99_ms": p99,
+            "p50_target_ms": SEARCH_P50_TARGET_MS,
+            "p99_target_ms": SEARCH_P99_TARGET_MS,
+            "meets_targets": p50 <= SEARCH_P50_TARGET_MS and p99 <= SEARCH_P99_TARGET_MS
+        }
+
+    def stats(self):
+        return {
+            "latency": self.latency_report(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "text_index": self.text_index.stats() if self.text_index is not None else None
+        }
@@ -0,0 +1,5 @@
+import os
+
+# utils.config requires these at import time; the tests never connect.
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
+os.environ.setdefault("QDRANTDB_URL", "http://localhost:6333")
@@ -0,0 +1,21 @@
+import uuid
+import pytest
+from database.archive import ContentArchive, ArchiveLocked
+
+def test_append_and_read_back(tmp_path):
+    archive = ContentArchive(str(tmp_path))
+    doc_id = str(uuid.uuid4())
+    pointer = archive.append(doc_id, "https://a.com/", memoryview(b"<html>raw</html>"), {"title": "t"})
+    page = archive.read(pointer)
+    assert page["raw"] == b"<html>raw</html>"
+    assert page["extracted"] == {"title": "t"}
+    assert archive.latest_pointers() == {doc_id: pointer}
+    archive.close()
+
+def test_second_writer_is_refused_until_the_first_closes(tmp_path):
+    archive = ContentArchive(str(tmp_path))
+    with pytest.raises(ArchiveLocked):
+        ContentArchive(str(tmp_path))
+    ContentArchive(str(tmp_path), read_only=True).close()
+    archive.close()
+    ContentArchive(str(tmp_path)).close()
@@ -0,0 +1,90 @@
+import gzip
+import zlib
+import hashlib
+import pytest
+from crawler.body import Body, BodyTooLarge, BufferPool, ContentDecodingError
+
+PAGE = b"<html><body>" + b"hello world " * 500 + b"</body></html>"
+
+def feed_all(body, data, chunk_size=1024):
+    for start in range(0, len(data), chunk_size):
+        body.feed(data[start:start + chunk_size])
+    return body.finish()
+
+@pytest.mark.parametrize("encoding, data", [
+    (None, PAGE),
+    ("gzip", gzip.compress(PAGE)),
+    ("deflate", zlib.compress(PAGE)),
+    # Raw deflate without the zlib header, as some servers send it.
+    ("deflate", zlib.compress(PAGE)[2:-4]),
+])
+def test_body_decodes_and_hashes(encoding, data):
+    with Body(BufferPool(), encoding) as body:
+        assert bytes(feed_all(body, data)) == PAGE
+        assert body.content_hash == hashlib.sha256(PAGE).hexdigest()
+        assert body.wire_bytes == len(data)
+
+def test_gzip_bomb_stops_at_limit():
+    limit = 64 * 1024
+    bomb = gzip.compress(b"\0" * (64 * 1024 * 1024))
+    assert len(bomb) < limit
+    body = Body(BufferPool(initial_bytes=1024), "gzip", limit=limit)
+    with pytest.raises(BodyTooLarge):
+        feed_all(body, bomb, chunk_size=len(bomb))
+    # Inflating stopped one byte past the limit instead of expanding it all.
+    assert body.size <= limit
+    assert len(body.buffer) <= limit + 1
+    body.release()
+
+def test_body_at_limit_is_accepted():
+    body = Body(BufferPool(), "gzip", limit=len(PAGE))
+    assert bytes(feed_all(body, gzip.compress(PAGE))) == PAGE
+    body.release()
+
+def test_wire_bytes_over_limit_are_refused():
+    body = Body(BufferPool(), limit=100)
+    with pytest.raises(BodyTooLarge):
+        body.feed(b"x" * 101)
+    body.release()
+
+def test_unsupported_or_corrupt_encoding():
+    with pytest.raises(ContentDecodingError):
+        Body(BufferPool(), "br")
+    body = Body(BufferPool(), "gzip")
+    with pytest.raises(ContentDecodingError):
+        body.feed(b"not gzip at all")
+    body.release()
+
+def test_released_buffer_returns_to_pool():
+    pool = BufferPool(size=2, initial_bytes=1024, keep_bytes=1024 * 1024)
+    body = Body(pool)
+    buffer = body.buffer
+    feed_all(body, PAGE)
+    body.release()
+    assert pool.free == [buffer]
+    assert Body(pool).buffer is buffer
+
+def test_buffer_with_live_memoryview_is_not_pooled():
+    pool = BufferPool(size=2, initial_bytes=1024, keep_bytes=1024 * 1024)
+    body = Body(pool)
+    view = feed_all(body, PAGE)
+    # A slice taken by a scrape that outlived its crawl keeps the buffer alive.
+    still_used = view[:10]
+    body.release()
+    assert pool.free == []
+    assert bytes(still_used) == PAGE[:10]
+
+    exported = bytearray(16)
+    held = memoryview(exported)
+    pool.release(exported)
+    assert pool.free == []
+    held.release()
+    pool.release(exported)
+    assert pool.free == [exported]
+
+def test_oversized_buffer_is_dropped():
+    pool = BufferPool(size=2, initial_bytes=16, keep_bytes=1024)
+    body = Body(pool)
+    feed_all(body, PAGE)
+    body.release()
+    assert pool.free == []
@@ -0,0 +1,23 @@
+import pytest
+from tools.compare_extractors import CASES, LXML_DIVERGENT_CASES, fuzz_cases, mismatched_fields
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_stream_matches_bs4(name):
+    assert mismatched_fields(CASES[name], "stream") == {}
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_lxml_matches_bs4(name):
+    pytest.importorskip("lxml")
+    if name in LXML_DIVERGENT_CASES:
+        pytest.xfail(LXML_DIVERGENT_CASES[name])
+    assert mismatched_fields(CASES[name], "lxml") == {}
+
+@pytest.mark.parametrize("name", sorted(LXML_DIVERGENT_CASES))
+def test_lxml_divergent_cases_still_diverge(name):
+    # Keeps the documented list honest if lxml or the extractor changes.
+    pytest.importorskip("lxml")
+    assert mismatched_fields(CASES[name], "lxml") != {}
+
+def test_stream_matches_bs4_on_malformed_markup():
+    mismatches = {name: fields for name, html_content in fuzz_cases(2000) if (fields := mismatched_fields(html_content, "stream"))}
+    assert mismatches == {}
@@ -0,0 +1,113 @@
+import os
+import json
+import crawler.queue
+from crawler.frontier import FrontierStore, SegmentLog, encode_url, decode_url, encode_varint
+from crawler.queue import URLQueueManager
+from utils.config import QUEUE_PRIORITIES
+
+def urls(prefix, count):
+    return [f"https://{prefix}.example.com/{i}" for i in range(count)]
+
+def test_url_encoding_round_trip():
+    for url in ["http://a.com/", "https://b.com/x?y=1", "ftp://c.com/", "https://ü.example/ä"]:
+        assert decode_url(encode_url(url)) == url
+
+def test_checkpoint_restores_cursor_and_pending(tmp_path):
+    directory = str(tmp_path / "frontier")
+    store = FrontierStore(directory, QUEUE_PRIORITIES)
+    for url in urls("high", 10):
+        store.append("high", url)
+    assert store.read("high", 4) == urls("high", 10)[:4]
+    store.checkpoint({"high": ["https://in-flight.example.com/"], "medium": [], "low": []})
+    # Appended after the checkpoint and never flushed by it: a crash must
+    # still replay them as long as they reached the file.
+    for url in urls("late", 3):
+        store.append("high", url)
+    store.logs["high"].flush()
+
+    restored = FrontierStore(directory, QUEUE_PRIORITIES)
+    pending = restored.load()
+    assert pending["high"] == ["https://in-flight.example.com/"]
+    assert restored.unread("high") == 9
+    assert restored.read("high", 100) == urls("high", 10)[4:] + urls("late", 3)
+
+def test_missing_or_corrupt_state_replays_segments_from_the_start(tmp_path):
+    directory = str(tmp_path / "frontier")
+    store = FrontierStore(directory, QUEUE_PRIORITIES)
+    for url in urls("a", 5):
+        store.append("low", url)
+    store.read("low", 2)
+    store.checkpoint({p: [] for p in QUEUE_PRIORITIES})
+    store.close()
+
+    with open(os.path.join(directory, "state.json"), "w", encoding="utf-8") as f:
+        f.write('{"cursors": ')
+    restored = FrontierStore(directory, QUEUE_PRIORITIES)
+    assert restored.load() == {p: [] for p in QUEUE_PRIORITIES}
+    assert restored.read("low", 100) == urls("a", 5)
+    restored.close()
+
+    os.remove(os.path.join(directory, "state.json"))
+    restored = FrontierStore(directory, QUEUE_PRIORITIES)
+    restored.load()
+    assert restored.read("low", 100) == urls("a", 5)
+
+def test_torn_record_at_segment_tail_is_skipped(tmp_path):
+    directory = str(tmp_path / "log")
+    segment_log = SegmentLog(directory)
+    for url in urls("a", 3):
+        segment_log.append(url)
+    segment_log.close()
+    path = os.path.join(directory, "00000000.seg")
+    with open(path, "rb") as f:
+        whole = f.read()
+    # A crash in the middle of a record: a length prefix cut inside its
+    # varint, or a payload cut short.
+    for torn_tail in [encode_varint(300)[:1], encode_varint(40) + b"https-cut"]:
+        with open(path, "wb") as f:
+            f.write(whole + torn_tail)
+
+        reopened = SegmentLog(directory)
+        assert reopened.count_unread() == 3
+        reopened.append("https://after.example.com/")
+        assert reopened.read(100) == urls("a", 3) + ["https://after.example.com/"]
+        reopened.close()
+        os.remove(os.path.join(directory, "00000001.seg"))
+
+def test_segments_roll_and_compact_after_checkpoint(tmp_path):
+    directory = str(tmp_path / "frontier")
+    store = FrontierStore(directory, QUEUE_PRIORITIES)
+    store.logs["medium"] = SegmentLog(os.path.join(directory, "medium"), segment_bytes=64)
+    for url in urls("m", 20):
+        store.append("medium", url)
+    segment_dir = os.path.join(directory, "medium")
+    assert len(os.listdir(segment_dir)) > 3
+    assert store.read("medium", 15) == urls("m", 20)[:15]
+    store.checkpoint({p: [] for p in QUEUE_PRIORITIES})
+    with open(os.path.join(directory, "state.json"), encoding="utf-8") as f:
+        read_seq, _ = json.load(f)["cursors"]["medium"]
+    assert min(int(name[:-4]) for name in os.listdir(segment_dir)) == read_seq
+    store.close()
+
+    restored = FrontierStore(directory, QUEUE_PRIORITIES)
+    restored.load()
+    assert restored.unread("medium") == 5
+    assert restored.read("medium", 100) == urls("m", 20)[15:]
+
+def test_queue_forgets_deadlines_of_idle_domains(monkeypatch):
+    monkeypatch.setattr(crawler.queue, "DOMAIN_CRAWL_DELAY", 0)
+    queue_manager = URLQueueManager()
+    for url in urls("a", 2) + urls("b", 1):
+        queue_manager.add_url(url)
+    popped = {queue_manager.get_next_url() for _ in range(3)}
+    assert popped == set(urls("a", 2) + urls("b", 1))
+    assert queue_manager.get_next_url() is None
+    assert queue_manager.domain_next_allowed == {}
+
+    monkeypatch.setattr(crawler.queue, "DOMAIN_CRAWL_DELAY", 60)
+    queue_manager.add_url("https://c.example.com/1")
+    queue_manager.add_url("https://c.example.com/2", priority="low")
+    queue_manager.get_next_url()
+    assert queue_manager.get_next_url() is None
+    # Still queued at another priority and inside its delay: kept.
+    assert "c.example.com" in queue_manager.domain_next_allowed
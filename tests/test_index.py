@@ -0,0 +1,134 @@
+import math
+import random
+from bisect import bisect_left
+import pytest
+from index.postings import BLOCK_SIZE, encode_postings, decode_all, PostingCursor
+from index.inverted import InvertedIndex, ShardedIndex, tokenize
+from utils.config import BM25_K1, BM25_B
+
+VOCABULARY = [f"w{i}" for i in range(40)]
+
+def random_documents(count, seed=7):
+    rng = random.Random(seed)
+    return {f"doc{i}": " ".join(rng.choices(VOCABULARY, k=rng.randint(1, 60))) for i in range(count)}
+
+def exhaustive_bm25(documents, query):
+    tokenized = {key: tokenize(text) for key, text in documents.items()}
+    avgdl = sum(len(tokens) for tokens in tokenized.values()) / len(tokenized)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(term in tokens for tokens in tokenized.values())
+        if not df:
+            continue
+        idf = math.log(1 + (len(tokenized) - df + 0.5) / (df + 0.5))
+        for key, tokens in tokenized.items():
+            tf = tokens.count(term)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avgdl)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+def flush(index, documents, removed=()):
+    index._flush(*InvertedIndex._build_postings(documents), removed)
+
+@pytest.fixture
+def index(tmp_path):
+    index = InvertedIndex(str(tmp_path / "index"))
+    yield index
+    index.close()
+
+def test_postings_round_trip_across_blocks():
+    rng = random.Random(1)
+    doc_ids = sorted(rng.sample(range(100_000), 3 * BLOCK_SIZE + 17))
+    term_freqs = [rng.randint(1, 300) for _ in doc_ids]
+    buf = b"junk" + encode_postings(doc_ids, term_freqs)
+    assert decode_all(buf, 4) == (doc_ids, term_freqs)
+
+    for target in [0, doc_ids[BLOCK_SIZE], doc_ids[BLOCK_SIZE] + 1, doc_ids[-1], doc_ids[-1] + 1] + rng.sample(range(100_000), 50):
+        cursor = PostingCursor(buf, 4)
+        cursor.advance(target)
+        i = bisect_left(doc_ids, target)
+        assert cursor.doc == (doc_ids[i] if i < len(doc_ids) else None)
+        if cursor.doc is not None:
+            assert cursor.tf == term_freqs[i]
+
+@pytest.mark.parametrize("query", ["w1", "w2 w3", "w0 w5 w9 w13", "w7 w7 w30 missing"])
+def test_wand_top_k_matches_exhaustive_bm25(index, query):
+    documents = random_documents(600)
+    keys = list(documents)
+    for start in range(0, len(keys), 150):
+        flush(index, {key: documents[key] for key in keys[start:start + 150]})
+
+    expected = exhaustive_bm25(documents, query)
+    hits = index.search(query, k=10)
+    assert len(hits) == min(10, len(expected))
+    assert [score for _, score in hits] == pytest.approx(sorted(expected.values(), reverse=True)[:10])
+    for doc_key, score in hits:
+        assert score == pytest.approx(expected[doc_key])
+
+def test_merge_keeps_only_the_latest_version(index, tmp_path):
+    flush(index, {"a": "alpha old", "b": "beta"})
+    flush(index, {"a": "alpha new", "c": "gamma"})
+    index._merge(list(index.segments))
+
+    assert len(index.segments) == 1
+    assert len(index) == 3
+    assert index.search("old") == []
+    assert [key for key, _ in index.search("new")] == ["a"]
+
+    reader = InvertedIndex(str(tmp_path / "index"), writable=False)
+    assert len(reader) == 3
+    assert reader.search("old") == []
+    assert reader.live_length_total == index.live_length_total
+
+def test_removed_document_stays_removed_after_reopen(index, tmp_path):
+    flush(index, {"a": "shared alpha", "b": "shared beta"})
+    flush(index, {}, removed=["a"])
+    assert [key for key, _ in index.search("shared")] == ["b"]
+
+    reader = InvertedIndex(str(tmp_path / "index"), writable=False)
+    assert [key for key, _ in reader.search("shared")] == ["b"]
+
+    flush(index, {"a": "shared again"})
+    reader.manifest_mtime = None
+    assert sorted(key for key, _ in reader.search("shared")) == ["a", "b"]
+
+def test_merge_drops_tombstones_of_merged_away_documents(index):
+    flush(index, {"a": "alpha", "b": "beta"})
+    flush(index, {}, removed=["a"])
+    assert index.deleted == {"a": 1}
+    flush(index, {"c": "gamma"})
+    index._merge(list(index.segments))
+    assert index.deleted == {}
+    assert sorted(index.live) == ["b", "c"]
+
+def test_sharded_search_scores_like_one_index(tmp_path):
+    documents = random_documents(300, seed=11)
+    whole = InvertedIndex(str(tmp_path / "whole"))
+    shards = [InvertedIndex(str(tmp_path / f"index.shard{i}")) for i in range(3)]
+    try:
+        flush(whole, documents)
+        for i, shard in enumerate(shards):
+            flush(shard, {key: text for n, (key, text) in enumerate(documents.items()) if n % 3 == i})
+        for query in ["w4", "w8 w21", "w1 w2 w3"]:
+            expected = whole.search(query, k=15)
+            hits = ShardedIndex(shards).search(query, k=15)
+            assert [score for _, score in hits] == pytest.approx([score for _, score in expected])
+    finally:
+        for index in [whole] + shards:
+            index.close()
+
+def test_read_only_index_needs_an_existing_directory(tmp_path):
+    path = tmp_path / "missing"
+    with pytest.raises(FileNotFoundError):
+        InvertedIndex(str(path), writable=False)
+    assert not path.exists()
+
+def test_removal_queued_after_an_addition_wins(tmp_path):
+    index = InvertedIndex(str(tmp_path / "index"))
+    index.add_document("a", "alpha")
+    index.add_document("b", "alpha beta")
+    index.remove_document("a")
+    index.close()
+    assert sorted(index.live) == ["b"]
+    assert index.deleted == {"a": 0}
@@ -0,0 +1,117 @@
+from email.utils import format_datetime
+from datetime import datetime, timezone
+import pytest
+from crawler.politeness import (
+    DomainRateController,
+    classify_response,
+    parse_retry_after,
+    POLITENESS_BACKOFF_BASE,
+    POLITENESS_DECREASE_FACTOR,
+    POLITENESS_INCREASE_AFTER,
+    POLITENESS_MAX_RETRIES,
+    POLITENESS_MIN_DELAY,
+    POLITENESS_RATE_STEP,
+    DOMAIN_CRAWL_DELAY
+)
+
+NOW = 1_700_000_000.0
+
+class CrawlDelays:
+    def __init__(self, delays):
+        self.delays = delays
+
+    def get_crawl_delay(self, domain):
+        return self.delays.get(domain)
+
+def respond(controller, domain, outcome, count=1, latency_ms=50.0, retry_after=None, url="https://a.com/"):
+    result = None
+    for _ in range(count):
+        controller.acquire(domain, NOW)
+        result = controller.release(domain, url, outcome, latency_ms, retry_after, now=NOW)
+    return result
+
+@pytest.mark.parametrize("value, expected", [
+    ("120", 120.0),
+    (" 0 ", 0.0),
+    (format_datetime(datetime.fromtimestamp(NOW + 90, timezone.utc), usegmt=True), 90.0),
+    (format_datetime(datetime.fromtimestamp(NOW - 90, timezone.utc), usegmt=True), 0.0),
+    ("", None),
+    (None, None),
+    ("-5", None),
+    ("soon", None),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value, now=NOW) == expected
+
+@pytest.mark.parametrize("status, failed, fetched, expected", [
+    (429, False, True, "throttled"),
+    (503, False, True, "throttled"),
+    (500, False, True, "error"),
+    (None, True, False, "error"),
+    (404, False, True, "ok"),
+    (None, False, False, "skipped"),
+])
+def test_classify_response(status, failed, fetched, expected):
+    assert classify_response(status, failed, fetched) == expected
+
+def test_healthy_domain_speeds_up_additively_to_the_minimum_delay():
+    controller = DomainRateController()
+    initial_rate = 1.0 / DOMAIN_CRAWL_DELAY
+    assert controller.interval("a.com") == pytest.approx(DOMAIN_CRAWL_DELAY)
+
+    # Fast responses leave the rate as the binding limit.
+    respond(controller, "a.com", "ok", POLITENESS_INCREASE_AFTER, latency_ms=1.0)
+    assert controller.stats("a.com")["delay"] == pytest.approx(1.0 / (initial_rate + POLITENESS_RATE_STEP))
+
+    respond(controller, "a.com", "ok", 10_000, latency_ms=1.0)
+    assert controller.interval("a.com") == pytest.approx(POLITENESS_MIN_DELAY)
+
+def test_robots_crawl_delay_caps_rate_and_concurrency():
+    controller = DomainRateController(CrawlDelays({"a.com": 10}))
+    respond(controller, "a.com", "ok", 1_000, latency_ms=1.0)
+    assert controller.interval("a.com") == pytest.approx(10)
+    assert controller.stats("a.com")["concurrency"] == 1
+
+def test_slow_responses_add_concurrency_before_rate():
+    controller = DomainRateController()
+    controller._state("a.com").rate = 1.0
+    # One fetch at a time cannot reach 1 request/s at 1.5 s per response.
+    respond(controller, "a.com", "ok", POLITENESS_INCREASE_AFTER, latency_ms=1500.0)
+    stats = controller.stats("a.com")
+    assert stats["concurrency"] == 2
+    assert stats["delay"] == pytest.approx(1.0)
+
+def test_throttle_cuts_multiplicatively_and_honours_retry_after():
+    controller = DomainRateController()
+    respond(controller, "a.com", "ok", POLITENESS_INCREASE_AFTER * 5, latency_ms=1.0)
+    before = controller.stats("a.com")["delay"]
+
+    backoff_until, retry_delay = respond(controller, "a.com", "throttled", retry_after=120.0)
+    assert controller.stats("a.com")["delay"] == pytest.approx(before / POLITENESS_DECREASE_FACTOR)
+    assert backoff_until == NOW + 120.0
+    assert controller.not_before("a.com") == NOW + 120.0
+    assert retry_delay == 120.0
+
+    # Responses to requests sent before the 429 do not cut again.
+    respond(controller, "a.com", "throttled", url="https://a.com/other")
+    assert controller.stats("a.com")["delay"] == pytest.approx(before / POLITENESS_DECREASE_FACTOR)
+
+def test_rate_never_drops_below_the_maximum_delay_floor():
+    controller = DomainRateController()
+    for i in range(100):
+        respond(controller, "a.com", "throttled", url=f"https://a.com/{i}", retry_after=0.0)
+        controller.domains["a.com"].backoff_until = 0.0
+    assert controller.stats("a.com")["delay"] == pytest.approx(1.0 / controller.min_rate)
+
+def test_errors_retry_with_exponential_delay_then_give_up():
+    controller = DomainRateController()
+    delays = [respond(controller, "a.com", "error")[1] for _ in range(POLITENESS_MAX_RETRIES + 1)]
+    assert delays == [POLITENESS_BACKOFF_BASE * 2 ** i for i in range(POLITENESS_MAX_RETRIES)] + [None]
+    assert controller.domains["a.com"].attempts == {}
+
+def test_single_error_does_not_pause_the_domain():
+    controller = DomainRateController()
+    backoff_until, _ = respond(controller, "a.com", "error")
+    assert backoff_until == 0.0
+    backoff_until, _ = respond(controller, "a.com", "error", url="https://a.com/2")
+    assert backoff_until > NOW
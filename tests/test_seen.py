@@ -0,0 +1,110 @@
+import pytest
+from crawler.bloom import BloomFilter, ScalableBloomFilter
+from crawler.frontier import FrontierStore
+from crawler.queue import URLQueueManager
+from crawler.seen import SeenURLFilter
+from crawler.utils import canonicalize_url
+from utils.config import QUEUE_PRIORITIES
+
+class StoredPages:
+    def __init__(self, urls):
+        self.urls = urls
+        self.since = []
+
+    def iter_urls(self, since=None):
+        self.since.append(since)
+        return iter(self.urls)
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTP://Example.COM", "http://example.com/"),
+    ("http://example.com:80/a", "http://example.com/a"),
+    ("https://example.com:443/a", "https://example.com/a"),
+    ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ("http://example.com/a?b=2&a=1&&", "http://example.com/a?a=1&b=2"),
+    ("http://example.com/a#section", "http://example.com/a"),
+    ("  http://example.com/Path  ", "http://example.com/Path"),
+    ("http://user:pw@example.com/", "http://user:pw@example.com/"),
+    ("http://[::1]:8080/", "http://[::1]:8080/"),
+    ("ftp://example.com/", None),
+    ("mailto:someone@example.com", None),
+    ("http:///no-host", None),
+    ("http://example.com:99999/", None),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+def test_canonical_forms_share_one_seen_entry():
+    seen = SeenURLFilter(snapshot_path="")
+    assert seen.add(canonicalize_url("http://Example.com:80/?b=1&a=2#top"))
+    assert not seen.add(canonicalize_url("http://example.com/?a=2&b=1"))
+
+def test_bloom_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(20_000, 0.01)
+    for i in range(20_000):
+        bloom.add_digest(ScalableBloomFilter._digest(f"http://example.com/{i}"))
+    false_positives = sum(bloom.contains_digest(ScalableBloomFilter._digest(f"http://other.com/{i}")) for i in range(20_000))
+    assert false_positives / 20_000 < 0.015
+
+def test_scalable_bloom_grows_without_false_negatives_or_excess_false_positives():
+    sbf = ScalableBloomFilter(1_000, 0.01)
+    urls = [f"http://example.com/{i}" for i in range(10_000)]
+    # add() reports a false positive as already seen.
+    rejected = sum(not sbf.add(url) for url in urls)
+    assert rejected / len(urls) < 0.01
+    assert len(sbf.filters) > 1
+    assert all(url in sbf for url in urls)
+    assert not any(sbf.add(url) for url in urls)
+    false_positives = sum(f"http://other.com/{i}" in sbf for i in range(20_000))
+    assert false_positives / 20_000 < 0.01
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "seen.bloom")
+    seen = SeenURLFilter(snapshot_path=path, capacity=100, error_rate=0.001)
+    urls = [f"http://example.com/{i}" for i in range(500)]
+    for url in urls:
+        seen.add(url)
+    snapshot = seen.snapshot()
+    seen.add("http://example.com/after-snapshot")
+    seen.save(snapshot)
+
+    stored = StoredPages(["http://Example.com/stored"])
+    restored = SeenURLFilter(snapshot_path=path)
+    restored.load_or_rebuild(stored)
+    assert stored.since[0] is not None
+    assert len(restored) == 501
+    assert all(url in restored for url in urls)
+    assert "http://example.com/stored" in restored
+    assert "http://example.com/after-snapshot" not in restored
+
+def test_snapshot_is_ignored_without_a_durable_frontier(tmp_path):
+    path = str(tmp_path / "seen.bloom")
+    seen = SeenURLFilter(snapshot_path=path)
+    seen.add("http://example.com/queued-but-lost")
+    seen.save(seen.snapshot())
+
+    stored = StoredPages(["http://example.com/stored"])
+    restored = SeenURLFilter(snapshot_path=path)
+    restored.load_or_rebuild(stored, use_snapshot=False)
+    assert stored.since == [None]
+    assert "http://example.com/queued-but-lost" not in restored
+    assert "http://example.com/stored" in restored
+
+def test_checkpoint_keeps_in_flight_urls_without_a_rate_controller(tmp_path):
+    directory = str(tmp_path / "frontier")
+    seen = SeenURLFilter(snapshot_path=str(tmp_path / "seen.bloom"))
+    store = FrontierStore(directory, QUEUE_PRIORITIES)
+    queue_manager = URLQueueManager(seen_filter=seen, store=store)
+    queue_manager.add_url("http://example.com/a", priority="high")
+    url = queue_manager.get_next_url()
+    assert url == "http://example.com/a"
+    queue_manager.checkpoint()
+    store.close()
+
+    pending = FrontierStore(directory, QUEUE_PRIORITIES).load()
+    assert url in pending["high"]
+
+    queue_manager.store = store = FrontierStore(directory, QUEUE_PRIORITIES)
+    queue_manager.complete(url, "ok")
+    queue_manager.checkpoint()
+    store.close()
+    assert url not in FrontierStore(directory, QUEUE_PRIORITIES).load()["high"]
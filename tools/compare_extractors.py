@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import random
+import argparse
+from crawler.scraper import scrape_page, scrape_page_soup
+
+BASE_URL = "https://example.vn/tin-tuc/bai-viet.html"
+
+CASES = {
+    "basic": b"""<html><head><title> Trang chu </title>
+<meta name="description" content="  Mo ta trang  "></head>
+<body><h1>Xin chao</h1><p>Noi dung <b>dam</b> va <i>nghieng</i>.</p>
+<a href="/a">A</a><a href="b.html#top">B</a><a href="https://other.vn/c?x=1">C</a></body></html>""",
+    "scripts_and_styles": b"""<html><head><style>body { color: red }</style>
+<script>var x = "<a href='/fake'>no</a>";</script></head>
+<body>visible<script>hidden()</script> text<style>.x{}</style> end</body></html>""",
+    "entities_and_comments": b"""<html><head><title>A &amp; B &#39;quoted&#39;</title></head>
+<body>caf&eacute;<!-- secret -->after&nbsp;comment &lt;tag&gt;</body></html>""",
+    "no_body": b"""<html><head><title>Only head</title></head></html>""",
+    "unclosed_tags": b"""<title>Unclosed<body><p>one<p>two<div>three<a href=four.html>four""",
+    "empty_href_and_schemes": b"""<body><a href="">self</a><a href>bare</a>
+<a href="mailto:x@y.vn">mail</a><a href="javascript:void(0)">js</a><a href="//cdn.vn/x">cdn</a><a>none</a></body>""",
+    "first_description_wins": b"""<head><meta name="description"><meta name="description" content="second"></head><body>x</body>""",
+    "vietnamese_utf8": """<html><head><meta charset="utf-8"><title>Tin tức mới nhất</title>
+<meta name="description" content="Cập nhật tin tức"></head><body><p>Đây là nội dung tiếng Việt.</p></body></html>""".encode("utf-8"),
+    "title_in_body": b"""<html><body><title>late title</title>text after</body></html>""",
+    "text_after_body": b"""<html><body>inside</body>outside</html>""",
+    "whitespace": b"""<body>\n\t  lots   of\n\n spaces\xc2\xa0here  </body>""",
+    "large_page": b"<html><head><title>big</title></head><body>" + b"<p>word " * 50000 + b"<a href='/end'>end</a></body></html>",
+    "nested_title": b"""<title>outer<title>inner</title>tail</title><body>text</body>""",
+    "end_tag_closes_title": b"""<div><title>t<b>x</div>after<body>b</body>""",
+    "stray_void_end_tag": b"""<body>one<br>two</br>three</br>four</body>""",
+    "nested_body": b"""<body><body>inner</body>outer</body>after""",
+    "cdata_and_doctype": b"""<body>a<!DOCTYPE html>b<![CDATA[c]]><template>hidden</template>d</body>""",
+}
+
+# lxml parses like a browser (libxml2): <title> is raw text up to </title>,
+# <body> is implied and open elements close automatically. bs4's html.parser
+# tree does none of that, so lxml differs on malformed markup like these.
+LXML_DIVERGENT_CASES = {
+    "unclosed_tags": "lxml reads everything after an unclosed <title> as the title",
+    "nested_title": "lxml reads '<title>inner' as title text",
+    "end_tag_closes_title": "lxml keeps the title open until </title>",
+    "nested_body": "lxml merges the second <body> into the first",
+    "stray_void_end_tag": "lxml drops a stray </br> without splitting the text around it",
+    "cdata_and_doctype": "lxml ignores CDATA sections and declarations inside <body>",
+}
+
+FUZZ_PIECES = (
+    "<html>", "</html>", "<head>", "</head>", "<title>", "</title>", "<TITLE>", "<body>", "</body>", "<p>", "</p>",
+    "<p/>", "<div>", "</div>", "<b>", "</b>", "<br>", "</br>", "<br/>", "<img src=x>", "</img>", "<a href='x.html'>",
+    "</a>", "<a href='y.html'/>", "<script>", "</script>", "<style>s</style>", "<template>", "</template>", "<rt>",
+    "</rt>", "<pre>", "</pre>", "<textarea>", "</textarea>", "<meta name='description' content='d'>",
+    "<!-- c -->", "<!DOCTYPE html>", "<![CDATA[cd]]>", "<?pi x?>", "&amp;", "&#39;", "&nbsp;", " ", "\n  ", "word", "other"
+)
+
+def fuzz_cases(count, seed=0):
+    # Tag soup from a fixed seed: the streaming extractor must build the same
+    # tree as bs4 even for markup no browser would agree on.
+    rng = random.Random(seed)
+    for index in range(count):
+        yield f"fuzz_{index}", "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(3, 25))).encode("utf-8")
+
+def normalize(result):
+    return {**result, "links": sorted(result["links"])}
+
+def mismatched_fields(html_content, backend, base_url=BASE_URL):
+    expected = normalize(scrape_page_soup(html_content, base_url))
+    actual = normalize(scrape_page(html_content, base_url, backend=backend))
+    return {field: (expected[field], actual[field]) for field in expected if expected[field] != actual[field]}
+
+def compare(name, html_content, backend, base_url=BASE_URL):
+    mismatches = mismatched_fields(html_content, backend, base_url)
+    for field, (expected, actual) in mismatches.items():
+        print(f"  [{name}] {field} differs:\n    bs4:    {expected!r:.300}\n    {backend}: {actual!r:.300}")
+    return not mismatches
+
+def load_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".html", ".htm")):
+                    with open(os.path.join(path, name), "rb") as f:
+                        yield name, f.read()
+        else:
+            with open(path, "rb") as f:
+                yield os.path.basename(path), f.read()
+
+def benchmark(html_content, backend, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        if backend == "bs4":
+            scrape_page_soup(html_content, BASE_URL)
+        else:
+            scrape_page(html_content, BASE_URL, backend=backend)
+    return (time.perf_counter() - started) / repeat * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Check streaming extractor output against the BeautifulSoup scrape_page")
+    parser.add_argument("paths", nargs="*", help="HTML files or directories to compare in addition to the built-in cases")
+    parser.add_argument("--backend", default="stream", help="Streaming backend to compare (stream or lxml)")
+    parser.add_argument("--fuzz", type=int, default=0, metavar="N", help="Also compare N generated malformed documents")
+    parser.add_argument("--benchmark", type=int, default=0, metavar="N", help="Also time N runs of the large page per backend")
+    args = parser.parse_args()
+
+    cases = list(CASES.items()) + list(load_files(args.paths)) + list(fuzz_cases(args.fuzz))
+    failed = [name for name, html_content in cases if not compare(name, html_content, args.backend)]
+    print(f"{len(cases) - len(failed)}/{len(cases)} cases match ({args.backend} vs bs4)")
+
+    if args.benchmark:
+        for backend in ("bs4", args.backend):
+            print(f"  {backend}: {benchmark(CASES['large_page'], backend, args.benchmark):.1f} ms/page")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
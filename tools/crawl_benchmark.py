@@ -0,0 +1,456 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import threading
+import functools
+import subprocess
+import contextlib
+import multiprocessing
+from tools.webgraph import serve_graph
+from utils.logger import ConsoleLogger
+
+# Every knob the crawler reads from utils.config is bound at import time, so
+# scenario settings are exported to the environment before crawler modules load.
+PLACEHOLDER_ENVIRONMENT = {
+    "MONGODB_URL": "mongodb://stand-in",
+    "QDRANTDB_URL": "http://stand-in"
+}
+BASE_ENVIRONMENT = {
+    "DOMAIN_CRAWL_DELAY": "0",
+    "POLITENESS_ADAPTIVE": "1",
+    "POLITENESS_MIN_DELAY": "0",
+    "POLITENESS_RATE_STEP": "1",
+    "QUEUE_FETCH_TIMEOUT": "1",
+    "CONNECT_TIMEOUT": "5",
+    "READ_TIMEOUT": "10",
+    "FRONTIER_DIR": "",
+    "INDEX_DIR": ""
+}
+
+SCENARIOS = {
+    "smoke": {
+        "hosts": 5, "workers": 8,
+        "graph": {"pages_per_host": 40, "fanout": 8, "page_kb": 8}
+    },
+    "default": {
+        "hosts": 50, "workers": 32,
+        "graph": {"pages_per_host": 200, "fanout": 15, "page_kb": 30}
+    },
+    "large-pages": {
+        "hosts": 20, "workers": 32,
+        "graph": {"pages_per_host": 100, "fanout": 10, "page_kb": 300}
+    },
+    "duplicates": {
+        "hosts": 20, "workers": 32,
+        "graph": {"pages_per_host": 200, "fanout": 12, "page_kb": 20, "duplicate_ratio": 0.5}
+    },
+    "hostile": {
+        "hosts": 40, "workers": 64,
+        "graph": {
+            "pages_per_host": 100, "fanout": 12, "page_kb": 20, "robots_ratio": 0.5,
+            "slow_host_ratio": 0.2, "slow_ms": 800, "error_host_ratio": 0.2, "error_rate": 0.3,
+            "broken_link_ratio": 0.05, "duplicate_ratio": 0.1
+        }
+    },
+    "throttled": {
+        "hosts": 10, "workers": 32, "env": {"POLITENESS_BACKOFF_BASE": "0.5"},
+        "graph": {"pages_per_host": 60, "fanout": 10, "page_kb": 20, "throttle_host_ratio": 0.5, "throttle_rps": 2}
+    },
+    "recrawl": {
+        "hosts": 10, "workers": 32, "duration": 40,
+        "env": {"RECRAWL_INITIAL_INTERVAL": "5", "RECRAWL_MIN_INTERVAL": "2", "RECRAWL_POLL_INTERVAL": "1"},
+        "graph": {"pages_per_host": 40, "fanout": 10, "page_kb": 20, "change_ratio": 0.2, "change_interval": 8, "validators": True, "gone_ratio": 0.05}
+    },
+    "compressed": {
+        "hosts": 20, "workers": 32,
+        "graph": {"pages_per_host": 100, "fanout": 10, "page_kb": 100, "gzip_ratio": 0.7, "bomb_ratio": 0.02}
+    },
+    "polite": {
+        "hosts": 30, "workers": 32, "env": {"DOMAIN_CRAWL_DELAY": "1"},
+        "graph": {"pages_per_host": 30, "fanout": 10, "page_kb": 20, "robots_ratio": 0.3}
+    }
+}
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, elapsed_ms):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(elapsed_ms)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(stage, (time.perf_counter() - started) * 1000)
+        return timed
+
+    def wrap_async(self, stage, func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.observe(stage, (time.perf_counter() - started) * 1000)
+        return timed
+
+    def report(self):
+        with self.lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values), 3),
+                "p50_ms": round(percentile(values, 0.5), 3),
+                "p90_ms": round(percentile(values, 0.9), 3),
+                "p99_ms": round(percentile(values, 0.99), 3)
+            }
+            for stage, values in sorted(samples.items()) if values
+        }
+
+class InFlight:
+    def __init__(self):
+        self.active = 0
+        self.completed = 0
+        self.lock = threading.Lock()
+
+    def wrap(self, func):
+        @functools.wraps(func)
+        def tracked(*args, **kwargs):
+            with self.lock:
+                self.active += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.active -= 1
+                    self.completed += 1
+        return tracked
+
+    def wrap_async(self, func):
+        @functools.wraps(func)
+        async def tracked(*args, **kwargs):
+            self.active += 1
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.active -= 1
+                self.completed += 1
+        return tracked
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def run_crawl(scenario, seeds, workdir, mode, timer, in_flight, max_pages, timeout, idle_seconds):
+    from crawler import crawler as crawler_module
+    from crawler import async_crawler as async_crawler_module
+    from crawler.crawler import Crawler
+    from crawler.async_crawler import AsyncCrawler
+    from crawler.queue import URLQueueManager
+    from crawler.politeness import DomainRateController
+    from crawler.recrawl import RecrawlScheduler
+    from crawler.seen import SeenURLFilter
+    from crawler.robot import RobotManager
+    from crawler.proxies import ProxyManager
+    from crawler.neardup import NearDuplicateIndex
+    from database.writer import WriteBehindBuffer
+    from database.archive import ContentArchive
+    from tools.standins import InMemoryMongoManager, InMemoryQdrantManager, HashingEmbedder
+    from utils.metrics import REGISTRY
+    from utils.config import POLITENESS_ADAPTIVE, RECRAWL_ENABLED, ARCHIVE_DIR
+
+    mongo_manager = InMemoryMongoManager(latency_ms=scenario.get("db_latency_ms", 0))
+    qdrant_manager = InMemoryQdrantManager(latency_ms=scenario.get("db_latency_ms", 0))
+    embedder = HashingEmbedder(latency_ms=scenario.get("embed_latency_ms", 0))
+    proxy_file = os.path.join(workdir, "proxies.txt")
+    open(proxy_file, "w").close()
+    proxy_manager = ProxyManager(proxy_file_path=proxy_file)
+    robot_manager = RobotManager(cache_path=os.path.join(workdir, "robots_cache.json"))
+    seen_filter = SeenURLFilter(snapshot_path=os.path.join(workdir, "seen_urls.bloom"))
+    rate_controller = DomainRateController(robot_manager) if POLITENESS_ADAPTIVE else None
+    queue_manager = URLQueueManager(seen_filter=seen_filter, robot_manager=robot_manager, rate_controller=rate_controller)
+    near_dup_index = NearDuplicateIndex(snapshot_path=os.path.join(workdir, "near_dup.idx"))
+    writer = WriteBehindBuffer(mongo_manager, qdrant_manager, on_discard=near_dup_index.remove_many)
+    recrawl_scheduler = RecrawlScheduler(mongo_manager, queue_manager) if RECRAWL_ENABLED else None
+    archive = ContentArchive(os.path.join(workdir, "archive")) if ARCHIVE_DIR else None
+
+    mongo_manager.insert_metadata_many = timer.wrap("db_write", mongo_manager.insert_metadata_many)
+    qdrant_manager.upsert_vectors = timer.wrap("vector_write", qdrant_manager.upsert_vectors)
+    robot_manager.can_fetch = timer.wrap("robots", robot_manager.can_fetch)
+    embedder.embed = timer.wrap("embed", embedder.embed)
+    if archive:
+        archive.append = timer.wrap("archive", archive.append)
+
+    crawler_instance = Crawler(
+        queue_manager=queue_manager,
+        mongo_manager=mongo_manager,
+        qdrant_manager=qdrant_manager,
+        robot_manager=robot_manager,
+        proxy_manager=proxy_manager,
+        embedder=embedder,
+        writer=writer,
+        near_dup_index=near_dup_index,
+        recrawl_scheduler=recrawl_scheduler,
+        archive=archive
+    )
+    crawler_instance.check_url = timer.wrap("check", crawler_instance.check_url)
+    crawler_instance.store_page = timer.wrap("store", crawler_instance.store_page)
+    crawler_module.scrape_page = timer.wrap("scrape", crawler_module.scrape_page)
+    if not scenario["env"].get("ASYNC_SCRAPE_PROCESSES"):
+        async_crawler_module.scrape_page = timer.wrap("scrape", async_crawler_module.scrape_page)
+
+    for url in seeds:
+        queue_manager.add_url(url, priority="high")
+    if recrawl_scheduler:
+        recrawl_scheduler.start()
+
+    stop_event = threading.Event()
+    def finished():
+        if max_pages and in_flight.completed >= max_pages:
+            return True
+        return queue_manager.pending_count() == 0 and in_flight.active == 0
+
+    # Revisit scenarios never drain, so they run for a fixed time instead.
+    duration = scenario.get("duration", 0)
+
+    def watch(started):
+        idle_since = None
+        while not stop_event.is_set():
+            now = time.perf_counter()
+            if now - started > timeout:
+                return "timeout", now
+            if duration:
+                if now - started >= duration:
+                    return "duration", now
+                time.sleep(0.05)
+                continue
+            if finished():
+                idle_since = idle_since or now
+                if max_pages and in_flight.completed >= max_pages:
+                    return "max-pages", now
+                if now - idle_since >= idle_seconds:
+                    return "drained", idle_since
+            else:
+                idle_since = None
+            time.sleep(0.05)
+        return "stopped", time.perf_counter()
+
+    started = time.perf_counter()
+    cpu_started = cpu_seconds()
+    if mode == "async":
+        async_crawler = AsyncCrawler(crawler_instance, concurrency=scenario["workers"])
+        async_crawler.crawl_url = in_flight.wrap_async(timer.wrap_async("crawl", async_crawler.crawl_url))
+        async_crawler._fetch = timer.wrap_async("fetch", async_crawler._fetch)
+
+        async def drive():
+            crawl_task = asyncio.create_task(async_crawler.run())
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, watch, started)
+            crawl_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await crawl_task
+            return result
+
+        outcome, ended = asyncio.run(drive())
+    else:
+        crawl_url = in_flight.wrap(timer.wrap("crawl", crawler_instance.crawl_url))
+
+        def worker():
+            while not stop_event.is_set():
+                url = queue_manager.get_next_url(timeout=0.2)
+                if url:
+                    crawl_url(url)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(scenario["workers"])]
+        for thread in threads:
+            thread.start()
+        outcome, ended = watch(started)
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=30)
+
+    elapsed = ended - started
+    if recrawl_scheduler:
+        recrawl_scheduler.close()
+    writer.close()
+    cpu_used = cpu_seconds() - cpu_started
+    queue_manager.close()
+    robot_manager.close()
+    archive_bytes = 0
+    if archive:
+        archive.close()
+        archive_bytes = sum(entry.stat().st_size for entry in os.scandir(archive.directory))
+    return {
+        "outcome": outcome,
+        "elapsed_s": round(elapsed, 3),
+        "cpu_s": round(cpu_used, 3),
+        "processed": in_flight.completed,
+        "stored": len(mongo_manager.documents),
+        "vectors": len(qdrant_manager),
+        "near_duplicates": near_dup_index.stats(),
+        "writer": {"written": writer.written, "updated": writer.updated, "duplicates": writer.duplicates, "failed": writer.failed},
+        "embed_calls": embedder.calls,
+        "payload_bytes": sum(len(json.dumps(payload)) for payload in qdrant_manager.payloads.values()),
+        "archive_bytes": archive_bytes,
+        "pending": queue_manager.pending_count(),
+        "outcomes": {
+            series["labels"]["outcome"]: series["value"]
+            for series in REGISTRY.snapshot().get("crawler_outcomes_total", {}).get("series", [])
+        },
+        "politeness": {
+            series["labels"]["event"]: series["value"]
+            for series in REGISTRY.snapshot().get("politeness_events_total", {}).get("series", [])
+        },
+        "recrawl": {
+            series["labels"]["result"]: series["value"]
+            for series in REGISTRY.snapshot().get("recrawl_checks_total", {}).get("series", [])
+        },
+        "body_buffers": {
+            series["labels"]["source"]: series["value"]
+            for series in REGISTRY.snapshot().get("crawler_body_buffers_total", {}).get("series", [])
+        }
+    }
+
+def run_scenario(name, scenario, mode, max_pages=0, timeout=600, idle_seconds=2, verbose=False):
+    for key, value in PLACEHOLDER_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+    os.environ.update({**BASE_ENVIRONMENT, **scenario["env"]})
+
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    server = context.Process(target=serve_graph, args=(scenario["hosts"], scenario["graph"], child_conn), daemon=True)
+    server.start()
+    graph = parent_conn.recv()
+
+    timer = StageTimer()
+    in_flight = InFlight()
+    with tempfile.TemporaryDirectory(prefix="crawl-bench-") as workdir:
+        log_path = os.path.join(workdir, "crawler.log")
+        with open(log_path, "w", encoding="utf-8", errors="replace") as log_file:
+            redirect = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(log_file)
+            with redirect:
+                crawl = run_crawl(scenario, graph["seeds"], workdir, mode, timer, in_flight, max_pages, timeout, idle_seconds)
+                ConsoleLogger().flush()
+        with open(log_path, "rb") as log_file:
+            log_lines = sum(1 for _ in log_file)
+
+    parent_conn.send("stop")
+    server_stats = parent_conn.recv()
+    server.join(timeout=10)
+
+    processed = max(1, crawl["processed"])
+    return {
+        "scenario": name,
+        "revision": git_revision(),
+        "mode": mode,
+        "workers": scenario["workers"],
+        "hosts": scenario["hosts"],
+        "graph": scenario["graph"],
+        "env": scenario["env"],
+        **crawl,
+        "pages_per_sec": round(crawl["processed"] / crawl["elapsed_s"], 2) if crawl["elapsed_s"] else 0.0,
+        "stored_per_sec": round(crawl["stored"] / crawl["elapsed_s"], 2) if crawl["elapsed_s"] else 0.0,
+        "cpu_ms_per_page": round(crawl["cpu_s"] * 1000 / processed, 3),
+        "cpu_ms_per_mb": round(crawl["cpu_s"] * 1000 / max(1, server_stats["bytes_sent"] / 1024**2), 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "log_lines": log_lines,
+        "server": server_stats,
+        "stages": timer.report()
+    }
+
+def print_report(result, baseline=None):
+    def delta(key, current, lower_is_better=False):
+        if not baseline or not baseline.get(key):
+            return ""
+        change = (current - baseline[key]) / baseline[key] * 100
+        better = change < 0 if lower_is_better else change > 0
+        return f" ({change:+.1f}% vs {baseline.get('revision') or 'baseline'}{'' if better or not change else ' !'})"
+
+    print(f"\nScenario {result['scenario']} @ {result['revision']} | mode={result['mode']} workers={result['workers']} hosts={result['hosts']}")
+    print(f"  outcome {result['outcome']} after {result['elapsed_s']}s | processed {result['processed']} | stored {result['stored']} | pending {result['pending']}")
+    print(f"  pages/sec      {result['pages_per_sec']}{delta('pages_per_sec', result['pages_per_sec'])}")
+    print(f"  cpu ms/page    {result['cpu_ms_per_page']}{delta('cpu_ms_per_page', result['cpu_ms_per_page'], True)}")
+    print(f"  cpu ms/MB      {result['cpu_ms_per_mb']}{delta('cpu_ms_per_mb', result['cpu_ms_per_mb'], True)}")
+    print(f"  peak RSS MB    {result['peak_rss_mb']}{delta('peak_rss_mb', result['peak_rss_mb'], True)}")
+    print(f"  server         {result['server']}")
+    print(f"  outcomes       {result['outcomes']}")
+    print(f"  politeness     {result['politeness']}")
+    print(f"  recrawl        {result['recrawl']} | embed calls {result['embed_calls']}")
+    print(f"  body buffers   {result['body_buffers']}")
+    print(f"  near-dup       {result['near_duplicates']} | writer {result['writer']}")
+    print(f"  storage        vector payloads {result['payload_bytes'] / 1024**2:.1f}MB | archive {result['archive_bytes'] / 1024**2:.1f}MB")
+    print(f"  {'stage':<14}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}  (ms)")
+    for stage, summary in result["stages"].items():
+        print(f"  {stage:<14}{summary['count']:>8}{summary['mean_ms']:>10}{summary['p50_ms']:>10}{summary['p90_ms']:>10}{summary['p99_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a generated local web graph with in-process Mongo/Qdrant stand-ins")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="default")
+    parser.add_argument("--mode", choices=["threads", "async"], default="threads")
+    parser.add_argument("--workers", type=int, help="Worker threads (threads) or concurrent fetches (async)")
+    parser.add_argument("--hosts", type=int)
+    parser.add_argument("--pages-per-host", type=int)
+    parser.add_argument("--fanout", type=int)
+    parser.add_argument("--page-kb", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency-ms", type=float, default=0, help="Simulated cost of one embedding call")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="Simulated Mongo/Qdrant round-trip")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="Extra config override, repeatable")
+    parser.add_argument("--max-pages", type=int, default=0, help="Stop after this many crawl attempts (0 = drain the graph)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write the result as JSON for later comparison")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show crawler logs instead of discarding them")
+    args = parser.parse_args()
+
+    base = SCENARIOS[args.scenario]
+    scenario = {
+        "hosts": args.hosts or base["hosts"],
+        "workers": args.workers or base["workers"],
+        "graph": {**base["graph"], "seed": args.seed},
+        "env": {**base.get("env", {}), **dict(item.split("=", 1) for item in args.env)},
+        "duration": base.get("duration", 0),
+        "embed_latency_ms": args.embed_latency_ms,
+        "db_latency_ms": args.db_latency_ms
+    }
+    for option in ("pages_per_host", "fanout", "page_kb"):
+        if getattr(args, option):
+            scenario["graph"][option] = getattr(args, option)
+
+    result = run_scenario(args.scenario, scenario, args.mode, args.max_pages, args.timeout, verbose=args.verbose)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    sys.exit(0 if result["outcome"] in ("drained", "max-pages", "duration") else 1)
+
+if __name__ == "__main__":
+    main()
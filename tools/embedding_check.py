@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from crawler.utils import EMBEDDING_BACKENDS, get_embedding_model, generate_embeddings
+from crawler.embedding_cache import EmbeddingCache
+
+SAMPLE_TEXTS = [
+    "Tin tức mới nhất. Cập nhật tin tức trong nước và quốc tế 24 giờ qua",
+    "Giá vàng hôm nay tăng mạnh. Giá vàng SJC và vàng nhẫn cập nhật liên tục",
+    "Kết quả bóng đá Ngoại hạng Anh. Tỷ số, lịch thi đấu và bảng xếp hạng mới nhất",
+    "Hướng dẫn nấu phở bò Hà Nội. Công thức nấu phở bò ngon chuẩn vị tại nhà",
+    "Thời tiết Hà Nội ngày mai. Dự báo mưa rào và dông rải rác vào chiều tối",
+    "Tuyển sinh đại học năm nay. Điểm chuẩn các trường đại học top đầu",
+    "Đánh giá điện thoại mới. Camera, pin và hiệu năng sau một tuần sử dụng",
+    "Du lịch Đà Nẵng tự túc. Kinh nghiệm ăn ở, đi lại và điểm tham quan",
+    "Python asyncio tutorial. Writing concurrent network code with async and await",
+    "How to tune PostgreSQL for write-heavy workloads. Checkpoints, WAL and autovacuum",
+    "Breaking news: central bank holds interest rates steady amid inflation concerns",
+    "Best hiking trails in the Alps. A guide to routes, huts and seasons",
+    "Introduction to vector search. Approximate nearest neighbours with HNSW graphs",
+    "Recipe: classic French onion soup with caramelised onions and gruyère",
+    "Stock market today: technology shares lead gains as earnings beat forecasts",
+    "Machine learning model quantization reduces memory and speeds up CPU inference",
+]
+
+def load_texts(paths):
+    texts = list(SAMPLE_TEXTS)
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.extend(line.strip() for line in f if line.strip())
+    return list(dict.fromkeys(texts))
+
+def normalized(vectors):
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def neighbour_overlap(reference, candidate, k):
+    # Search quality depends on ranking, so compare each text's nearest
+    # neighbours under both backends, not just the raw vectors.
+    k = min(k, len(reference) - 1)
+    if k <= 0:
+        return 1.0
+    overlaps = []
+    for scores_ref, scores_cand in zip(reference @ reference.T, candidate @ candidate.T):
+        top_ref = set(np.argsort(-scores_ref)[1:k + 1])
+        top_cand = set(np.argsort(-scores_cand)[1:k + 1])
+        overlaps.append(len(top_ref & top_cand) / k)
+    return float(np.mean(overlaps))
+
+def timed_load(backend):
+    started = time.perf_counter()
+    get_embedding_model(backend)
+    return time.perf_counter() - started
+
+def time_encode(texts, backend, batch_size, repeat):
+    generate_embeddings(texts[:batch_size], backend=backend)
+    started = time.perf_counter()
+    encoded = 0
+    for _ in range(repeat):
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            generate_embeddings(batch, backend=backend)
+            encoded += len(batch)
+    return (time.perf_counter() - started) / encoded * 1000
+
+def time_import(module):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    return time.perf_counter() - started
+
+def time_cache(texts, vectors, repeat):
+    with tempfile.TemporaryDirectory(prefix="embedding-cache-") as workdir:
+        cache = EmbeddingCache(os.path.join(workdir, "cache.sqlite"))
+        started = time.perf_counter()
+        cache.put_many(zip(texts, vectors))
+        write_ms = (time.perf_counter() - started) / len(texts) * 1000
+        started = time.perf_counter()
+        for _ in range(repeat):
+            cache.get_many(texts)
+        read_ms = (time.perf_counter() - started) / (len(texts) * repeat) * 1000
+        cache.close()
+    return write_ms, read_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a faster embedding backend against the reference model and time both")
+    parser.add_argument("paths", nargs="*", help="Text files with one title/description per line, added to the built-in samples")
+    parser.add_argument("--backend", default="int8", choices=sorted(EMBEDDING_BACKENDS), help="Backend to check")
+    parser.add_argument("--reference", default="torch", choices=sorted(EMBEDDING_BACKENDS))
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Fail if any text falls below this similarity to the reference")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="Fail if mean top-k neighbour overlap falls below this")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the texts per backend")
+    args = parser.parse_args()
+
+    texts = load_texts(args.paths)
+    print(f"{len(texts)} texts | reference {args.reference} vs {args.backend}")
+    print(f"  import crawler.utils: {time_import('crawler.utils'):.2f}s (model not loaded)")
+
+    results = {}
+    for backend in dict.fromkeys((args.reference, args.backend)):
+        load_s = timed_load(backend)
+        per_text_ms = time_encode(texts, backend, args.batch_size, args.repeat)
+        results[backend] = normalized(generate_embeddings(texts, backend=backend))
+        print(f"  {backend:<8} load {load_s:.2f}s | {per_text_ms:.2f} ms/text at batch {args.batch_size}")
+
+    reference, candidate = results[args.reference], results[args.backend]
+    cosines = np.sum(reference * candidate, axis=1)
+    worst = int(np.argmin(cosines))
+    overlap = neighbour_overlap(reference, candidate, args.top_k)
+    print(f"  cosine to reference: mean {cosines.mean():.4f} min {cosines.min():.4f} ({texts[worst][:60]!r})")
+    print(f"  top-{args.top_k} neighbour overlap: {overlap:.3f}")
+
+    write_ms, read_ms = time_cache(texts, candidate, args.repeat)
+    print(f"  cache: {write_ms:.3f} ms/text to store, {read_ms:.3f} ms/text on a hit")
+
+    failed = cosines.min() < args.min_cosine or overlap < args.min_overlap
+    print("FAIL" if failed else "OK")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
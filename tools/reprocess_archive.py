@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import argparse
+from crawler.scraper import STREAM_BACKENDS, scrape_page
+from crawler.neardup import simhash
+from crawler.sharding import configured_shard_count, shard_paths
+from database.archive import ContentArchive, ArchiveLocked
+from utils.config import ARCHIVE_DIR, SCRAPER_BACKEND
+
+EXTRACTED_FIELDS = ("title", "description", "content")
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class Reprocessor:
+    def __init__(self, archive, scraper_backend, mongo_manager=None, qdrant_manager=None, reembed=False):
+        self.archive = archive
+        self.scraper_backend = scraper_backend
+        self.mongo_manager = mongo_manager
+        self.qdrant_manager = qdrant_manager
+        self.reembed = reembed
+        self.stats = {"pages": 0, "changed": 0, "embedded": 0, "written": 0, "missing": 0, "failed": 0}
+        self.timings = {"read": 0.0, "scrape": 0.0, "embed": 0.0, "write": 0.0}
+
+    def _timed(self, stage, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[stage] += time.perf_counter() - started
+
+    def _extract(self, doc_id, pointer):
+        page = self._timed("read", self.archive.read, pointer)
+        scraped = self._timed("scrape", scrape_page, page["raw"], page["url"], backend=self.scraper_backend)
+        extracted = {field: scraped[field] for field in EXTRACTED_FIELDS}
+        previous = page.get("extracted") or {}
+        return {
+            "doc_id": doc_id,
+            "pointer": pointer,
+            "page": page,
+            "extracted": extracted,
+            "changed": extracted != previous,
+            "embed": self.reembed or any(extracted[field] != previous.get(field) for field in ("title", "description"))
+        }
+
+    def process_batch(self, items):
+        results = []
+        for doc_id, pointer in items:
+            try:
+                results.append(self._extract(doc_id, pointer))
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"  {doc_id}: could not reprocess: {e}")
+        self.stats["pages"] += len(results)
+        self.stats["changed"] += sum(result["changed"] for result in results)
+        if self.mongo_manager is None:
+            return
+
+        # Archived pages whose metadata is gone (duplicates, rollbacks) must
+        # not come back as orphan vectors.
+        existing = self._timed("write", self.mongo_manager.get_metadata_many, [result["doc_id"] for result in results])
+        live = [result for result in results if result["doc_id"] in existing]
+        self.stats["missing"] += len(results) - len(live)
+        to_embed = [result for result in live if result["embed"]]
+        if to_embed:
+            from crawler.utils import generate_embeddings
+            texts = [f"{result['extracted']['title']}. {result['extracted']['description']}" for result in to_embed]
+            for result, vector in zip(to_embed, self._timed("embed", generate_embeddings, texts)):
+                result["vector"] = vector
+            self.stats["embedded"] += len(to_embed)
+        self._timed("write", self._write, [result for result in live if result["changed"] or "vector" in result])
+
+    def _write(self, results):
+        documents = []
+        points = []
+        for result in results:
+            pointer = result["pointer"]
+            if result["changed"]:
+                page = result["page"]
+                pointer = self.archive.append(result["doc_id"], page["url"], page["raw"], result["extracted"])
+            extracted = result["extracted"]
+            document = {"_id": result["doc_id"], "title": extracted["title"], "description": extracted["description"], "archive": pointer}
+            fingerprint = simhash(extracted["content"])
+            if fingerprint is not None:
+                document["simhash"] = f"{fingerprint:016x}"
+            documents.append(document)
+            if "vector" in result:
+                payload = {"url": result["page"]["url"], "title": extracted["title"], "archive": pointer}
+                points.append((result["doc_id"], result["vector"], payload))
+        if points and not self.qdrant_manager.upsert_vectors(points):
+            self.stats["failed"] += len(points)
+            failed_ids = {point_id for point_id, _, _ in points}
+            documents = [document for document in documents if document["_id"] not in failed_ids]
+        self.mongo_manager.update_metadata_many(documents)
+        self.stats["written"] += len(documents)
+
+def reprocess_directory(directory, args, mongo_manager, qdrant_manager):
+    try:
+        archive = ContentArchive(directory, read_only=not args.write)
+    except ArchiveLocked as e:
+        # A running crawler appends to the same segments; its pointers and
+        # ours would disagree about where each page starts.
+        print(f"{e}; stop the crawler before reprocessing with --write")
+        sys.exit(1)
+    pointers = list(archive.latest_pointers().items())
+    if args.limit:
+        pointers = pointers[:args.limit]
+    print(f"Reprocessing {len(pointers)} archived pages from {directory} ({'write' if args.write else 'dry run'})")
+
+    reprocessor = Reprocessor(archive, args.scraper_backend, mongo_manager, qdrant_manager, args.reembed)
+    try:
+        for batch in batches(pointers, args.batch_size):
+            reprocessor.process_batch(batch)
+    finally:
+        archive.close()
+    return reprocessor
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run extraction and embedding over archived pages without fetching them again")
+    parser.add_argument("--archive-dir", action="append", help="Archive to reprocess, repeatable (default: ARCHIVE_DIR, or every shard's archive when sharded)")
+    parser.add_argument("--scraper-backend", default=SCRAPER_BACKEND, choices=sorted([*STREAM_BACKENDS, "bs4"]))
+    parser.add_argument("--limit", type=int, default=0, help="Reprocess at most this many pages per archive (0 = all)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--write", action="store_true", help="Update Mongo, Qdrant and the archive; otherwise only report what would change")
+    parser.add_argument("--reembed", action="store_true", help="Embed every page again, e.g. after changing the embedding model")
+    args = parser.parse_args()
+
+    directories = args.archive_dir or [path for path in shard_paths(ARCHIVE_DIR, configured_shard_count()) if os.path.isdir(path)]
+    if not directories:
+        print(f"No archive found at {ARCHIVE_DIR}")
+        sys.exit(1)
+
+    mongo_manager = qdrant_manager = None
+    if args.write:
+        from database.mongodb import MongoDBManager
+        from database.qdrantdb import QdrantDBManager
+        mongo_manager = MongoDBManager()
+        qdrant_manager = QdrantDBManager()
+        if mongo_manager.metadata_collection is None or qdrant_manager.client is None:
+            print("Database connection failed")
+            sys.exit(1)
+
+    started = time.perf_counter()
+    reprocessors = [reprocess_directory(directory, args, mongo_manager, qdrant_manager) for directory in directories]
+    elapsed = time.perf_counter() - started
+
+    stats = {key: sum(r.stats[key] for r in reprocessors) for key in reprocessors[0].stats}
+    timings = {stage: sum(r.timings[stage] for r in reprocessors) for stage in reprocessors[0].timings}
+    pages = max(1, stats["pages"])
+    print(f"  {stats} in {elapsed:.1f}s ({stats['pages'] / elapsed if elapsed else 0:.1f} pages/s)")
+    print("  " + " | ".join(f"{stage} {seconds * 1000 / pages:.2f} ms/page" for stage, seconds in timings.items()))
+    sys.exit(1 if stats["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
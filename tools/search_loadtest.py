@@ -0,0 +1,122 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.request import urlopen
+from urllib.parse import urlencode
+from search.service import SearchService
+from search.server import serve
+from tools.standins import InMemoryMongoManager, InMemoryQdrantManager, HashingEmbedder
+from utils.config import SEARCH_P50_TARGET_MS, SEARCH_P99_TARGET_MS
+
+def build_corpus(mongo_manager, qdrant_manager, embedder, documents, vocabulary, rng):
+    batch = []
+    for i in range(documents):
+        title = " ".join(rng.choices(vocabulary, k=rng.randint(3, 8)))
+        description = " ".join(rng.choices(vocabulary, k=rng.randint(8, 20)))
+        doc_id = f"00000000-0000-4000-8000-{i:012d}"
+        batch.append((
+            mongo_manager.build_metadata_document(doc_id, f"https://site{i % 500}.vn/p/{i}", f"site{i % 500}.vn", str(i), title, description),
+            (doc_id, embedder.embed(f"{title}. {description}"), {"url": f"https://site{i % 500}.vn/p/{i}"})
+        ))
+        if len(batch) == 1000 or i == documents - 1:
+            inserted = mongo_manager.insert_metadata_many([document for document, _ in batch])
+            qdrant_manager.upsert_vectors([point for document, point in batch if document["_id"] in inserted])
+            batch = []
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_load(search, queries, weights, requests, concurrency, rng):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    plan = rng.choices(queries, weights=weights, k=requests)
+    cursor = iter(plan)
+
+    def worker():
+        while True:
+            with lock:
+                query = next(cursor, None)
+            if query is None:
+                return
+            started = time.perf_counter()
+            try:
+                search(query)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the search API against in-process stand-ins or a running server")
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct-queries", type=int, default=1000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of the query popularity distribution")
+    parser.add_argument("--embed-latency-ms", type=float, default=5, help="Simulated query-embedding cost")
+    parser.add_argument("--db-latency-ms", type=float, default=1, help="Simulated Mongo/Qdrant round-trip")
+    parser.add_argument("--http", action="store_true", help="Go through the HTTP API on a local port")
+    parser.add_argument("--url", help="Load-test an already running search API instead of stand-ins")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"tu{i}" for i in range(5000)]
+    queries = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 4))) for _ in range(args.distinct_queries)]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(queries))]
+
+    service = None
+    server = None
+    base_url = args.url
+    if not base_url:
+        mongo_manager = InMemoryMongoManager(latency_ms=args.db_latency_ms)
+        qdrant_manager = InMemoryQdrantManager(latency_ms=args.db_latency_ms)
+        embedder = HashingEmbedder()
+        build_corpus(mongo_manager, qdrant_manager, embedder, args.documents, vocabulary, rng)
+        embedder.latency = args.embed_latency_ms / 1000
+        service = SearchService(qdrant_manager, mongo_manager, embedder)
+        print(f"Indexed {len(qdrant_manager)} stand-in documents")
+        if args.http:
+            server = serve(service, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f"http://127.0.0.1:{server.server_port}"
+
+    if base_url:
+        def search(query):
+            with urlopen(f"{base_url}/search?{urlencode({'q': query})}", timeout=10) as response:
+                return json.load(response)
+    else:
+        search = service.search
+
+    latencies, errors, elapsed = run_load(search, queries, weights, args.requests, args.concurrency, rng)
+    p50 = percentile(latencies, 0.5)
+    p99 = percentile(latencies, 0.99)
+    print(f"{len(latencies)} requests in {elapsed:.2f}s ({len(latencies) / elapsed:.0f} req/s), {errors} errors")
+    print(f"p50 {p50:.2f}ms (target {SEARCH_P50_TARGET_MS}ms) | p99 {p99:.2f}ms (target {SEARCH_P99_TARGET_MS}ms)")
+    if service:
+        print(f"embedding cache {service.embedding_cache.stats()} | result cache {service.result_cache.stats()}")
+    if server:
+        server.shutdown()
+
+    sys.exit(0 if not errors and p50 <= SEARCH_P50_TARGET_MS and p99 <= SEARCH_P99_TARGET_MS else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import re
+import time
+import hashlib
+import threading
+from datetime import timedelta
+import numpy as np
+from database.mongodb import MongoDBManager, domain_hash
+from database.qdrantdb import QdrantDBManager
+from utils.config import VECTOR_SIZE
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+class InMemoryMongoManager(MongoDBManager):
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.documents = {}
+        self.urls = {}
+        self.lock = threading.Lock()
+        self.client = None
+        self.db = None
+        self.metadata_collection = self.documents
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def url_exists(self, url):
+        self._wait()
+        return url in self.urls
+
+    def hash_exists(self, content_hash):
+        self._wait()
+        with self.lock:
+            return any(document["content_hash"] == content_hash for document in self.documents.values())
+
+    def iter_urls(self, since=None):
+        with self.lock:
+            documents = list(self.documents.values())
+        for document in documents:
+            if since is None or document["crawled_at"] >= since:
+                yield document["url"]
+
+    def iter_fingerprints(self, since=None):
+        with self.lock:
+            documents = list(self.documents.values())
+        for document in documents:
+            if "simhash" in document and (since is None or document["crawled_at"] >= since):
+                yield document["_id"], int(document["simhash"], 16)
+
+    def get_metadata_many(self, doc_ids):
+        self._wait()
+        with self.lock:
+            return {str(doc_id): self.documents[str(doc_id)] for doc_id in doc_ids if str(doc_id) in self.documents}
+
+    def insert_metadata(self, doc_id, url, domain, content_hash, title, description):
+        document = self.build_metadata_document(doc_id, url, domain, content_hash, title, description)
+        return bool(self.insert_metadata_many([document]))
+
+    def insert_metadata_many(self, documents):
+        self._wait()
+        inserted_ids = set()
+        with self.lock:
+            for document in documents:
+                if document["_id"] in self.documents or document["url"] in self.urls:
+                    continue
+                self.documents[document["_id"]] = dict(document)
+                self.urls[document["url"]] = document["_id"]
+                inserted_ids.add(document["_id"])
+        return inserted_ids
+
+    def update_metadata_many(self, documents):
+        self._wait()
+        matched = 0
+        with self.lock:
+            for document in documents:
+                existing = self.documents.get(document["_id"])
+                if existing is not None:
+                    existing.update(document)
+                    matched += 1
+        return matched
+
+    def find_due_urls(self, now, limit, shard=None):
+        self._wait()
+        with self.lock:
+            due = [document for document in self.documents.values() if document.get("next_crawl_at") and document["next_crawl_at"] <= now]
+        if shard is not None:
+            shard_id, shard_count = shard
+            due = [document for document in due if document.get("domain_hash", -1) % shard_count == shard_id]
+        due.sort(key=lambda document: document["next_crawl_at"])
+        return [dict(document) for document in due[:limit]]
+
+    def claim_urls(self, doc_ids, now, until):
+        self._wait()
+        claimed = set()
+        with self.lock:
+            for doc_id in doc_ids:
+                document = self.documents.get(str(doc_id))
+                if document is not None and document.get("next_crawl_at") and document["next_crawl_at"] <= now:
+                    document["next_crawl_at"] = until
+                    claimed.add(str(doc_id))
+        return claimed
+
+    def hash_domains(self, batch_size=1000):
+        with self.lock:
+            missing = [document for document in self.documents.values() if "domain_hash" not in document]
+            for document in missing:
+                document["domain_hash"] = domain_hash(document.get("domain") or "")
+        return len(missing)
+
+    def schedule_unscheduled(self, interval_seconds):
+        with self.lock:
+            unscheduled = [document for document in self.documents.values() if "next_crawl_at" not in document]
+            for document in unscheduled:
+                document["next_crawl_at"] = document["crawled_at"] + timedelta(seconds=interval_seconds)
+        return len(unscheduled)
+
+    def delete_metadata_many(self, doc_ids):
+        self._wait()
+        deleted = 0
+        with self.lock:
+            for doc_id in doc_ids:
+                document = self.documents.pop(str(doc_id), None)
+                if document is not None:
+                    self.urls.pop(document["url"], None)
+                    deleted += 1
+        return deleted
+
+class InMemoryQdrantManager(QdrantDBManager):
+    def __init__(self, vector_size=VECTOR_SIZE, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.vector_size = vector_size
+        self.client = True
+        self.collection_name = "stand-in"
+        self.ids = []
+        self.index_of = {}
+        self.payloads = {}
+        self.matrix = np.zeros((1024, vector_size), dtype=np.float32)
+        self.lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def upsert_vector(self, point_id, vector, payload):
+        self.upsert_vectors([(point_id, vector, payload)])
+
+    def upsert_vectors(self, points, wait=True):
+        self._wait()
+        with self.lock:
+            for point_id, vector, payload in points:
+                point_id = str(point_id)
+                row = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(row)
+                if norm:
+                    row = row / norm
+                index = self.index_of.get(point_id)
+                if index is None:
+                    index = self.index_of[point_id] = len(self.ids)
+                    self.ids.append(point_id)
+                    if index >= len(self.matrix):
+                        self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+                self.matrix[index] = row
+                self.payloads[point_id] = payload
+        return True
+
+    def delete_vectors(self, point_ids):
+        self._wait()
+        with self.lock:
+            for point_id in point_ids:
+                point_id = str(point_id)
+                index = self.index_of.pop(point_id, None)
+                if index is None:
+                    continue
+                # Move the last row into the hole to keep the matrix dense.
+                last = len(self.ids) - 1
+                if index != last:
+                    moved = self.ids[last]
+                    self.ids[index] = moved
+                    self.index_of[moved] = index
+                    self.matrix[index] = self.matrix[last]
+                self.ids.pop()
+                self.payloads.pop(point_id, None)
+        return True
+
+    def search_vectors(self, vector, limit=10, offset=0):
+        self._wait()
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self.lock:
+            count = len(self.ids)
+            if not count:
+                return []
+            scores = self.matrix[:count] @ query
+            ids = list(self.ids)
+        wanted = min(count, limit + offset)
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])][offset:]
+        return [(ids[i], float(scores[i])) for i in top]
+
+    def __len__(self):
+        return len(self.ids)
+
+class HashingEmbedder:
+    def __init__(self, vector_size=VECTOR_SIZE, latency_ms=0):
+        self.vector_size = vector_size
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def embed(self, text):
+        if not text:
+            return []
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        vector = np.zeros(self.vector_size, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.vector_size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def stats(self):
+        return {"calls": self.calls}
+
+    def close(self):
+        pass
@@ -0,0 +1,260 @@
+import gzip
+import time
+import random
+import asyncio
+import hashlib
+from html import escape
+from email.utils import formatdate, parsedate_to_datetime
+
+ROBOTS_DISALLOWED_PREFIX = "/private/"
+TLS_HANDSHAKE = b"\x16"
+BOMB_BYTES = 64 * 1024 * 1024
+
+class WebGraph:
+    def __init__(self, ports, pages_per_host=100, fanout=10, page_kb=20, seed=42, external_link_ratio=0.3,
+                 robots_ratio=0.0, crawl_delay=0, slow_host_ratio=0.0, slow_ms=0, error_host_ratio=0.0,
+                 error_rate=0.0, broken_link_ratio=0.0, duplicate_ratio=0.0, throttle_host_ratio=0.0, throttle_rps=5,
+                 retry_after=1, change_ratio=0.0, change_interval=60, validators=False, gzip_ratio=0.0, bomb_ratio=0.0,
+                 gone_ratio=0.0, paragraphs=4000):
+        self.ports = list(ports)
+        self.pages_per_host = pages_per_host
+        self.fanout = fanout
+        self.page_bytes = page_kb * 1024
+        self.seed = seed
+        self.external_link_ratio = external_link_ratio
+        self.crawl_delay = crawl_delay
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.broken_link_ratio = broken_link_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.throttle_rps = throttle_rps
+        self.retry_after = retry_after
+        self.change_ratio = change_ratio
+        self.change_interval = change_interval
+        self.validators = validators
+        self.bomb_ratio = bomb_ratio
+        self.gone_ratio = gone_ratio
+        self.bomb = None
+        self.started = time.time()
+        self.request_windows = {}
+
+        rng = random.Random(seed)
+        self.vocabulary = ["".join(rng.choices("abcdefghiklmnopqrstuvxy", k=rng.randint(2, 9))) for _ in range(20000)]
+        self.paragraphs = [" ".join(rng.choices(self.vocabulary, k=rng.randint(30, 90))) for _ in range(paragraphs)]
+        hosts = range(len(self.ports))
+        self.robots_hosts = {h for h in hosts if rng.random() < robots_ratio}
+        self.slow_hosts = {h for h in hosts if rng.random() < slow_host_ratio}
+        self.error_hosts = {h for h in hosts if rng.random() < error_host_ratio}
+        self.throttle_hosts = {h for h in hosts if rng.random() < throttle_host_ratio}
+        self.gzip_hosts = {h for h in hosts if rng.random() < gzip_ratio}
+
+    def base_url(self, host):
+        return f"http://127.0.0.1:{self.ports[host]}"
+
+    def seeds(self):
+        return [f"{self.base_url(host)}/p/0.html" for host in range(len(self.ports))]
+
+    def _rng(self, host, page, salt=""):
+        digest = hashlib.blake2b(f"{self.seed}:{host}:{page}:{salt}".encode(), digest_size=8).digest()
+        return random.Random(int.from_bytes(digest, "little"))
+
+    def _link(self, rng, host):
+        if rng.random() < self.broken_link_ratio:
+            return f"{self.base_url(host)}/missing/{rng.randrange(10 ** 9)}.html"
+        if rng.random() < self.external_link_ratio:
+            host = rng.randrange(len(self.ports))
+        if host in self.robots_hosts and rng.random() < 0.1:
+            return f"{self.base_url(host)}{ROBOTS_DISALLOWED_PREFIX}{rng.randrange(self.pages_per_host)}.html"
+        return f"{self.base_url(host)}/p/{rng.randrange(self.pages_per_host)}.html"
+
+    def version(self, host, page, now):
+        if not self.change_ratio or self._rng(host, page, "change").random() >= self.change_ratio:
+            return 0
+        return int((now - self.started) // self.change_interval)
+
+    def _page(self, host, page, allow_duplicate=True, version=0):
+        rng = self._rng(host, page, version or "")
+        duplicate = rng.random() < self.duplicate_ratio
+        if duplicate and allow_duplicate and page > 0:
+            source_host, source_page = rng.randrange(len(self.ports)), rng.randrange(self.pages_per_host)
+            body = self._page(source_host, source_page, allow_duplicate=False)
+            if rng.random() < 0.5:
+                return body
+            return body.replace(b"</body>", f"<p>{rng.choice(self.vocabulary)}</p></body>".encode(), 1)
+
+        target = max(512, int(rng.lognormvariate(0, 0.5) * self.page_bytes))
+        title = " ".join(rng.choices(self.vocabulary, k=rng.randint(3, 8)))
+        description = " ".join(rng.choices(self.vocabulary, k=rng.randint(8, 20)))
+        parts = [
+            f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{escape(title)}</title>",
+            f"<meta name=\"description\" content=\"{escape(description)}\">",
+            "<style>body { font-family: sans-serif }</style></head><body>",
+            f"<h1>{escape(title)}</h1>"
+        ]
+        size = sum(len(part) for part in parts)
+        links = [self._link(rng, host) for _ in range(self.fanout)]
+        while size < target:
+            paragraph = f"<p>{rng.choice(self.paragraphs)}</p>"
+            if links and rng.random() < 0.3:
+                link = links.pop()
+                paragraph += f"<a href=\"{link}\">{rng.choice(self.vocabulary)}</a>"
+            parts.append(paragraph)
+            size += len(paragraph)
+        parts.extend(f"<a href=\"{link}\">{rng.choice(self.vocabulary)}</a>" for link in links)
+        parts.append("<script>var tracking = true;</script></body></html>")
+        return "".join(parts).encode("utf-8")
+
+    def _robots(self, host):
+        if host not in self.robots_hosts:
+            return 404, b"", "text/plain"
+        lines = ["User-agent: *", f"Disallow: {ROBOTS_DISALLOWED_PREFIX}"]
+        if self.crawl_delay:
+            lines.append(f"Crawl-delay: {self.crawl_delay}")
+        return 200, "\n".join(lines).encode(), "text/plain"
+
+    def respond(self, host, path, request_headers=None):
+        if path == "/robots.txt":
+            return (*self._robots(host), {})
+        if not path.startswith(("/p/", ROBOTS_DISALLOWED_PREFIX)) or not path.endswith(".html"):
+            return 404, b"not found", "text/plain", {}
+        try:
+            page = int(path.rsplit("/", 1)[1][:-5])
+        except ValueError:
+            return 404, b"not found", "text/plain", {}
+        if page >= self.pages_per_host:
+            return 404, b"not found", "text/plain", {}
+        if self.gone_ratio and page > 0 and time.time() - self.started > self.change_interval \
+                and self._rng(host, page, "gone").random() < self.gone_ratio:
+            return 410, b"gone", "text/plain", {}
+        if host in self.error_hosts and self._rng(host, page, "error").random() < self.error_rate:
+            return 500, b"internal error", "text/plain", {}
+        request_headers = request_headers or {}
+        version = self.version(host, page, time.time())
+        if not self.validators:
+            body, headers = self._encode(host, page, self._page(host, page, version=version), {}, request_headers)
+            return 200, body, "text/html; charset=utf-8", headers
+
+        etag = '"' + hashlib.blake2b(f"{host}:{page}:{version}".encode(), digest_size=8).hexdigest() + '"'
+        modified_at = int(self.started + version * self.change_interval)
+        headers = {"ETag": etag, "Last-Modified": formatdate(modified_at, usegmt=True)}
+        if "if-none-match" in request_headers:
+            not_modified = request_headers["if-none-match"] == etag
+        else:
+            try:
+                not_modified = parsedate_to_datetime(request_headers["if-modified-since"]).timestamp() >= modified_at
+            except (KeyError, TypeError, ValueError, IndexError):
+                not_modified = False
+        if not_modified:
+            return 304, b"", "text/html; charset=utf-8", headers
+        body, headers = self._encode(host, page, self._page(host, page, version=version), headers, request_headers)
+        return 200, body, "text/html; charset=utf-8", headers
+
+    def _encode(self, host, page, body, headers, request_headers):
+        # A bomb is a small gzip body that inflates far past any sane page
+        # size; it is sent whether or not the client asked for gzip.
+        if self.bomb_ratio and self._rng(host, page, "bomb").random() < self.bomb_ratio:
+            if self.bomb is None:
+                self.bomb = gzip.compress(b" " * BOMB_BYTES, 9)
+            return self.bomb, {**headers, "Content-Encoding": "gzip"}
+        if host in self.gzip_hosts and "gzip" in request_headers.get("accept-encoding", ""):
+            return gzip.compress(body, 1), {**headers, "Content-Encoding": "gzip"}
+        return body, headers
+
+    def throttle(self, host, path, now):
+        if host not in self.throttle_hosts or path == "/robots.txt":
+            return None
+        window_start, count = self.request_windows.get(host, (now, 0))
+        if now - window_start >= 1.0:
+            window_start, count = now, 0
+        self.request_windows[host] = (window_start, count + 1)
+        return self.retry_after if count >= self.throttle_rps else None
+
+    def delay(self, host):
+        return self.slow_ms / 1000 if host in self.slow_hosts else 0
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 410: "Gone", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+class GraphServer:
+    def __init__(self, hosts):
+        self.hosts = hosts
+        self.graph = None
+        self.servers = []
+        self.status_counts = {}
+        self.bytes_sent = 0
+
+    async def _handle(self, host, reader, writer):
+        try:
+            while True:
+                first = await reader.read(1)
+                if not first or first == TLS_HANDSHAKE:
+                    break
+                request_line = first + await reader.readline()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+
+                parts = request_line.decode("latin-1").split()
+                response_headers = {}
+                if len(parts) != 3 or self.graph is None:
+                    status, body, content_type = 400, b"bad request", "text/plain"
+                    keep_alive = False
+                else:
+                    _, path, version = parts
+                    path = path.split("?", 1)[0]
+                    retry_after = self.graph.throttle(host, path, asyncio.get_running_loop().time())
+                    if retry_after is None:
+                        status, body, content_type, response_headers = self.graph.respond(host, path, headers)
+                    else:
+                        status, body, content_type = 429, b"too many requests", "text/plain"
+                        response_headers = {"Retry-After": retry_after}
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection") != "close"
+                    delay = self.graph.delay(host)
+                    if delay:
+                        await asyncio.sleep(delay)
+
+                extra_headers = "".join(f"{name}: {value}\r\n" for name, value in response_headers.items())
+                head = (
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n{extra_headers}"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + body)
+                await writer.drain()
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                self.bytes_sent += len(body)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        for host in range(self.hosts):
+            server = await asyncio.start_server(
+                lambda r, w, host=host: self._handle(host, r, w), "127.0.0.1", 0, backlog=1024
+            )
+            self.servers.append(server)
+        return [server.sockets[0].getsockname()[1] for server in self.servers]
+
+    def stats(self):
+        return {"responses": dict(sorted(self.status_counts.items())), "bytes_sent": self.bytes_sent}
+
+def serve_graph(hosts, graph_options, conn):
+    async def main():
+        server = GraphServer(hosts)
+        ports = await server.start()
+        server.graph = WebGraph(ports, **graph_options)
+        conn.send({"ports": ports, "seeds": server.graph.seeds()})
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, conn.recv)
+        conn.send(server.stats())
+        for listener in server.servers:
+            listener.close()
+
+    asyncio.run(main())
@@ -19,6 +19,8 @@ def get_env_var(var_name, default_value=None, cast_to=str):
 
 EMBEDDING_MODEL = get_env_var("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 VECTOR_SIZE = get_env_var("VECTOR_SIZE", 384, cast_to=int)
+EMBEDDING_BACKEND = get_env_var("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = get_env_var("EMBEDDING_ONNX_FILE", "")
 QDRANTDB_URL = get_env_var("QDRANTDB_URL")
 QDRANTDB_API_KEY = os.getenv("QDRANTDB_API_KEY")
 QDRANTDB_COLLECTION_NAME = get_env_var("QDRANTDB_COLLECTION_NAME", "web_pages")
@@ -26,15 +28,140 @@ MONGODB_URL = get_env_var("MONGODB_URL")
 MONGODB_DB_NAME = get_env_var("MONGODB_DB_NAME", "crawler_db")
 
 USER_AGENT = "MyAwesomeSearchBot/1.0 (+http://myawesomesearch.com/bot.html)"
-HEADERS = {"User-Agent": USER_AGENT}
+# Only encodings crawler.body can inflate with a bounded output are offered.
+HEADERS = {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
 
 CONNECT_TIMEOUT = get_env_var("CONNECT_TIMEOUT", 10, cast_to=int)
 READ_TIMEOUT = get_env_var("READ_TIMEOUT", 15, cast_to=int)
 OVERALL_CRAWL_TIMEOUT = get_env_var("OVERALL_CRAWL_TIMEOUT", 60, cast_to=int)
 MAX_CONTENT_SIZE_BYTES = get_env_var("MAX_CONTENT_SIZE_BYTES", 10 * 1024 * 1024, cast_to=int)
+BODY_CHUNK_BYTES = get_env_var("BODY_CHUNK_BYTES", 64 * 1024, cast_to=int)
+BODY_BUFFER_BYTES = get_env_var("BODY_BUFFER_BYTES", 256 * 1024, cast_to=int)
+BODY_BUFFER_KEEP_BYTES = get_env_var("BODY_BUFFER_KEEP_BYTES", 512 * 1024, cast_to=int)
+BODY_POOL_SIZE = get_env_var("BODY_POOL_SIZE", 64, cast_to=int)
 MAX_CRAWLER_WORKERS = get_env_var("MAX_CRAWLER_WORKERS", 10, cast_to=int)
 DOMAIN_CRAWL_DELAY = get_env_var("DOMAIN_CRAWL_DELAY", 5, cast_to=int)
 QUEUE_FETCH_TIMEOUT = get_env_var("QUEUE_FETCH_TIMEOUT", 5, cast_to=int)
 
+PROXY_RELOAD_INTERVAL = get_env_var("PROXY_RELOAD_INTERVAL", 10, cast_to=int)
+PROXY_FAILURE_THRESHOLD = get_env_var("PROXY_FAILURE_THRESHOLD", 3, cast_to=int)
+PROXY_OPEN_SECONDS = get_env_var("PROXY_OPEN_SECONDS", 30, cast_to=int)
+PROXY_MAX_OPEN_SECONDS = get_env_var("PROXY_MAX_OPEN_SECONDS", 600, cast_to=int)
+PROXY_LATENCY_FLOOR_MS = get_env_var("PROXY_LATENCY_FLOOR_MS", 50, cast_to=int)
+PROXY_POOL_SIZE = get_env_var("PROXY_POOL_SIZE", 16, cast_to=int)
+
+# Off by default: the adaptive controller lets healthy domains go faster than
+# DOMAIN_CRAWL_DELAY, down to one request per POLITENESS_MIN_DELAY.
+POLITENESS_ADAPTIVE = get_env_var("POLITENESS_ADAPTIVE", 0, cast_to=int)
+POLITENESS_MIN_DELAY = get_env_var("POLITENESS_MIN_DELAY", 0.25, cast_to=float)
+POLITENESS_MAX_DELAY = get_env_var("POLITENESS_MAX_DELAY", 300, cast_to=float)
+POLITENESS_MAX_CONCURRENCY = get_env_var("POLITENESS_MAX_CONCURRENCY", 4, cast_to=int)
+POLITENESS_RATE_STEP = get_env_var("POLITENESS_RATE_STEP", 0.1, cast_to=float)
+POLITENESS_INCREASE_AFTER = get_env_var("POLITENESS_INCREASE_AFTER", 5, cast_to=int)
+POLITENESS_DECREASE_FACTOR = get_env_var("POLITENESS_DECREASE_FACTOR", 0.5, cast_to=float)
+POLITENESS_LATENCY_TARGET_MS = get_env_var("POLITENESS_LATENCY_TARGET_MS", 2000, cast_to=int)
+POLITENESS_ERROR_RATE = get_env_var("POLITENESS_ERROR_RATE", 0.5, cast_to=float)
+POLITENESS_BACKOFF_BASE = get_env_var("POLITENESS_BACKOFF_BASE", 2, cast_to=float)
+POLITENESS_MAX_RETRIES = get_env_var("POLITENESS_MAX_RETRIES", 3, cast_to=int)
+POLITENESS_STATE_SIZE = get_env_var("POLITENESS_STATE_SIZE", 100000, cast_to=int)
+
+RECRAWL_ENABLED = get_env_var("RECRAWL_ENABLED", 1, cast_to=int)
+RECRAWL_INITIAL_INTERVAL = get_env_var("RECRAWL_INITIAL_INTERVAL", 24 * 3600, cast_to=float)
+RECRAWL_MIN_INTERVAL = get_env_var("RECRAWL_MIN_INTERVAL", 3600, cast_to=float)
+RECRAWL_MAX_INTERVAL = get_env_var("RECRAWL_MAX_INTERVAL", 30 * 24 * 3600, cast_to=float)
+RECRAWL_LEASE_SECONDS = get_env_var("RECRAWL_LEASE_SECONDS", 3600, cast_to=float)
+RECRAWL_POLL_INTERVAL = get_env_var("RECRAWL_POLL_INTERVAL", 30, cast_to=float)
+RECRAWL_BATCH_SIZE = get_env_var("RECRAWL_BATCH_SIZE", 500, cast_to=int)
+RECRAWL_MAX_QUEUED = get_env_var("RECRAWL_MAX_QUEUED", 5000, cast_to=int)
+RECRAWL_PRIORITY = get_env_var("RECRAWL_PRIORITY", "medium")
+
+# Resolved from this file like crawler/data/urls.txt and proxies.txt, so the
+# crawler, the search server and the tools agree from any working directory.
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crawler", "data")
+
+ROBOTS_CACHE_SIZE = get_env_var("ROBOTS_CACHE_SIZE", 50000, cast_to=int)
+ROBOTS_TTL = get_env_var("ROBOTS_TTL", 24 * 3600, cast_to=int)
+ROBOTS_ERROR_TTL = get_env_var("ROBOTS_ERROR_TTL", 3600, cast_to=int)
+ROBOTS_FETCH_TIMEOUT = get_env_var("ROBOTS_FETCH_TIMEOUT", 5, cast_to=int)
+ROBOTS_PREFETCH_WORKERS = get_env_var("ROBOTS_PREFETCH_WORKERS", 8, cast_to=int)
+ROBOTS_CACHE_PATH = get_env_var("ROBOTS_CACHE_PATH", os.path.join(DATA_DIR, "robots_cache.json"))
+ROBOTS_SNAPSHOT_INTERVAL = get_env_var("ROBOTS_SNAPSHOT_INTERVAL", 300, cast_to=int)
+
+SCRAPER_BACKEND = get_env_var("SCRAPER_BACKEND", "stream")
+
+CRAWL_MODE = get_env_var("CRAWL_MODE", "threads")
+ASYNC_CONCURRENCY = get_env_var("ASYNC_CONCURRENCY", 500, cast_to=int)
+ASYNC_MAX_CONNECTIONS = get_env_var("ASYNC_MAX_CONNECTIONS", 1000, cast_to=int)
+ASYNC_CONNECTIONS_PER_HOST = get_env_var("ASYNC_CONNECTIONS_PER_HOST", 4, cast_to=int)
+ASYNC_BLOCKING_WORKERS = get_env_var("ASYNC_BLOCKING_WORKERS", 32, cast_to=int)
+ASYNC_SCRAPE_PROCESSES = get_env_var("ASYNC_SCRAPE_PROCESSES", 0, cast_to=int)
+
+CRAWLER_PROCESSES = get_env_var("CRAWLER_PROCESSES", 1, cast_to=int)
+CRAWLER_SHARD_COUNT = get_env_var("CRAWLER_SHARD_COUNT", 0, cast_to=int)
+CRAWLER_SHARD_IDS = get_env_var("CRAWLER_SHARD_IDS", "")
+BROKER_ADDRESS = get_env_var("BROKER_ADDRESS", "")
+# No default: the broker unpickles what clients send, so a known key lets
+# anyone who can reach it run code on the host.
+BROKER_AUTHKEY = get_env_var("BROKER_AUTHKEY", "")
+SHARD_FORWARD_BATCH_SIZE = get_env_var("SHARD_FORWARD_BATCH_SIZE", 256, cast_to=int)
+SHARD_FORWARD_INTERVAL_MS = get_env_var("SHARD_FORWARD_INTERVAL_MS", 200, cast_to=int)
+
+FRONTIER_DIR = get_env_var("FRONTIER_DIR", os.path.join(DATA_DIR, "frontier"))
+FRONTIER_MEMORY_URLS = get_env_var("FRONTIER_MEMORY_URLS", 10000, cast_to=int)
+FRONTIER_SEGMENT_BYTES = get_env_var("FRONTIER_SEGMENT_BYTES", 8 * 1024 * 1024, cast_to=int)
+FRONTIER_CHECKPOINT_INTERVAL = get_env_var("FRONTIER_CHECKPOINT_INTERVAL", 30, cast_to=int)
+
+SEEN_FILTER_PATH = get_env_var("SEEN_FILTER_PATH", os.path.join(DATA_DIR, "seen_urls.bloom"))
+SEEN_FILTER_CAPACITY = get_env_var("SEEN_FILTER_CAPACITY", 1_000_000, cast_to=int)
+SEEN_FILTER_ERROR_RATE = get_env_var("SEEN_FILTER_ERROR_RATE", 0.001, cast_to=float)
+
+NEAR_DUP_DISTANCE = get_env_var("NEAR_DUP_DISTANCE", 3, cast_to=int)
+NEAR_DUP_SHINGLE_SIZE = get_env_var("NEAR_DUP_SHINGLE_SIZE", 3, cast_to=int)
+NEAR_DUP_INDEX_PATH = get_env_var("NEAR_DUP_INDEX_PATH", os.path.join(DATA_DIR, "near_dup.idx"))
+NEAR_DUP_SNAPSHOT_INTERVAL = get_env_var("NEAR_DUP_SNAPSHOT_INTERVAL", 300, cast_to=int)
+
+INDEX_DIR = get_env_var("INDEX_DIR", os.path.join(DATA_DIR, "index"))
+INDEX_FLUSH_DOCS = get_env_var("INDEX_FLUSH_DOCS", 2000, cast_to=int)
+INDEX_FLUSH_INTERVAL = get_env_var("INDEX_FLUSH_INTERVAL", 30, cast_to=int)
+INDEX_MERGE_FACTOR = get_env_var("INDEX_MERGE_FACTOR", 8, cast_to=int)
+INDEX_QUEUE_SIZE = get_env_var("INDEX_QUEUE_SIZE", 10000, cast_to=int)
+INDEX_ENQUEUE_TIMEOUT = get_env_var("INDEX_ENQUEUE_TIMEOUT", 10, cast_to=float)
+BM25_K1 = get_env_var("BM25_K1", 1.2, cast_to=float)
+BM25_B = get_env_var("BM25_B", 0.75, cast_to=float)
+
+ARCHIVE_DIR = get_env_var("ARCHIVE_DIR", os.path.join(DATA_DIR, "archive"))
+ARCHIVE_SEGMENT_BYTES = get_env_var("ARCHIVE_SEGMENT_BYTES", 256 * 1024 * 1024, cast_to=int)
+ARCHIVE_COMPRESSION_LEVEL = get_env_var("ARCHIVE_COMPRESSION_LEVEL", 6, cast_to=int)
+
+WRITE_BATCH_SIZE = get_env_var("WRITE_BATCH_SIZE", 64, cast_to=int)
+WRITE_FLUSH_INTERVAL_MS = get_env_var("WRITE_FLUSH_INTERVAL_MS", 500, cast_to=int)
+WRITE_MAX_PENDING = get_env_var("WRITE_MAX_PENDING", 1000, cast_to=int)
+WRITE_MAX_RETRIES = get_env_var("WRITE_MAX_RETRIES", 3, cast_to=int)
+
+EMBEDDING_BATCH_SIZE = get_env_var("EMBEDDING_BATCH_SIZE", 32, cast_to=int)
+EMBEDDING_BATCH_WAIT_MS = get_env_var("EMBEDDING_BATCH_WAIT_MS", 20, cast_to=int)
+EMBEDDING_STATS_INTERVAL = get_env_var("EMBEDDING_STATS_INTERVAL", 60, cast_to=int)
+EMBEDDING_CACHE_PATH = get_env_var("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite"))
+EMBEDDING_CACHE_MAX_ENTRIES = get_env_var("EMBEDDING_CACHE_MAX_ENTRIES", 2_000_000, cast_to=int)
+
+METRICS_HOST = get_env_var("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = get_env_var("METRICS_PORT", 9464, cast_to=int)
+METRICS_DUMP_PATH = get_env_var("METRICS_DUMP_PATH", "")
+METRICS_DUMP_INTERVAL = get_env_var("METRICS_DUMP_INTERVAL", 60, cast_to=int)
+SLOW_CRAWL_TRACE_MS = get_env_var("SLOW_CRAWL_TRACE_MS", 10000, cast_to=int)
+
 QUEUE_PRIORITIES = ["high", "medium", "low"]
-QUEUE_PROBABILITIES = [0.6, 0.3, 0.1]
\ No newline at end of file
+QUEUE_PROBABILITIES = [0.6, 0.3, 0.1]
+
+SEARCH_HOST = get_env_var("SEARCH_HOST", "127.0.0.1")
+SEARCH_PORT = get_env_var("SEARCH_PORT", 8080, cast_to=int)
+SEARCH_DEFAULT_LIMIT = get_env_var("SEARCH_DEFAULT_LIMIT", 10, cast_to=int)
+SEARCH_MAX_LIMIT = get_env_var("SEARCH_MAX_LIMIT", 100, cast_to=int)
+SEARCH_EMBEDDING_CACHE_SIZE = get_env_var("SEARCH_EMBEDDING_CACHE_SIZE", 10000, cast_to=int)
+SEARCH_RESULT_CACHE_SIZE = get_env_var("SEARCH_RESULT_CACHE_SIZE", 10000, cast_to=int)
+SEARCH_RESULT_CACHE_TTL = get_env_var("SEARCH_RESULT_CACHE_TTL", 300, cast_to=int)
+SEARCH_EMBEDDING_BATCH_WAIT_MS = get_env_var("SEARCH_EMBEDDING_BATCH_WAIT_MS", 2, cast_to=int)
+SEARCH_MODE = get_env_var("SEARCH_MODE", "hybrid")
+SEARCH_RRF_K = get_env_var("SEARCH_RRF_K", 60, cast_to=int)
+SEARCH_P50_TARGET_MS = get_env_var("SEARCH_P50_TARGET_MS", 50, cast_to=int)
+SEARCH_P99_TARGET_MS = get_env_var("SEARCH_P99_TARGET_MS", 250, cast_to=int)
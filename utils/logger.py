@@ -1,12 +1,134 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from queue import Queue, Empty, Full
 from datetime import datetime
 
+# utils.config imports this module, so logging settings are read straight from
+# the environment when the first message is written rather than from config.
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+class LogBackend:
+    def __init__(self):
+        self.level = LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), LEVELS["INFO"])
+        self.json_format = os.getenv("LOG_FORMAT", "text").lower() == "json"
+        self.rate_limit = _env_int("LOG_RATE_LIMIT", 20)
+        self.rate_interval = _env_int("LOG_RATE_INTERVAL", 10)
+        self.asynchronous = os.getenv("LOG_ASYNC", "1") != "0"
+        self.queue = Queue(maxsize=_env_int("LOG_QUEUE_SIZE", 10000))
+        self.dropped = 0
+        self.windows = {}
+        self.lock = threading.Lock()
+        self._thread = None
+        if self.asynchronous:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def _admit(self, key, now):
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.rate_interval:
+                suppressed = window[2] if window else 0
+                self.windows[key] = [now, 1, 0]
+                return True, suppressed
+            if window[1] < self.rate_limit:
+                window[1] += 1
+                return True, 0
+            window[2] += 1
+            return False, 0
+
+    def emit(self, level, message, key=None):
+        now = time.time()
+        if key is not None and self.rate_limit > 0:
+            admitted, suppressed = self._admit(key, now)
+            if not admitted:
+                return
+            if suppressed:
+                message = f"{message} ({suppressed} similar '{key}' messages suppressed)"
+        record = (now, level, message, key)
+        if not self.asynchronous:
+            self._write([record])
+            return
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            with self.lock:
+                self.dropped += 1
+
+    def _format(self, record):
+        timestamp, level, message, key = record
+        if self.json_format:
+            entry = {"ts": datetime.fromtimestamp(timestamp).isoformat(timespec="milliseconds"), "level": level, "msg": message}
+            if key is not None:
+                entry["key"] = key
+            return json.dumps(entry, ensure_ascii=False)
+        emoji = ConsoleLogger.EMOJI_MAP.get(level, "")
+        color = ConsoleLogger.COLOR_MAP.get(level, "")
+        reset = ConsoleLogger.COLOR_MAP["RESET"]
+        time_str = f"[{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}]"
+        level_str = f"[{level:<5}]"
+        return f"{emoji} {time_str} {color}{level_str}{reset} {message}"
+
+    def _write(self, records):
+        stream = sys.stdout
+        try:
+            stream.write("".join(self._format(record) + "\n" for record in records))
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < 512:
+                try:
+                    records.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            with self.lock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                records.append((time.time(), "WARN", f"Log queue full, dropped {dropped} messages", None))
+            self._write(records)
+            for _ in range(len(records) - (1 if dropped else 0)):
+                self.queue.task_done()
+
+    def flush(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.asynchronous and self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = LogBackend()
+    return _backend
+
 class ConsoleLogger:
     COLOR_MAP = {
         "INFO": "\033[32m",
         "WARN": "\033[33m",
-        "ERROR": "\033[31m", 
-        "DEBUG": "\033[36m", 
-        "RESET": "\033[0m"   
+        "ERROR": "\033[31m",
+        "DEBUG": "\033[36m",
+        "RESET": "\033[0m"
     }
 
     EMOJI_MAP = {
@@ -16,26 +138,25 @@ class ConsoleLogger:
         "DEBUG": "🟦"
     }
 
-    def _now(self):
-        return datetime.now().strftime("%H:%M:%S")
+    def is_enabled(self, level: str) -> bool:
+        return get_backend().enabled(level)
 
-    def _log(self, level: str, message: str):
-        emoji = self.EMOJI_MAP.get(level, "")
-        color = self.COLOR_MAP.get(level, "")
-        reset = self.COLOR_MAP["RESET"]
-        time_str = f"[{self._now()}]"
-        level_str = f"[{level:<5}]"
-        level_colored = f"{color}{level_str}{reset}"
-        print(f"{emoji} {time_str} {level_colored} {message}")
+    def _log(self, level: str, message: str, key=None):
+        backend = get_backend()
+        if backend.enabled(level):
+            backend.emit(level, message, key)
+
+    def info(self, message: str, key=None):
+        self._log("INFO", message, key)
 
-    def info(self, message: str):
-        self._log("INFO", message)
+    def warn(self, message: str, key=None):
+        self._log("WARN", message, key)
 
-    def warn(self, message: str):
-        self._log("WARN", message)
+    def error(self, message: str, key=None):
+        self._log("ERROR", message, key)
 
-    def error(self, message: str):
-        self._log("ERROR", message)
+    def debug(self, message: str, key=None):
+        self._log("DEBUG", message, key)
 
-    def debug(self, message: str):
-        self._log("DEBUG", message)
\ No newline at end of file
+    def flush(self):
+        get_backend().flush()
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+class Gauge:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+        self.lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception:
+            return float("nan")
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe((time.perf_counter() - started) * 1000)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        with self.lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            running = 0
+            for index, bucket_count in enumerate(self.counts):
+                running += bucket_count
+                if running >= target:
+                    return self.bounds[index] if index < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "bounds": list(self.bounds),
+                "counts": list(self.counts),
+                "count": self.count,
+                "sum": self.total,
+            }
+
+    def summary(self):
+        return (
+            f"n={self.count} mean={self.mean():.2f} "
+            f"p50<={self.percentile(0.5)} p90<={self.percentile(0.9)} p99<={self.percentile(0.99)}"
+        )
+
+class MetricFamily:
+    def __init__(self, kind, name, help_text, label_names, factory):
+        self.kind = kind
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.factory())
+        return child
+
+    def remove(self, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            self.children.pop(key, None)
+
+    def items(self):
+        with self.lock:
+            return list(self.children.items())
+
+class MetricsRegistry:
+    def __init__(self):
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _family(self, kind, name, help_text, labels, factory):
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = MetricFamily(kind, name, help_text, labels, factory)
+            elif family.kind != kind or family.label_names != tuple(labels):
+                raise ValueError(f"Metric {name} is already registered as a different {family.kind}")
+        return family if labels else family.labels()
+
+    def counter(self, name, help_text, labels=()):
+        return self._family("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._family("gauge", name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text, bounds, labels=()):
+        return self._family("histogram", name, help_text, labels, lambda: Histogram(bounds))
+
+    def snapshot(self):
+        with self.lock:
+            families = list(self.families.values())
+        result = {}
+        for family in families:
+            series = []
+            for key, metric in family.items():
+                labels = dict(zip(family.label_names, key))
+                value = metric.snapshot() if family.kind == "histogram" else metric.get()
+                series.append({"labels": labels, "value": value})
+            result[family.name] = {"type": family.kind, "help": family.help_text, "series": series}
+        return result
+
+    def render_prometheus(self):
+        with self.lock:
+            families = list(self.families.values())
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.help_text}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for key, metric in family.items():
+                pairs = [f'{name}="{value}"' for name, value in zip(family.label_names, key)]
+                if family.kind != "histogram":
+                    labels = "{" + ",".join(pairs) + "}" if pairs else ""
+                    lines.append(f"{family.name}{labels} {metric.get()}")
+                    continue
+                snapshot = metric.snapshot()
+                running = 0
+                for bound, count in zip(snapshot["bounds"] + ["+Inf"], snapshot["counts"]):
+                    running += count
+                    labels = ",".join(pairs + [f'le="{bound}"'])
+                    lines.append(f"{family.name}_bucket{{{labels}}} {running}")
+                labels = "{" + ",".join(pairs) + "}" if pairs else ""
+                lines.append(f"{family.name}_sum{labels} {snapshot['sum']}")
+                lines.append(f"{family.name}_count{labels} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+class StageTrace:
+    def __init__(self, histograms):
+        self.histograms = histograms
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.histograms.labels(stage=name).observe(elapsed)
+            self.stages.append((name, elapsed))
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self):
+        return " ".join(f"{name}={elapsed:.1f}ms" for name, elapsed in self.stages)
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+def serve_metrics(host, port, registry=REGISTRY):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = MetricsHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+class MetricsDumper:
+    def __init__(self, path, interval, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def dump(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": time.time(), "metrics": self.registry.snapshot()}, f)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError:
+                pass
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        try:
+            self.dump()
+        except OSError:
+            pass